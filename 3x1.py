@@ -1,23 +1,74 @@
 """
 Collatz Conjecture Random Large Number Tester - SQLITE VERSION
 Tests random numbers over 10 billion against the 3x+1 problem
-Uses efficient SQLite database with SHA-256 hashes for compact storage
+Uses efficient SQLite database with compact fixed-width keys for storage
 
 Perfect for school projects and long-term research!
 """
 
+import array
 import random
 import time
 import json
 import os
+import pathlib
 import sqlite3
+import bisect
+import glob
 import hashlib
+import heapq
+import itertools
+import math
+import mmap
+import struct
+import multiprocessing
+import platform
+import queue
+import signal
+import sys
+import threading
+import zlib
+from collections import deque
 from datetime import datetime
 
+try:
+    import numpy as np
+except ImportError:  # Optional: only needed for the numpy batch engine
+    np = None
+
+try:
+    import gmpy2
+except ImportError:  # Optional: only needed for the gmpy2 kernel
+    gmpy2 = None
+
 
 # Configuration
 DB_FILE = 'collatz_tested.db'
 RESULTS_LOG = 'collatz_results_log.txt'
+MAX_STEPS = 100000  # Safety limit on the length of a single trajectory
+TOP_K = 10  # Session top lists
+STEPS_BUCKET_WIDTH = 50  # Steps histogram bucket size
+SKETCH_ACCURACY = 0.01  # Relative error of streaming percentiles
+SKETCH_MAX_BUCKETS = 2048
+CHECKPOINT_INTERVAL = 60  # Seconds between session checkpoints
+TIME_BUDGET_RESERVE = 0.05  # Share of a time budget kept for the final save
+SQLITE_MAX_PARAMS = 999  # Bound variables per statement on any SQLite build
+BLOOM_SUFFIX = '.bloom'  # Bloom filter sidecar file: <db_path>.bloom
+BLOOM_FP_RATE = 0.01
+BLOOM_MIN_CAPACITY = 1_000_000
+RESHARD_BATCH = 100_000  # Keys buffered per shard while re-sharding
+RESULTS_SUFFIX = '.results'  # Per-number results store: <db_path>.results/
+RESULTS_PEAK_WIDTH = 32  # Bytes per stored peak
+SNAPSHOT_SUFFIX = '.keys'  # Sorted key snapshot: <db_path>.keys
+STARTUP_CHECKS = ('auto', 'quick', 'full', 'off')  # See init_db
+FINGERPRINT_SUFFIX = '.fingerprint'  # Database state at the last clean close
+MMAP_SIZE = 256 * 1024 * 1024  # Bytes of each database file SQLite may memory-map
+TAIL_TABLE_FILE = 'collatz_tail.bin'  # Cached steps and peaks of small values
+
+# Key formats for the `tested` table, recorded per database in `stats`
+KEY_FORMAT_SHA256 = 'sha256'  # SHA-256 of the decimal string (legacy, 32 bytes)
+KEY_FORMAT_INT128 = 'int128'  # The number itself, 16 bytes big-endian
+KEY_WIDTH = 16
 
 
 def hash_number(n: int) -> bytes:
@@ -25,14 +76,316 @@ def hash_number(n: int) -> bytes:
     return hashlib.sha256(str(n).encode('utf-8')).digest()
 
 
-def init_db(db_path=DB_FILE):
-    """Initialize the SQLite database with optimized settings."""
+def number_key(n: int, key_format=KEY_FORMAT_INT128) -> bytes:
+    """
+    Generate the `tested` table key for a number.
+    int128 keys are the number as fixed-width big-endian bytes, so they sort
+    in numeric order; numbers too wide for KEY_WIDTH bytes fall back to the
+    32-byte SHA-256 hash, which can never equal a 16-byte key.
+    """
+    if key_format == KEY_FORMAT_INT128 and 0 <= n < 1 << (8 * KEY_WIDTH):
+        return n.to_bytes(KEY_WIDTH, 'big')
+    return hash_number(n)
+
+
+class BloomFilter:
+    """
+    Memory-mapped Bloom filter over `tested` keys, stored next to the database.
+    
+    A miss is definite, so has_been_tested can answer it without SQLite; a hit
+    still has to be confirmed with the database. The header records how many
+    database rows the filter covers, which is only updated after a commit, so
+    a filter that fell behind the database is detected and rebuilt.
+    """
+    
+    MAGIC = b'CLZBLOOM'
+    HEADER = struct.Struct('<8sQQQd')  # magic, bits, hashes, items, fp_rate
+    HEADER_SIZE = 64
+    
+    def __init__(self, path, file, mm, num_bits, num_hashes, items, fp_rate):
+        self.path = path
+        self.file = file
+        self.mm = mm
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.items = items
+        self.fp_rate = fp_rate
+    
+    @property
+    def capacity(self):
+        """Number of keys the filter can hold at its configured false-positive rate."""
+        return round(self.num_bits * math.log(2) ** 2 / -math.log(self.fp_rate))
+    
+    @classmethod
+    def create(cls, path, capacity, fp_rate=BLOOM_FP_RATE):
+        """Create an empty filter sized for `capacity` keys at `fp_rate`."""
+        num_bits = max(64, int(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        with open(path, 'wb') as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, num_bits, num_hashes, 0, fp_rate)
+                    .ljust(cls.HEADER_SIZE, b'\0'))
+            f.truncate(cls.HEADER_SIZE + (num_bits + 7) // 8)
+        return cls.open(path)
+    
+    @classmethod
+    def open(cls, path):
+        """Open an existing filter file; raises ValueError if it is not one."""
+        file = open(path, 'r+b')
+        try:
+            mm = mmap.mmap(file.fileno(), 0)
+        except ValueError:
+            file.close()
+            raise ValueError(f"{path} is empty")
+        magic, num_bits, num_hashes, items, fp_rate = cls.HEADER.unpack_from(mm)
+        if magic != cls.MAGIC or len(mm) < cls.HEADER_SIZE + (num_bits + 7) // 8:
+            mm.close()
+            file.close()
+            raise ValueError(f"{path} is not a Bloom filter file")
+        return cls(path, file, mm, num_bits, num_hashes, items, fp_rate)
+    
+    def _positions(self, key):
+        """Bit positions for a key, by double hashing one 128-bit digest."""
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+    
+    def might_contain(self, key):
+        """False means the key is definitely not in the database."""
+        mm = self.mm
+        offset = self.HEADER_SIZE
+        for pos in self._positions(key):
+            if not mm[offset + (pos >> 3)] & (1 << (pos & 7)):
+                return False
+        return True
+    
+    def add(self, keys):
+        """Set the bits for each key."""
+        mm = self.mm
+        offset = self.HEADER_SIZE
+        for key in keys:
+            for pos in self._positions(key):
+                i = offset + (pos >> 3)
+                mm[i] = mm[i] | (1 << (pos & 7))
+    
+    def flush(self):
+        """Write the covered row count and push dirty pages to disk."""
+        self.HEADER.pack_into(self.mm, 0, self.MAGIC, self.num_bits,
+                              self.num_hashes, self.items, self.fp_rate)
+        self.mm.flush()
+    
+    def close(self):
+        """Flush and unmap the filter."""
+        self.flush()
+        self.mm.close()
+        self.file.close()
+
+
+class TestedConnection(sqlite3.Connection):
+    """
+    Connection to the tested-numbers database. Carries the optional sidecar
+    structures that sit in front of the `tested` table, so every function
+    that takes `conn` picks them up without extra arguments.
+    """
+    
+    db_path = None
+    key_format = KEY_FORMAT_SHA256
+    bloom = None
+    shards = None  # Connections to the shard files of a sharded database
+    
+    def commit(self):
+        """
+        Commit the shards, then this database, then record the new row count
+        in the Bloom filter. Shards go first so a crash in between can only
+        leave keys that the stats do not count yet, never the reverse.
+        """
+        for shard in self.shards or ():
+            shard.commit()
+        super().commit()
+        if self.bloom is not None:
+            self.bloom.flush()
+    
+    def close(self):
+        """
+        Close the Bloom filter and shards (if any) and the connection, then
+        fingerprint the database files so the next init_db can tell that
+        nothing touched them since.
+        """
+        if self.bloom is not None:
+            self.bloom.close()
+            self.bloom = None
+        for shard in self.shards or ():
+            shard.close()
+        self.shards = None
+        super().close()
+        if self.db_path is not None:
+            save_database_fingerprint(self.db_path)
+
+
+class ReadOnlyConnection(TestedConnection):
+    """
+    Read-only connection to a database and its shards (see open_read_only).
+    A read-only connection to a WAL database cannot checkpoint, so SQLite
+    leaves an empty -wal and a -shm file behind; close removes the ones
+    that did not exist before the database was opened.
+    """
+    
+    created = ()
+    
+    def close(self):
+        super().close()
+        for wal_path in self.created:
+            try:
+                if os.path.getsize(wal_path) == 0:
+                    os.remove(wal_path)
+                    os.remove(wal_path[:-len('-wal')] + '-shm')
+            except OSError:
+                pass
+
+
+def shard_index(key, num_shards):
+    """Shard that holds a `tested` key: CRC-32 of the key modulo the shard count."""
+    return zlib.crc32(key) % num_shards
+
+
+def shard_path(db_path, index, num_shards):
+    """Shard file name; it includes the shard count so two layouts never collide."""
+    return f"{db_path}.shard{index:02d}of{num_shards:02d}"
+
+
+def open_shards(db_path, num_shards, mmap_size=MMAP_SIZE):
+    """
+    Open (creating if needed) the shard files of a sharded database. Each
+    shard is its own SQLite file with its own WAL, so writers to different
+    shards never wait on each other's locks.
+    Returns: list of connections, indexed by shard_index()
+    """
+    shards = []
+    for index in range(num_shards):
+        shard = sqlite3.connect(shard_path(db_path, index, num_shards), timeout=30,
+                                check_same_thread=False)
+        shard.execute('PRAGMA journal_mode=WAL;')
+        shard.execute('PRAGMA synchronous=NORMAL;')
+        shard.execute(f'PRAGMA cache_size=-{max(64000 // num_shards, 4000)};')
+        shard.execute(f'PRAGMA mmap_size={int(mmap_size)};')
+        shard.execute('''CREATE TABLE IF NOT EXISTS tested (
+            hash BLOB PRIMARY KEY
+        ) WITHOUT ROWID''')
+        shard.commit()
+        shards.append(shard)
+    return shards
+
+
+def tested_storage(conn):
+    """Connections that hold the `tested` keys: the shards, or the database itself."""
+    return getattr(conn, 'shards', None) or [conn]
+
+
+def group_by_shard(conn, keys):
+    """
+    Split keys by the connection that holds them.
+    Returns: list of (connection, keys) with no empty groups
+    """
+    shards = getattr(conn, 'shards', None)
+    if not shards:
+        return [(conn, list(keys))] if keys else []
+    groups = [[] for _ in shards]
+    for key in keys:
+        groups[shard_index(key, len(shards))].append(key)
+    return [(shards[i], group) for i, group in enumerate(groups) if group]
+
+
+def database_files(db_path):
+    """The database file and its shard files (without their WAL and shm files)."""
+    shards = [path for path in glob.glob(glob.escape(db_path) + '.shard*')
+              if not path.endswith(('-wal', '-shm'))]
+    return [db_path] + sorted(shards)
+
+
+def database_fingerprint(db_path):
+    """
+    Cheap identity of the database's state on disk: size and modification
+    time of the database, shard and WAL files, plus the 100-byte SQLite
+    header of the database file. Reads no pages beyond the header.
+    """
+    files = {}
+    for path in database_files(db_path):
+        for name in (path, f"{path}-wal"):
+            try:
+                stat = os.stat(name)
+            except OSError:
+                continue
+            files[os.path.basename(name)] = [stat.st_size, stat.st_mtime_ns]
+    with open(db_path, 'rb') as f:
+        header = f.read(100)
+    return {'files': files, 'header': header.hex()}
+
+
+def save_database_fingerprint(db_path):
+    """Record the database's fingerprint in its sidecar file (<db_path>.fingerprint)."""
+    path = db_path + FINGERPRINT_SUFFIX
+    try:
+        fingerprint = database_fingerprint(db_path)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(fingerprint, f)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        print(f"⚠️  Error saving database fingerprint: {e}")
+
+
+def fingerprint_unchanged(db_path):
+    """True if the database files are exactly as the last clean close left them."""
+    try:
+        with open(db_path + FINGERPRINT_SUFFIX) as f:
+            return json.load(f) == database_fingerprint(db_path)
+    except (OSError, ValueError):
+        return False
+
+
+def warm_page_cache(paths):
+    """
+    Ask the OS to start reading the database files into its page cache, so
+    the first lookups of a session do not each wait on the disk.
+    """
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                if hasattr(os, 'posix_fadvise'):
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                else:
+                    while f.read(1024 * 1024):
+                        pass
+        except OSError:
+            pass
+
+
+def init_db(db_path=DB_FILE, check='auto', mmap_size=MMAP_SIZE, warmup=False):
+    """
+    Initialize the SQLite database with optimized settings.
+    
+    Args:
+        db_path: Path to the database file
+        check: How to validate an existing database before opening it:
+            'full' runs PRAGMA integrity_check, 'quick' runs the cheaper
+            PRAGMA quick_check, 'auto' skips the check when the files match
+            the fingerprint saved at the last clean close (and otherwise runs
+            quick_check), and 'off' skips it
+        mmap_size: Bytes of each database file SQLite may memory-map
+        warmup: Ask the OS to read the database files into the page cache
+    """
+    if check not in STARTUP_CHECKS:
+        raise ValueError(f"check must be one of {', '.join(STARTUP_CHECKS)}")
+    
     # Check if file exists and is a valid SQLite database
-    if os.path.exists(db_path):
+    unchanged = os.path.exists(db_path) and fingerprint_unchanged(db_path)
+    if os.path.exists(db_path) and check != 'off' and not (check == 'auto' and unchanged):
         try:
             # Try to connect and verify it's a valid database
             test_conn = sqlite3.connect(db_path, timeout=5)
-            test_conn.execute("PRAGMA integrity_check;")
+            if check == 'full':
+                test_conn.execute("PRAGMA integrity_check;")
+            else:
+                test_conn.execute("PRAGMA quick_check;")
             test_conn.close()
         except (sqlite3.DatabaseError, sqlite3.OperationalError) as e:
             print(f"⚠️  Database file is corrupt or invalid: {e}")
@@ -44,10 +397,13 @@ def init_db(db_path=DB_FILE):
             os.remove(db_path)
     
     try:
-        conn = sqlite3.connect(db_path, timeout=30)
+        # A SessionPipeline hands the connection to its writer thread
+        conn = sqlite3.connect(db_path, timeout=30, factory=TestedConnection,
+                               check_same_thread=False)
         conn.execute('PRAGMA journal_mode=WAL;')  # Better concurrency
         conn.execute('PRAGMA synchronous=NORMAL;')  # Good speed/safety tradeoff
         conn.execute('PRAGMA cache_size=-64000;')  # 64MB cache
+        conn.execute(f'PRAGMA mmap_size={int(mmap_size)};')  # Reads straight from the page cache
     except (sqlite3.DatabaseError, sqlite3.OperationalError) as e:
         # If we still get an error, the file is definitely corrupt
         print(f"⚠️  Database file is corrupt (error on PRAGMA): {e}")
@@ -59,134 +415,3074 @@ def init_db(db_path=DB_FILE):
         if os.path.exists(db_path):
             os.remove(db_path)
         # Recreate from scratch
-        conn = sqlite3.connect(db_path, timeout=30)
+        conn = sqlite3.connect(db_path, timeout=30, factory=TestedConnection,
+                               check_same_thread=False)
         conn.execute('PRAGMA journal_mode=WAL;')
         conn.execute('PRAGMA synchronous=NORMAL;')
         conn.execute('PRAGMA cache_size=-64000;')
+        conn.execute(f'PRAGMA mmap_size={int(mmap_size)};')
+    
+    # Create tables
+    conn.execute('''CREATE TABLE IF NOT EXISTS tested (
+        hash BLOB PRIMARY KEY
+    ) WITHOUT ROWID''')
+    
+    conn.execute('''CREATE TABLE IF NOT EXISTS stats (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    ) WITHOUT ROWID''')
+    
+    # One row of aggregate metrics per run (see SessionMetrics)
+    conn.execute('''CREATE TABLE IF NOT EXISTS sessions (
+        id INTEGER PRIMARY KEY,
+        started TEXT,
+        finished TEXT,
+        status TEXT,
+        tested INTEGER,
+        duplicates INTEGER,
+        attempts INTEGER,
+        elapsed REAL,
+        db_rows INTEGER,
+        db_size_bytes INTEGER,
+        metrics TEXT
+    )''')
+    
+    # Intervals checked by verify_range, kept merged (see add_verified_range)
+    conn.execute('''CREATE TABLE IF NOT EXISTS verified_ranges (
+        low BLOB PRIMARY KEY,
+        high BLOB
+    ) WITHOUT ROWID''')
+    
+    # New databases use int128 keys; ones that already hold rows without a
+    # recorded format predate the marker and use SHA-256 hashes
+    row = conn.execute('SELECT value FROM stats WHERE key = ?', ('key_format',)).fetchone()
+    if row:
+        key_format = row[0]
+    else:
+        has_rows = conn.execute('SELECT 1 FROM tested LIMIT 1').fetchone() is not None
+        key_format = KEY_FORMAT_SHA256 if has_rows else KEY_FORMAT_INT128
+        conn.execute('INSERT INTO stats (key, value) VALUES (?, ?)', ('key_format', key_format))
+    
+    # Sharded databases keep their keys in separate files (see reshard_database)
+    row = conn.execute('SELECT value FROM stats WHERE key = ?', ('shards',)).fetchone()
+    if row:
+        conn.shards = open_shards(db_path, json.loads(row[0]), mmap_size)
+    
+    # The row count is kept in `stats` by mark_tested_batch. It is counted
+    # once when missing, and again for a sharded database that was not
+    # closed cleanly, since a crash between the shard commits and the main
+    # commit can leave keys the counter does not include
+    if load_tested_count(conn) is None or (conn.shards and not unchanged):
+        save_tested_count(conn, count_tested_rows(conn))
+    
+    conn.commit()
+    conn.db_path = db_path
+    conn.key_format = key_format
+    if warmup:
+        warm_page_cache(database_files(db_path))
+    return conn
+
+
+def rebuild_bloom_filter(conn, capacity=None, fp_rate=BLOOM_FP_RATE):
+    """
+    Build a fresh Bloom filter from every key in the `tested` table and
+    swap it into place next to the database.
+    Returns: the open BloomFilter
+    """
+    path = conn.db_path + BLOOM_SUFFIX
+    count = get_tested_count(conn)
+    if capacity is None:
+        # Leave room for plenty of future sessions before the next rebuild
+        capacity = max(BLOOM_MIN_CAPACITY, count * 2)
+    
+    tmp_path = path + '.tmp'
+    bloom = BloomFilter.create(tmp_path, capacity, fp_rate)
+    for storage in tested_storage(conn):
+        cursor = storage.execute('SELECT hash FROM tested')
+        while True:
+            rows = cursor.fetchmany(100000)
+            if not rows:
+                break
+            bloom.add(row[0] for row in rows)
+            bloom.items += len(rows)
+    bloom.close()
+    
+    os.replace(tmp_path, path)
+    return BloomFilter.open(path)
+
+
+def attach_bloom_filter(conn, fp_rate=None, capacity=None):
+    """
+    Open the Bloom filter sidecar for this database and attach it to `conn`.
+    The filter is rebuilt if it is missing, unreadable, out of sync with the
+    `tested` table, over capacity, or built for a different false-positive
+    rate than an explicitly requested `fp_rate`.
+    """
+    path = conn.db_path + BLOOM_SUFFIX
+    count = get_tested_count(conn)
+    bloom = None
+    
+    if os.path.exists(path):
+        try:
+            bloom = BloomFilter.open(path)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"⚠️  Ignoring unreadable Bloom filter: {e}")
+    
+    if bloom is not None:
+        reason = None
+        if bloom.items != count:
+            reason = f"covers {bloom.items:,} rows, database has {count:,}"
+        elif bloom.items > bloom.capacity:
+            reason = "filter is over capacity"
+        elif fp_rate is not None and bloom.fp_rate != fp_rate:
+            reason = f"false-positive rate changed to {fp_rate}"
+        elif capacity is not None and bloom.capacity < capacity:
+            reason = f"capacity raised to {capacity:,}"
+        if reason:
+            print(f"⚠️  Bloom filter is stale ({reason})")
+            bloom.close()
+            bloom = None
+    
+    if bloom is None:
+        print(f"🔄 Rebuilding Bloom filter from {count:,} tested numbers...")
+        bloom = rebuild_bloom_filter(conn, capacity, fp_rate or BLOOM_FP_RATE)
+        print(f"   ✓ Bloom filter ready: {path}")
+    
+    conn.bloom = bloom
+    return bloom
+
+
+def reshard_database(db_path, num_shards):
+    """
+    Spread the `tested` keys of a database over `num_shards` shard files,
+    or with num_shards=1 gather them back into the database file itself.
+    
+    The new layout is built next to the current one and switched to by the
+    commit that records the shard count in `stats`; the old shard files are
+    removed after that. An interrupted re-shard therefore leaves the
+    database as it was (plus stray new shard files, which the next attempt
+    overwrites).
+    Returns: number of keys moved, or None if the database already has that layout
+    """
+    conn = init_db(db_path)
+    sources = tested_storage(conn)
+    old_shards = len(conn.shards) if conn.shards else 1
+    total = count_tested_rows(conn)
+    if num_shards == old_shards:
+        conn.close()
+        return None
+    
+    if num_shards > 1:
+        for index in range(num_shards):
+            for suffix in ('', '-wal', '-shm'):
+                path = shard_path(db_path, index, num_shards) + suffix
+                if os.path.exists(path):
+                    os.remove(path)
+        targets = open_shards(db_path, num_shards)
+        for target in targets:
+            target.execute('PRAGMA synchronous=OFF;')  # Bulk load; nothing depends on it yet
+    else:
+        targets = [conn]
+    
+    # One pass over the current keys, buffered per target; a single sorted
+    # source keeps every target's inserts in key order
+    buffers = [[] for _ in targets]
+    moved = 0
+    for source in sources:
+        cursor = source.execute('SELECT hash FROM tested')
+        while True:
+            rows = cursor.fetchmany(RESHARD_BATCH)
+            if not rows:
+                break
+            for row in rows:
+                buffers[shard_index(row[0], len(targets))].append(row)
+            for target, buffer in zip(targets, buffers):
+                if len(buffer) >= RESHARD_BATCH:
+                    target.executemany('INSERT INTO tested (hash) VALUES (?)', buffer)
+                    buffer.clear()
+            moved += len(rows)
+    for target, buffer in zip(targets, buffers):
+        target.executemany('INSERT INTO tested (hash) VALUES (?)', buffer)
+    
+    if num_shards > 1:
+        for target in targets:
+            target.commit()
+            target.execute('PRAGMA synchronous=NORMAL;')
+    new_total = sum(target.execute('SELECT COUNT(*) FROM tested').fetchone()[0]
+                    for target in targets)
+    if new_total != total:
+        conn.rollback()
+        conn.close()
+        raise RuntimeError(f"re-shard copied {new_total:,} of {total:,} keys; "
+                           f"database left unchanged")
+    
+    # Switch over in one commit of the main database
+    old_paths = [shard_path(db_path, i, old_shards) for i in range(old_shards)] if conn.shards else []
+    if num_shards > 1:
+        if not conn.shards:
+            conn.execute('DELETE FROM tested')
+        conn.execute('INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)',
+                     ('shards', json.dumps(num_shards)))
+    else:
+        conn.execute('DELETE FROM stats WHERE key = ?', ('shards',))
+    save_tested_count(conn, new_total)
+    conn.commit()
+    
+    for shard in conn.shards or ():
+        shard.close()
+    conn.shards = targets if num_shards > 1 else None
+    for path in old_paths:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    if not old_paths:
+        conn.execute('VACUUM')  # Give back the space the keys used in the main file
+    conn.close()
+    return moved
+
+
+def open_read_only(db_path):
+    """
+    Open an existing database and its shards for reading only. Unlike
+    init_db it creates no tables and writes no counters or fingerprints, so
+    the files are left as they are and may be read-only.
+    Returns: ReadOnlyConnection with key_format and shards set
+    """
+    created = []
+    
+    def connect(path, factory=sqlite3.Connection):
+        wal_path = path + '-wal'
+        if not os.path.exists(wal_path):
+            created.append(wal_path)
+        uri = pathlib.Path(os.path.abspath(path)).as_uri() + '?mode=ro'
+        return sqlite3.connect(uri, uri=True, timeout=30, factory=factory)
+    
+    conn = connect(db_path, ReadOnlyConnection)
+    conn.created = created
+    try:
+        # Same defaults as init_db for databases that predate the markers
+        row = conn.execute('SELECT value FROM stats WHERE key = ?', ('key_format',)).fetchone()
+        if row:
+            conn.key_format = row[0]
+        else:
+            has_rows = conn.execute('SELECT 1 FROM tested LIMIT 1').fetchone() is not None
+            conn.key_format = KEY_FORMAT_SHA256 if has_rows else KEY_FORMAT_INT128
+        row = conn.execute('SELECT value FROM stats WHERE key = ?', ('shards',)).fetchone()
+        if row:
+            num_shards = json.loads(row[0])
+            conn.shards = [connect(shard_path(db_path, index, num_shards))
+                           for index in range(num_shards)]
+    except sqlite3.Error:
+        conn.close()
+        raise
+    return conn
+
+
+def has_table(conn, name):
+    """True if the database has table `name` (older databases lack the newer tables)."""
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                        (name,)).fetchone() is not None
+
+
+def iter_sorted_keys(conn, batch=RESHARD_BATCH):
+    """Every `tested` key of a database in key order, merged across its shards."""
+    def scan(storage):
+        cursor = storage.execute('SELECT hash FROM tested ORDER BY hash')
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                return
+            for row in rows:
+                yield row[0]
+    
+    return heapq.merge(*(scan(storage) for storage in tested_storage(conn)))
+
+
+def merge_databases(input_paths, output_path):
+    """
+    Combine the tested numbers and statistics of several databases (e.g.
+    from different machines) into a new database.
+    
+    The keys are merged in one streaming pass: every input is read in key
+    order and combined with a k-way heap merge, so a key found in several
+    inputs is written once, the output is filled in key order, and no key
+    set is held in memory. Records in `all_time_stats` are the best of the
+    inputs. Totals and distributions are summed, minus the extra copies of
+    numbers found in more than one input (whose steps are recomputed; this
+    needs int128 keys). Verified ranges are united and session history is
+    copied. Permutation sampler state and unfinished session cursors are not
+    carried over. The inputs are
+    opened read-only and left unchanged; the output is built under a
+    temporary name and moved into place when complete.
+    Returns: dict with the row and overlap counts of the merge
+    """
+    if os.path.exists(output_path):
+        raise ValueError(f"{output_path} already exists; merge into a new database")
+    for path in input_paths:
+        if not os.path.exists(path):
+            raise ValueError(f"{path} does not exist")
+    
+    inputs = []
+    for path in input_paths:
+        try:
+            inputs.append(open_read_only(path))
+        except sqlite3.Error as e:
+            for conn in inputs:
+                conn.close()
+            raise ValueError(f"{path} cannot be read: {e}")
+    key_formats = {conn.key_format for conn in inputs}
+    if len(key_formats) > 1:
+        for conn in inputs:
+            conn.close()
+        raise ValueError(f"inputs mix key formats ({', '.join(sorted(key_formats))}); "
+                         f"convert them to int128 first")
+    key_format = key_formats.pop()
+    for path, conn in zip(input_paths, inputs):
+        if load_session_cursor(conn) is not None:
+            print(f"⚠️  {path} has an unfinished session; it will not be resumed from the merge")
+    
+    tmp_path = output_path + '.tmp'
+    for suffix in ('', '-wal', '-shm', FINGERPRINT_SUFFIX):
+        if os.path.exists(tmp_path + suffix):
+            os.remove(tmp_path + suffix)
+    out = init_db(tmp_path)
+    out.execute('PRAGMA synchronous=OFF;')  # Bulk load into a file nothing uses yet
+    out.execute('INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)',
+                ('key_format', key_format))
+    
+    # Records are the best of the inputs; the merge below takes the extra
+    # copies of shared numbers back out of the totals and distribution
+    all_time_stats = {
+        'longest_sequence': 0,
+        'longest_num': 0,
+        'highest_peak': 0,
+        'highest_peak_num': 0,
+        'total_steps': 0,
+        'total_numbers': 0
+    }
+    distribution = SessionStats()
+    sessions = []
+    verified_ranges = []
+    for conn in inputs:
+        stats = load_all_time_stats(conn)
+        if stats.get('longest_sequence', 0) > all_time_stats['longest_sequence']:
+            all_time_stats['longest_sequence'] = stats['longest_sequence']
+            all_time_stats['longest_num'] = stats.get('longest_num', 0)
+        if stats.get('highest_peak', 0) > all_time_stats['highest_peak']:
+            all_time_stats['highest_peak'] = stats['highest_peak']
+            all_time_stats['highest_peak_num'] = stats.get('highest_peak_num', 0)
+        all_time_stats['total_steps'] += stats.get('total_steps', 0)
+        all_time_stats['total_numbers'] += stats.get('total_numbers', 0)
+        distribution.merge(load_distribution_stats(conn))
+        if has_table(conn, 'sessions'):
+            sessions.extend(conn.execute(
+                '''SELECT started, finished, status, tested, duplicates, attempts,
+                          elapsed, db_rows, db_size_bytes, metrics FROM sessions'''))
+        if has_table(conn, 'verified_ranges'):
+            verified_ranges.extend(load_verified_ranges(conn))
+    
+    # Sort-merge; equal keys arrive together, tagged with their input
+    rows = [0] * len(inputs)
+    shared = [0] * len(inputs)
+    written = overlap_keys = extra_copies = 0
+    extra_steps = 0
+    unresolved = 0  # Extra copies whose steps cannot be recovered from the key
+    buffer = []
+    prev = prev_source = None
+    prev_shared = False
+    prev_steps = None
+    streams = [zip(iter_sorted_keys(conn), itertools.repeat(i)) for i, conn in enumerate(inputs)]
+    for key, source in heapq.merge(*streams):
+        rows[source] += 1
+        if key == prev:
+            shared[source] += 1
+            if not prev_shared:
+                shared[prev_source] += 1
+                overlap_keys += 1
+                prev_shared = True
+                prev_steps = None
+                if key_format == KEY_FORMAT_INT128 and len(key) == KEY_WIDTH:
+                    prev_num = int.from_bytes(key, 'big')
+                    prev_steps, prev_peak = collatz_steps_jump(prev_num)
+            extra_copies += 1
+            if prev_steps is None:
+                unresolved += 1
+            else:
+                extra_steps += prev_steps
+                # Inputs whose distribution predates some of their keys may
+                # not hold this number at all
+                bucket = prev_steps - prev_steps % STEPS_BUCKET_WIDTH
+                if distribution.steps_histogram.get(prev_num.bit_length(), {}).get(bucket):
+                    distribution.remove(prev_num, prev_steps, prev_peak)
+            continue
+        prev, prev_source, prev_shared = key, source, False
+        buffer.append((key,))
+        if len(buffer) >= RESHARD_BATCH:
+            out.executemany('INSERT INTO tested (hash) VALUES (?)', buffer)
+            written += len(buffer)
+            buffer.clear()
+            if written % (10 * RESHARD_BATCH) == 0:
+                out.commit()
+    out.executemany('INSERT INTO tested (hash) VALUES (?)', buffer)
+    written += len(buffer)
+    
+    all_time_stats['total_steps'] -= extra_steps
+    all_time_stats['total_numbers'] -= extra_copies
+    
+    out.execute('INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)',
+                ('all_time_stats', json.dumps(all_time_stats)))
+    out.execute('INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)',
+                ('distribution', json.dumps(distribution.to_dict())))
+    out.executemany(
+        '''INSERT INTO sessions (started, finished, status, tested, duplicates, attempts,
+                                 elapsed, db_rows, db_size_bytes, metrics)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        sorted(sessions, key=lambda session: session[0] or ''))
+    for low, high in verified_ranges:
+        add_verified_range(out, low, high)
+    save_tested_count(out, written)
+    out.commit()
+    out.execute('PRAGMA synchronous=NORMAL;')
+    out.close()
+    for conn in inputs:
+        conn.close()
+    
+    os.remove(tmp_path + FINGERPRINT_SUFFIX)
+    os.replace(tmp_path, output_path)
+    save_database_fingerprint(output_path)
+    return {
+        'inputs': [{'path': path, 'rows': count, 'shared': count_shared}
+                   for path, count, count_shared in zip(input_paths, rows, shared)],
+        'rows': written,
+        'overlap_keys': overlap_keys,
+        'extra_copies': extra_copies,
+        'unresolved_steps': unresolved
+    }
+
+
+class ResultsStore:
+    """
+    Append-only columnar store of per-number results, kept in a directory
+    next to the database (<db_path>.results/).
+    
+    Each column is a file of fixed-width values: start.bin holds 16-byte and
+    peak.bin 32-byte big-endian integers, steps.bin little-endian uint32.
+    Rows are appended a batch at a time, and a scan maps only the columns it
+    needs, e.g. steps.bin alone to find long trajectories. The database
+    records how many rows were saved with the last checkpoint, and rows past
+    that are dropped on open, so the store and the `tested` table agree.
+    """
+    
+    COLUMNS = {'start': KEY_WIDTH, 'steps': 4, 'peak': RESULTS_PEAK_WIDTH}
+    
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.files = {name: open(self._column_path(name), 'ab') for name in self.COLUMNS}
+        # A crash can leave columns of different lengths; keep whole rows only
+        self.truncate(min(os.path.getsize(self._column_path(name)) // width
+                          for name, width in self.COLUMNS.items()))
+    
+    def _column_path(self, name):
+        return os.path.join(self.path, f'{name}.bin')
+    
+    def __len__(self):
+        return self.rows
+    
+    @staticmethod
+    def pack(numbers, steps, peaks):
+        """Pack one batch of results as (start, steps, peak) column bytes."""
+        return (b''.join(n.to_bytes(KEY_WIDTH, 'big') for n in numbers),
+                struct.pack(f'<{len(steps)}I', *steps),
+                b''.join(p.to_bytes(RESULTS_PEAK_WIDTH, 'big') for p in peaks))
+    
+    @staticmethod
+    def unpack(columns):
+        """
+        Unpack one batch packed by pack().
+        Returns: list of (start, steps, peak)
+        """
+        starts, steps, peaks = columns
+        return [(int.from_bytes(starts[i * KEY_WIDTH:(i + 1) * KEY_WIDTH], 'big'), value,
+                 int.from_bytes(peaks[i * RESULTS_PEAK_WIDTH:(i + 1) * RESULTS_PEAK_WIDTH], 'big'))
+                for i, value in enumerate(struct.unpack(f'<{len(steps) // 4}I', steps))]
+    
+    def append(self, columns):
+        """Append a batch packed by pack()."""
+        for name, data in zip(self.COLUMNS, columns):
+            self.files[name].write(data)
+        self.rows += len(columns[1]) // 4
+    
+    def flush(self):
+        """Write buffered rows and make them durable."""
+        for f in self.files.values():
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def truncate(self, rows):
+        """Drop everything past the first `rows` rows."""
+        for name, width in self.COLUMNS.items():
+            self.files[name].flush()
+            self.files[name].truncate(rows * width)
+        self.rows = rows
+    
+    def _map(self, name):
+        """Map a column read-only; None while it is empty."""
+        self.files[name].flush()
+        with open(self._column_path(name), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    def _rows_where_steps_above(self, steps_mm, min_steps):
+        """Indices of rows with steps > min_steps, read straight from the map."""
+        if np is not None:
+            steps = np.frombuffer(steps_mm, dtype='<u4', count=self.rows)
+            matches = np.flatnonzero(steps > min_steps).tolist()
+            del steps  # Release the buffer so the map can be closed
+            return matches
+        with memoryview(steps_mm) as view:
+            return [i for i, (steps,) in enumerate(struct.iter_unpack('<I', view[:self.rows * 4]))
+                    if steps > min_steps]
+    
+    def query_steps(self, min_steps):
+        """
+        Find every stored number whose trajectory takes more than `min_steps`
+        steps. Only the steps column is scanned; start and peak are read for
+        the matching rows.
+        Returns: list of (start, steps, peak) in the order they were tested
+        """
+        if self.rows == 0:
+            return []
+        maps = {name: self._map(name) for name in self.COLUMNS}
+        try:
+            results = []
+            for i in self._rows_where_steps_above(maps['steps'], min_steps):
+                start = maps['start'][i * KEY_WIDTH:(i + 1) * KEY_WIDTH]
+                peak = maps['peak'][i * RESULTS_PEAK_WIDTH:(i + 1) * RESULTS_PEAK_WIDTH]
+                results.append((int.from_bytes(start, 'big'),
+                                struct.unpack_from('<I', maps['steps'], i * 4)[0],
+                                int.from_bytes(peak, 'big')))
+            return results
+        finally:
+            for mm in maps.values():
+                mm.close()
+    
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+def open_results_store(conn):
+    """
+    Open the results store next to the database, dropping rows that were
+    appended after the last checkpoint that recorded them.
+    Returns: ResultsStore
+    """
+    store = ResultsStore(conn.db_path + RESULTS_SUFFIX)
+    row = conn.execute('SELECT value FROM stats WHERE key = ?', ('results_rows',)).fetchone()
+    saved = json.loads(row[0]) if row else 0
+    if len(store) > saved:
+        print(f"⚠️  Dropping {len(store) - saved:,} uncheckpointed rows from the results store")
+        store.truncate(saved)
+    elif len(store) < saved:
+        print(f"⚠️  Results store has {len(store):,} of {saved:,} saved rows; "
+              f"the rest were lost")
+    return store
+
+
+def save_results_rows(conn, store):
+    """Flush the results store and record its row count; the caller commits."""
+    store.flush()
+    conn.execute(
+        'INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)',
+        ('results_rows', json.dumps(len(store)))
+    )
+
+
+class KeySnapshot:
+    """
+    Read-only, memory-mapped snapshot of the `tested` keys, sorted and
+    fixed-width, for processes that only need membership checks.
+    
+    Keys are padded on the left with zero bytes to the widest key in the
+    table. Every FENCE_STRIDE-th key is repeated in a fence index after the
+    keys; it is loaded into memory on open, so a lookup bisects the fences
+    and then binary-searches a single block of the map. Processes sharing a
+    snapshot share its pages through the OS page cache and never open
+    SQLite. Keys marked tested after the export go into an in-memory delta.
+    
+    Passing a snapshot as `conn` to has_been_tested, find_tested,
+    mark_tested_batch or get_tested_count uses it instead of the database.
+    """
+    
+    MAGIC = b'CLZKEYS1'
+    HEADER = struct.Struct('<8s8sQQQ')  # magic, key format, key width, keys, fence stride
+    HEADER_SIZE = 64
+    FENCE_STRIDE = 256
+    
+    def __init__(self, path, file, mm, key_format, width, rows, stride):
+        self.path = path
+        self.file = file
+        self.mm = mm
+        self.key_format = key_format
+        self.width = width
+        self.rows = rows
+        self.stride = stride
+        self.delta = set()
+        fence_offset = self.HEADER_SIZE + rows * width
+        self.fences = [mm[fence_offset + i * width:fence_offset + (i + 1) * width]
+                       for i in range((rows + stride - 1) // stride)]
+    
+    @classmethod
+    def open(cls, path):
+        """Open a snapshot file; raises ValueError if it is not one."""
+        file = open(path, 'rb')
+        try:
+            mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            file.close()
+            raise ValueError(f"{path} is empty")
+        magic, key_format, width, rows, stride = cls.HEADER.unpack_from(mm)
+        fences = (rows + stride - 1) // stride if stride else 0
+        if magic != cls.MAGIC or not stride or len(mm) < cls.HEADER_SIZE + (rows + fences) * width:
+            mm.close()
+            file.close()
+            raise ValueError(f"{path} is not a key snapshot file")
+        return cls(path, file, mm, key_format.rstrip(b'\0').decode(), width, rows, stride)
+    
+    def __len__(self):
+        return self.rows + len(self.delta)
+    
+    def __contains__(self, key):
+        if key in self.delta:
+            return True
+        if len(key) > self.width:
+            return False
+        key = key.rjust(self.width, b'\0')
+        block = bisect.bisect_right(self.fences, key) - 1
+        if block < 0:
+            return False
+        mm = self.mm
+        width = self.width
+        lo = block * self.stride
+        hi = min(lo + self.stride, self.rows)
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            offset = self.HEADER_SIZE + mid * width
+            if mm[offset:offset + width] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        offset = self.HEADER_SIZE + lo * width
+        return lo < self.rows and mm[offset:offset + width] == key
+    
+    def add(self, keys):
+        """Record keys marked tested since the snapshot was taken."""
+        self.delta.update(keys)
+    
+    def close(self):
+        self.fences = []
+        self.mm.close()
+        self.file.close()
+
+
+def export_key_snapshot(conn, path=None, stride=KeySnapshot.FENCE_STRIDE):
+    """
+    Write every `tested` key (from all shards) to a sorted snapshot file,
+    by default next to the database (<db_path>.keys). The file is written
+    under a temporary name and moved into place when complete.
+    Returns: number of keys written
+    """
+    path = path or conn.db_path + SNAPSHOT_SUFFIX
+    storages = tested_storage(conn)
+    width = max([storage.execute('SELECT MAX(LENGTH(hash)) FROM tested').fetchone()[0] or 0
+                 for storage in storages] + [KEY_WIDTH])
+    
+    def padded_keys(storage, condition):
+        cursor = storage.execute(
+            f'SELECT hash FROM tested WHERE LENGTH(hash) {condition} ? ORDER BY hash', (width,))
+        while True:
+            rows = cursor.fetchmany(100000)
+            if not rows:
+                return
+            for row in rows:
+                yield row[0].rjust(width, b'\0')
+    
+    # Padded keys sort before full-width ones, so each group is merged on its own
+    tmp_path = path + '.tmp'
+    rows = 0
+    fences = []
+    buffer = []
+    with open(tmp_path, 'wb') as f:
+        f.write(b'\0' * KeySnapshot.HEADER_SIZE)
+        for condition in ('<', '='):
+            for key in heapq.merge(*(padded_keys(storage, condition) for storage in storages)):
+                if rows % stride == 0:
+                    fences.append(key)
+                buffer.append(key)
+                rows += 1
+                if len(buffer) >= 100000:
+                    f.write(b''.join(buffer))
+                    buffer.clear()
+        f.write(b''.join(buffer))
+        f.write(b''.join(fences))
+        f.seek(0)
+        f.write(KeySnapshot.HEADER.pack(KeySnapshot.MAGIC, conn.key_format.encode(),
+                                        width, rows, stride))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return rows
+
+
+def open_key_snapshot(conn, path=None):
+    """
+    Open the key snapshot of this database, or None if there is none or it
+    is stale: a snapshot that holds a different number of keys than the
+    `tested` table no longer matches it and is not used.
+    """
+    path = path or conn.db_path + SNAPSHOT_SUFFIX
+    try:
+        snapshot = KeySnapshot.open(path)
+    except (OSError, ValueError, struct.error) as e:
+        print(f"⚠️  No usable key snapshot: {e}")
+        return None
+    count = get_tested_count(conn)
+    if snapshot.rows != count or snapshot.key_format != conn.key_format:
+        print(f"⚠️  Key snapshot is stale (holds {snapshot.rows:,} keys, "
+              f"database has {count:,}); export it again")
+        snapshot.close()
+        return None
+    return snapshot
+
+
+def load_all_time_stats(conn):
+    """Load all-time statistics from the database."""
+    try:
+        cursor = conn.execute('SELECT value FROM stats WHERE key = ?', ('all_time_stats',))
+        row = cursor.fetchone()
+        if row:
+            return json.loads(row[0])
+    except Exception as e:
+        print(f"⚠️  Error loading stats: {e}")
+    
+    return {
+        'longest_sequence': 0,
+        'longest_num': 0,
+        'highest_peak': 0,
+        'highest_peak_num': 0,
+        'total_steps': 0,
+        'total_numbers': 0
+    }
+
+
+def save_all_time_stats(conn, all_time_stats, commit=True):
+    """Save all-time statistics to the database; with commit=False the caller commits."""
+    try:
+        conn.execute(
+            'INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)',
+            ('all_time_stats', json.dumps(all_time_stats))
+        )
+        if commit:
+            conn.commit()
+    except Exception as e:
+        print(f"⚠️  Error saving stats: {e}")
+
+
+def load_distribution_stats(conn):
+    """Load the all-time histograms and sketches (SessionStats) from the database."""
+    try:
+        cursor = conn.execute('SELECT value FROM stats WHERE key = ?', ('distribution',))
+        row = cursor.fetchone()
+        if row:
+            return SessionStats.from_dict(json.loads(row[0]))
+    except Exception as e:
+        print(f"⚠️  Error loading distribution stats: {e}")
+    
+    return SessionStats()
+
+
+def save_distribution_stats(conn, session_stats):
+    """
+    Merge a session's histograms and sketches into the all-time distribution.
+    Call it once per set of numbers; the caller commits.
+    """
+    try:
+        distribution = load_distribution_stats(conn)
+        distribution.merge(session_stats)
+        conn.execute(
+            'INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)',
+            ('distribution', json.dumps(distribution.to_dict()))
+        )
+    except Exception as e:
+        print(f"⚠️  Error saving distribution stats: {e}")
+
+
+def load_session_cursor(conn):
+    """Load the cursor of an unfinished session, or None if the last one finished."""
+    try:
+        cursor = conn.execute('SELECT value FROM stats WHERE key = ?', ('session_cursor',))
+        row = cursor.fetchone()
+        if row:
+            return json.loads(row[0])
+    except Exception as e:
+        print(f"⚠️  Error loading session cursor: {e}")
+    return None
+
+
+def save_session_cursor(conn, session_cursor):
+    """Save (or with None, clear) the session cursor; the caller commits."""
+    if session_cursor is None:
+        conn.execute('DELETE FROM stats WHERE key = ?', ('session_cursor',))
+    else:
+        conn.execute(
+            'INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)',
+            ('session_cursor', json.dumps(session_cursor))
+        )
+
+
+def save_session_record(conn, record):
+    """Store a run's aggregate metrics in the `sessions` table; the caller commits."""
+    conn.execute(
+        '''INSERT INTO sessions (started, finished, status, tested, duplicates, attempts,
+                                 elapsed, db_rows, db_size_bytes, metrics)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        (record['started'], record['finished'], record['status'], record['tested'],
+         record['duplicates'], record['attempts'], record['elapsed'], record['db_rows'],
+         record['db_size_bytes'], json.dumps(record['phases']))
+    )
+
+
+def range_key(n):
+    """Bound of a verified range as a 16-byte big-endian BLOB, which sorts numerically."""
+    return n.to_bytes(KEY_WIDTH, 'big')
+
+
+def load_verified_ranges(conn):
+    """Load the verified intervals as sorted, disjoint (low, high) pairs."""
+    cursor = conn.execute('SELECT low, high FROM verified_ranges ORDER BY low')
+    return [(int.from_bytes(low, 'big'), int.from_bytes(high, 'big')) for low, high in cursor]
+
+
+def add_verified_range(conn, low, high):
+    """
+    Record [low, high] as verified, merged with every interval it overlaps
+    or touches, so the table holds one row per disjoint run; the caller commits.
+    """
+    rows = conn.execute(
+        'SELECT low, high FROM verified_ranges WHERE low <= ? AND high >= ?',
+        (range_key(high + 1), range_key(max(low - 1, 0)))
+    ).fetchall()
+    for row_low, row_high in rows:
+        low = min(low, int.from_bytes(row_low, 'big'))
+        high = max(high, int.from_bytes(row_high, 'big'))
+    conn.executemany('DELETE FROM verified_ranges WHERE low = ?', [(row[0],) for row in rows])
+    conn.execute('INSERT INTO verified_ranges (low, high) VALUES (?, ?)',
+                 (range_key(low), range_key(high)))
+
+
+def verified_prefix(conn):
+    """
+    Largest N such that every number up to N is verified to reach 1. A
+    verified range only shows that each of its numbers drops below itself,
+    which proves convergence once everything below the range is covered,
+    so only the run starting at 1 (or 2; 1 is trivial) counts.
+    """
+    ranges = load_verified_ranges(conn)
+    if ranges and ranges[0][0] <= 2:
+        return ranges[0][1]
+    return 1
+
+
+def get_db_size(conn):
+    """Size in bytes of the database file and its write-ahead log."""
+    db_path = getattr(conn, 'db_path', None)
+    size = 0
+    for path in (db_path, f"{db_path}-wal") if db_path else ():
+        try:
+            size += os.path.getsize(path)
+        except OSError:
+            pass
+    return size
+
+
+def load_tested_count(conn):
+    """Load the row count kept in `stats`, or None if there is none."""
+    try:
+        cursor = conn.execute('SELECT value FROM stats WHERE key = ?', ('tested_count',))
+        row = cursor.fetchone()
+        if row:
+            return json.loads(row[0])
+    except sqlite3.OperationalError:
+        pass  # A shard or other connection without a `stats` table
+    return None
+
+
+def save_tested_count(conn, count):
+    """Save (or with None, clear) the row count kept in `stats`; the caller commits."""
+    if count is None:
+        conn.execute('DELETE FROM stats WHERE key = ?', ('tested_count',))
+    else:
+        conn.execute(
+            'INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)',
+            ('tested_count', json.dumps(count))
+        )
+
+
+def count_tested_rows(conn):
+    """Count the `tested` rows of every shard with a full COUNT(*) scan."""
+    return sum(storage.execute('SELECT COUNT(*) FROM tested').fetchone()[0]
+               for storage in tested_storage(conn))
+
+
+def get_tested_count(conn):
+    """Get the total number of tested entries in the database."""
+    if isinstance(conn, KeySnapshot):
+        return len(conn)
+    count = load_tested_count(conn)
+    return count if count is not None else count_tested_rows(conn)
+
+
+def has_been_tested(conn, n: int) -> bool:
+    """Check if a number has already been tested."""
+    h = number_key(n, getattr(conn, 'key_format', KEY_FORMAT_SHA256))
+    if isinstance(conn, KeySnapshot):
+        return h in conn
+    bloom = getattr(conn, 'bloom', None)
+    if bloom is not None and not bloom.might_contain(h):
+        return False
+    shards = getattr(conn, 'shards', None)
+    storage = shards[shard_index(h, len(shards))] if shards else conn
+    cursor = storage.execute('SELECT 1 FROM tested WHERE hash = ?', (h,))
+    return cursor.fetchone() is not None
+
+
+def find_tested(conn, numbers):
+    """
+    Check a chunk of numbers against the database in as few queries as
+    possible: one `IN (...)` query per SQLITE_MAX_PARAMS keys, after the
+    Bloom filter (if attached) has ruled out definite misses.
+    Returns: set of the numbers that have already been tested
+    """
+    key_format = getattr(conn, 'key_format', KEY_FORMAT_SHA256)
+    keys = {number_key(n, key_format): n for n in numbers}
+    if isinstance(conn, KeySnapshot):
+        return {n for key, n in keys.items() if key in conn}
+    bloom = getattr(conn, 'bloom', None)
+    if bloom is not None:
+        candidates = [k for k in keys if bloom.might_contain(k)]
+    else:
+        candidates = list(keys)
+    
+    tested = set()
+    for storage, group in group_by_shard(conn, candidates):
+        for i in range(0, len(group), SQLITE_MAX_PARAMS):
+            chunk = group[i:i + SQLITE_MAX_PARAMS]
+            placeholders = ','.join('?' * len(chunk))
+            cursor = storage.execute(
+                f'SELECT hash FROM tested WHERE hash IN ({placeholders})', chunk)
+            tested.update(keys[row[0]] for row in cursor)
+    return tested
+
+
+def mark_tested_batch(conn, numbers, collisions=None):
+    """
+    Mark multiple numbers as tested in a single transaction.
+    With a `collisions` set, numbers that were already in the database are
+    added to it. Each insert runs inside a savepoint, and only when its row
+    count comes up short is it rolled back so find_tested can name the
+    numbers that were already there before inserting again. This is how a
+    session that skipped the duplicate check finds them afterwards.
+    Returns: number of rows added
+    """
+    key_format = getattr(conn, 'key_format', KEY_FORMAT_SHA256)
+    hashes = [number_key(n, key_format) for n in numbers]
+    if isinstance(conn, KeySnapshot):
+        if collisions is not None:
+            collisions.update(n for n, h in zip(numbers, hashes) if h in conn)
+        conn.add(hashes)
+        return len(hashes)
+    inserted = 0
+    for storage, group in group_by_shard(conn, hashes):
+        rows = [(h,) for h in group]
+        if collisions is None:
+            inserted += storage.executemany('INSERT OR IGNORE INTO tested (hash) VALUES (?)',
+                                            rows).rowcount
+            continue
+        # Nested in an open transaction, so RELEASE leaves the commit to the caller
+        if not storage.in_transaction:
+            storage.execute('BEGIN')
+        storage.execute('SAVEPOINT mark_tested')
+        count = storage.executemany('INSERT OR IGNORE INTO tested (hash) VALUES (?)',
+                                    rows).rowcount
+        if count < len(rows):
+            storage.execute('ROLLBACK TO mark_tested')
+            by_key = dict(zip(hashes, numbers))
+            collisions.update(find_tested(conn, [by_key[h] for h in group]))
+            count = storage.executemany('INSERT OR IGNORE INTO tested (hash) VALUES (?)',
+                                        rows).rowcount
+        storage.execute('RELEASE mark_tested')
+        inserted += count
+    
+    # The row count in `stats` commits with the inserts (after the shards)
+    conn.execute("UPDATE stats SET value = value + ? WHERE key = 'tested_count'", (inserted,))
+    
+    # Keep the Bloom filter in step; its row count is saved on commit
+    bloom = getattr(conn, 'bloom', None)
+    if bloom is not None:
+        bloom.add(hashes)
+        bloom.items += inserted
+    return inserted
+
+
+def estimate_duplicates(num_tests, existing, min_value, max_value):
+    """
+    Birthday-bound estimate of how many of `num_tests` uniform draws from
+    [min_value, max_value] hit one of `existing` numbers already tested
+    there: each draw does with probability existing / range size.
+    Returns: (expected number of such duplicates, probability of at least one)
+    """
+    p = min(1.0, existing / (max_value - min_value + 1))
+    if p == 1.0:
+        return float(num_tests), 1.0
+    return num_tests * p, -math.expm1(num_tests * math.log1p(-p))
+
+
+def append_to_results_log(session_info):
+    """
+    Append session results to a human-readable log file.
+    """
+    try:
+        with open(RESULTS_LOG, 'a') as f:
+            f.write("="*70 + "\n")
+            f.write(f"Session Date: {session_info['timestamp']}\n")
+            f.write(f"Numbers tested this session: {session_info['tested_this_session']:,}\n")
+            f.write(f"Total unique numbers tested: {session_info['total_unique']:,}\n")
+            f.write(f"Longest sequence: {session_info['longest_sequence']:,} steps "
+                   f"(number: {session_info['longest_num']:,})\n")
+            f.write(f"Highest peak: {session_info['highest_peak']:,} "
+                   f"(from: {session_info['highest_peak_num']:,})\n")
+            f.write(f"Average steps: {session_info['average_steps']:.2f}\n")
+            f.write("="*70 + "\n\n")
+    except Exception as e:
+        print(f"⚠️  Error appending to results log: {e}")
+
+
+def collatz_steps(n):
+    """
+    Count the number of steps to reach 1 in the Collatz sequence.
+    Returns: (steps, max_value_reached)
+    """
+    if n == 1:
+        return 0, 1
+    
+    original = n
+    steps = 0
+    max_val = n
+    
+    while n != 1:
+        if n % 2 == 0:
+            n = n // 2
+        else:
+            n = 3 * n + 1
+        
+        steps += 1
+        max_val = max(max_val, n)
+        
+        # Safety check
+        if steps > MAX_STEPS:
+            return steps, max_val
+    
+    return steps, max_val
+
+
+def collatz_steps_shift(n):
+    """
+    Same result as collatz_steps, taking every halving step of a run at
+    once: n & -n isolates the lowest set bit, so its bit_length - 1 is the
+    number of trailing zeros to shift out.
+    Returns: (steps, max_value_reached)
+    """
+    if n == 1:
+        return 0, 1
+    
+    steps = 0
+    max_val = n
+    
+    while True:
+        if n & 1:
+            n = 3 * n + 1
+            steps += 1
+            if n > max_val:
+                max_val = n
+            if steps > MAX_STEPS:
+                return steps, max_val
+        
+        zeros = (n & -n).bit_length() - 1
+        n >>= zeros
+        steps += zeros
+        # Halving never raises the peak, so past the limit only the count changes
+        if steps > MAX_STEPS:
+            return MAX_STEPS + 1, max_val
+        if n == 1:
+            return steps, max_val
+
+
+def collatz_steps_gmpy2(n):
+    """
+    collatz_steps_shift on GMP integers, with gmpy2.bit_scan1 counting the
+    trailing zeros.
+    Returns: (steps, max_value_reached)
+    """
+    if n == 1:
+        return 0, 1
+    
+    n = gmpy2.mpz(n)
+    steps = 0
+    max_val = n
+    
+    while True:
+        if n & 1:
+            n = 3 * n + 1
+            steps += 1
+            if n > max_val:
+                max_val = n
+            if steps > MAX_STEPS:
+                return steps, int(max_val)
+        
+        zeros = gmpy2.bit_scan1(n)
+        n >>= zeros
+        steps += zeros
+        if steps > MAX_STEPS:
+            return MAX_STEPS + 1, int(max_val)
+        if n == 1:
+            return steps, int(max_val)
+
+
+# Number of low bits consumed per jump by collatz_steps_jump
+JUMP_BITS = 12
+
+_jump_tables = {}
+
+
+def build_jump_table(bits=JUMP_BITS):
+    """
+    Precompute how every residue mod 2^bits advances over `bits` halving steps.
+    
+    Writing n = a * 2^bits + b, the value after `bits` steps of the shortcut
+    map T(x) = x/2 or (3x+1)/2 is a * 3^c + d, which covers bits + c ordinary
+    Collatz steps (c = number of odd steps, fixed by b). Every 3x+1 value
+    inside the jump is (M*n + A) >> s for constants fixed by b; for large
+    enough n the one with the biggest M/2^s is the maximum, so the table keeps
+    only that candidate plus the smallest n for which the ordering is exact.
+    Returns: dict of per-residue lists and the exactness threshold
+    """
+    size = 1 << bits
+    end_mult = [0] * size
+    end_add = [0] * size
+    jump_steps = [0] * size
+    peak_mult = [0] * size
+    peak_add = [0] * size
+    peak_shift = [0] * size
+    # Below 2^(bits+1) a jump could pass through 1, so always stay above it
+    threshold = 1 << (bits + 1)
+    
+    for b in range(size):
+        # After i steps the value is (3^c * n + e) / 2^i, and its parity is
+        # decided by b alone while i < bits
+        c, e, x = 0, 0, b
+        candidates = []
+        for i in range(bits):
+            if x % 2 == 0:
+                x //= 2
+            else:
+                candidates.append((3 ** (c + 1), 3 * e + (1 << i), i))
+                e = 3 * e + (1 << i)
+                c += 1
+                x = (3 * x + 1) // 2
+        
+        end_mult[b] = 3 ** c
+        end_add[b] = (3 ** c * b + e) >> bits
+        jump_steps[b] = bits + c
+        if not candidates:
+            continue
+        
+        # The end value can also be a candidate for the maximum
+        candidates.append((3 ** c, e, bits))
+        best_m, best_a, best_s = max(candidates, key=lambda t: t[0] << (bits - t[2]))
+        peak_mult[b], peak_add[b], peak_shift[b] = best_m, best_a, best_s
+        
+        # Smallest n where the best candidate is >= every other one
+        for m, a, s in candidates:
+            slope = (best_m << (bits - best_s)) - (m << (bits - s))
+            offset = (a << (bits - s)) - (best_a << (bits - best_s))
+            if slope > 0 and offset > 0:
+                threshold = max(threshold, -(-offset // slope))
+    
+    return {
+        'bits': bits,
+        'mask': size - 1,
+        'end_mult': end_mult,
+        'end_add': end_add,
+        'steps': jump_steps,
+        'peak_mult': peak_mult,
+        'peak_add': peak_add,
+        'peak_shift': peak_shift,
+        'threshold': threshold
+    }
+
+
+def get_jump_table(bits=JUMP_BITS):
+    """Return the jump table for `bits`, building it once per process."""
+    table = _jump_tables.get(bits)
+    if table is None:
+        table = _jump_tables[bits] = build_jump_table(bits)
+    return table
+
+
+def collatz_steps_jump(n, bits=JUMP_BITS):
+    """
+    Same result as collatz_steps, advancing `bits` halving steps per iteration
+    with a precomputed jump table. Step counts and peaks are exact: large
+    values use the table, and the tail below the table threshold is finished
+    one step at a time.
+    Returns: (steps, max_value_reached)
+    """
+    if n == 1:
+        return 0, 1
+    
+    table = get_jump_table(bits)
+    mask = table['mask']
+    end_mult = table['end_mult']
+    end_add = table['end_add']
+    jump_steps = table['steps']
+    peak_mult = table['peak_mult']
+    peak_add = table['peak_add']
+    peak_shift = table['peak_shift']
+    threshold = table['threshold']
+    # A jump adds at most 2 * bits steps; stop early enough that the safety
+    # limit below triggers on exactly the same step as collatz_steps
+    step_limit = MAX_STEPS - 2 * bits
+    
+    steps = 0
+    max_val = n
+    
+    while n >= threshold and steps <= step_limit:
+        b = n & mask
+        m = peak_mult[b]
+        if m:
+            peak = (n * m + peak_add[b]) >> peak_shift[b]
+            if peak > max_val:
+                max_val = peak
+        n = (n >> bits) * end_mult[b] + end_add[b]
+        steps += jump_steps[b]
+    
+    while n != 1:
+        if n % 2 == 0:
+            n = n // 2
+        else:
+            n = 3 * n + 1
+        
+        steps += 1
+        if n > max_val:
+            max_val = n
+        
+        # Safety check
+        if steps > MAX_STEPS:
+            return steps, max_val
+    
+    return steps, max_val
+
+
+# Values below 2^TAIL_BITS finish with one lookup in the tail table
+TAIL_BITS = 24
+# Building the table takes about 25 bytes of RAM per value at its peak (10
+# on disk), so 2^26 needs about 1.7 GB of memory and a 640 MB file
+TAIL_MAX_BITS = 26
+
+_tail_tables = {}
+
+
+def build_tail_columns(bits):
+    """
+    Compute the total steps and peak of every n below 2^bits.
+    
+    Each n is followed only until it drops below itself, to some v whose
+    totals are already known: steps(n) = s + steps(v) and peak(n) =
+    max(highest value on the way, peak(v)). With numpy, all n advance
+    together and the chains n -> v -> ... are summed by pointer jumping.
+    Returns: (steps as uint16, peaks as uint64) numpy arrays or
+        array.array('H') and array.array('Q'), indexed by n
+    """
+    size = 1 << bits
+    if np is not None:
+        # Follow each n until it drops below itself, a block of n at a time
+        nxt = np.zeros(size, dtype=np.uint32)
+        steps = np.zeros(size, dtype=np.uint32)
+        peaks = np.arange(size, dtype=np.uint64)
+        nxt[1] = 1
+        limit = np.uint64((2 ** 64 - 2) // 3)
+        for block in range(2, size, 1 << 20):
+            active = np.arange(block, min(block + (1 << 20), size), dtype=np.uint64)
+            x = active.copy()
+            while active.size:
+                odd = (x & np.uint64(1)).astype(bool)
+                if (x[odd] > limit).any():
+                    raise OverflowError(f"tail table for 2^{bits} overflows 64-bit peaks")
+                x = np.where(odd, x * np.uint64(3) + np.uint64(1), x >> np.uint64(1))
+                index = active.astype(np.int64)
+                steps[index] += 1
+                peaks[index] = np.maximum(peaks[index], x)
+                below = x < active
+                nxt[index[below]] = x[below]
+                active = active[~below]
+                x = x[~below]
+        
+        # Sum the chains n -> v -> ... -> 1 by pointer jumping
+        while (nxt > 1).any():
+            steps += steps[nxt]
+            np.maximum(peaks, peaks[nxt], out=peaks)
+            nxt = nxt[nxt]
+        return steps.astype(np.uint16), peaks
+    
+    steps = array.array('H', bytes(2 * size))
+    peaks = array.array('Q', bytes(8 * size))
+    if size > 1:
+        peaks[1] = 1
+    for n in range(2, size):
+        v = n
+        s = 0
+        m = n
+        while v >= n:
+            if v & 1:
+                v = 3 * v + 1
+                if v > m:
+                    m = v
+            else:
+                v >>= 1
+            s += 1
+        steps[n] = s + steps[v]
+        peaks[n] = max(m, peaks[v])
+    return steps, peaks
+
+
+class TailTable:
+    """
+    Memory-mapped table of the total steps and peak of every n below
+    2^bits, built once and cached on disk (TAIL_TABLE_FILE).
+    
+    Trajectories of large numbers all end among small values, so
+    collatz_steps_tail stops as soon as one falls below the bound and adds
+    the stored remainder. Worker processes map the same file, so the table
+    is read once into the OS page cache and shared.
+    """
+    
+    MAGIC = b'CLZTAIL1'
+    HEADER = struct.Struct('<8sI8s')  # magic, bits, byte order of the columns
+    HEADER_SIZE = 64
+    
+    def __init__(self, path, file, mm, bits):
+        self.path = path
+        self.file = file
+        self.mm = mm
+        self.bits = bits
+        self.bound = 1 << bits
+        view = memoryview(mm)
+        self.steps = view[self.HEADER_SIZE:self.HEADER_SIZE + 2 * self.bound].cast('H')
+        peaks_offset = self.HEADER_SIZE + 2 * self.bound
+        self.peaks = view[peaks_offset:peaks_offset + 8 * self.bound].cast('Q')
+    
+    @classmethod
+    def open(cls, path):
+        """Open a table file; raises ValueError if it is not one or was built elsewhere."""
+        file = open(path, 'rb')
+        try:
+            mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            file.close()
+            raise ValueError(f"{path} is empty")
+        magic, bits, byteorder = cls.HEADER.unpack_from(mm)
+        if (magic != cls.MAGIC or byteorder.rstrip(b'\0').decode() != sys.byteorder
+                or len(mm) < cls.HEADER_SIZE + 10 * (1 << bits)):
+            mm.close()
+            file.close()
+            raise ValueError(f"{path} is not a tail table for this machine")
+        return cls(path, file, mm, bits)
+    
+    @classmethod
+    def build(cls, path, bits=TAIL_BITS):
+        """Build the table for values below 2^bits and move it into place."""
+        steps, peaks = build_tail_columns(bits)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, bits, sys.byteorder.encode())
+                    .ljust(cls.HEADER_SIZE, b'\0'))
+            steps.tofile(f)
+            peaks.tofile(f)
+        os.replace(tmp_path, path)
+        return cls.open(path)
+    
+    def close(self):
+        self.steps.release()
+        self.peaks.release()
+        self.mm.close()
+        self.file.close()
+
+
+def get_tail_table(bits=None, path=TAIL_TABLE_FILE):
+    """
+    Return the tail table, opening it once per process and building it on
+    first use. With `bits`, a table built for a different bound is rebuilt.
+    """
+    table = _tail_tables.get(path)
+    if table is not None and bits in (None, table.bits):
+        return table
+    if table is not None:
+        table.close()
+        table = None
+    
+    if os.path.exists(path):
+        try:
+            table = TailTable.open(path)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"⚠️  Ignoring unreadable tail table: {e}")
+        if table is not None and bits not in (None, table.bits):
+            table.close()
+            table = None
+    if table is None:
+        bits = bits or TAIL_BITS
+        print(f"🔄 Building tail table for values below 2^{bits} ({path}, "
+              f"{10 * (1 << bits) / 1024 / 1024:.0f} MB); this happens once...")
+        start = time.time()
+        table = TailTable.build(path, bits)
+        print(f"   ✓ Built in {time.time() - start:.1f} seconds")
+    _tail_tables[path] = table
+    return table
+
+
+def collatz_steps_tail(n, bits=JUMP_BITS):
+    """
+    Same result as collatz_steps_jump, but the trajectory ends as soon as
+    it falls below the tail table's bound: the table holds the exact
+    remaining steps and peak of every smaller value.
+    Returns: (steps, max_value_reached)
+    """
+    tail = get_tail_table()
+    bound = tail.bound
+    if 0 < n < bound:
+        return tail.steps[n], tail.peaks[n]
+    
+    table = get_jump_table(bits)
+    mask = table['mask']
+    end_mult = table['end_mult']
+    end_add = table['end_add']
+    jump_steps = table['steps']
+    peak_mult = table['peak_mult']
+    peak_add = table['peak_add']
+    peak_shift = table['peak_shift']
+    threshold = max(table['threshold'], bound)
+    step_limit = MAX_STEPS - 2 * bits
+    
+    steps = 0
+    max_val = n
+    
+    while n >= threshold and steps <= step_limit:
+        b = n & mask
+        m = peak_mult[b]
+        if m:
+            peak = (n * m + peak_add[b]) >> peak_shift[b]
+            if peak > max_val:
+                max_val = peak
+        n = (n >> bits) * end_mult[b] + end_add[b]
+        steps += jump_steps[b]
+    
+    while n != 1:
+        # The stored tail is exact unless it would run past the safety limit
+        if n < bound and steps + tail.steps[n] <= MAX_STEPS:
+            peak = tail.peaks[n]
+            return steps + tail.steps[n], peak if peak > max_val else max_val
+        
+        if n % 2 == 0:
+            n = n // 2
+        else:
+            n = 3 * n + 1
+        
+        steps += 1
+        if n > max_val:
+            max_val = n
+        
+        # Safety check
+        if steps > MAX_STEPS:
+            return steps, max_val
+    
+    return steps, max_val
+
+
+# Low bits examined by the residue sieve of verify_range
+SIEVE_BITS = 16
+
+_descent_sieves = {}
+
+
+def build_descent_sieve(bits=SIEVE_BITS):
+    """
+    Find the residues mod 2^bits whose trajectories are not proven to drop
+    below their start within `bits` steps of the shortcut map T.
+    
+    Writing n = m * 2^bits + r, the value after i <= bits steps is
+    (3^c * n + e) / 2^i with c and e fixed by r. Once 3^c < 2^i, that value
+    is below n for every n > e / (2^i - 3^c), so the whole residue class
+    descends and can be skipped; most classes do (all even ones at i = 1).
+    For the survivors, 3^c > 2^i at every step, so none of the first `bits`
+    steps goes below n and checking can start from T^bits(n) = 3^c * m + d.
+    Returns: dict of the surviving residues (sorted), their multipliers and
+        addends, and the smallest n from which skipping is exact
+    """
+    size = 1 << bits
+    residues = []
+    mults = []
+    adds = []
+    threshold = 1
+    
+    for r in range(size):
+        c, e, x = 0, 0, r
+        for i in range(1, bits + 1):
+            if x % 2 == 0:
+                x //= 2
+            else:
+                e = 3 * e + (1 << (i - 1))
+                c += 1
+                x = (3 * x + 1) // 2
+            if 3 ** c < 1 << i:
+                threshold = max(threshold, e // ((1 << i) - 3 ** c) + 1)
+                break
+        else:
+            residues.append(r)
+            mults.append(3 ** c)
+            adds.append((3 ** c * r + e) >> bits)
+    
+    return {
+        'bits': bits,
+        'residues': residues,
+        'mults': mults,
+        'adds': adds,
+        'threshold': threshold
+    }
+
+
+def get_descent_sieve(bits=SIEVE_BITS):
+    """Return the descent sieve for `bits`, building it once per process."""
+    sieve = _descent_sieves.get(bits)
+    if sieve is None:
+        sieve = _descent_sieves[bits] = build_descent_sieve(bits)
+    return sieve
+
+
+def first_failure_to_descend(low, high, bits=SIEVE_BITS):
+    """
+    Check that every n in [low, high] reaches a value below n (1 counts as
+    done). Blocks of 2^bits numbers at or above the sieve threshold only
+    visit the surviving residues, starting `bits` steps in; each trajectory
+    stops as soon as it is below its start.
+    Returns: (first n that did not descend within MAX_STEPS or None,
+              number of trajectories followed)
+    """
+    sieve = get_descent_sieve(bits)
+    residues, mults, adds = sieve['residues'], sieve['mults'], sieve['adds']
+    size = 1 << bits
+    followed = 0
+    
+    n = max(low, 2)
+    while n <= high:
+        base = n - (n & (size - 1))
+        block_high = min(high, base + size - 1)
+        if base >= sieve['threshold']:
+            m = base >> bits
+            first = bisect.bisect_left(residues, n - base)
+            last = bisect.bisect_right(residues, block_high - base)
+            for i in range(first, last):
+                start = base + residues[i]
+                v = mults[i] * m + adds[i]
+                steps = 0
+                while v >= start:
+                    if v & 1:
+                        v = (3 * v + 1) >> 1
+                    else:
+                        v >>= (v & -v).bit_length() - 1
+                    steps += 1
+                    if steps > MAX_STEPS:
+                        return start, followed
+                followed += 1
+        else:
+            for start in range(n, block_high + 1):
+                v = start
+                steps = 0
+                while v >= start:
+                    if v & 1:
+                        v = (3 * v + 1) >> 1
+                    else:
+                        v >>= (v & -v).bit_length() - 1
+                    steps += 1
+                    if steps > MAX_STEPS:
+                        return start, followed
+                followed += 1
+        n = block_high + 1
+    return None, followed
+
+
+# Values in the numpy batch engine are split into 32-bit limbs held in uint64
+# lanes, so a limb times a jump-table multiplier never overflows
+LIMB_BITS = 32
+LIMB_COUNT = 4  # 128-bit values; peaks above this fall back to collatz_steps
+LIMB_MASK = (1 << LIMB_BITS) - 1
+
+_numpy_jump_tables = {}
+
+
+def _get_numpy_jump_table(bits):
+    """Return the jump table for `bits` as uint64 arrays for the batch engine."""
+    table = _numpy_jump_tables.get(bits)
+    if table is None:
+        scalar = get_jump_table(bits)
+        table = {key: np.array(scalar[key], dtype=np.uint64)
+                 for key in ('end_mult', 'end_add', 'steps',
+                             'peak_mult', 'peak_add', 'peak_shift')}
+        table['threshold'] = scalar['threshold']
+        _numpy_jump_tables[bits] = table
+    return table
+
+
+def _to_limbs(values):
+    """Split ints below 2^128 into a (LIMB_COUNT, len) array of 32-bit limbs."""
+    return np.array([[(v >> (LIMB_BITS * i)) & LIMB_MASK for v in values]
+                     for i in range(LIMB_COUNT)], dtype=np.uint64).reshape(LIMB_COUNT, len(values))
+
+
+def _from_limbs(limbs):
+    """Join a (LIMB_COUNT, len) limb array back into Python ints."""
+    values = [0] * limbs.shape[1]
+    for i, limb in enumerate(limbs.tolist()):
+        values = [v | (x << (LIMB_BITS * i)) for v, x in zip(values, limb)]
+    return values
+
+
+def _mul_add_limbs(limbs, mult, add):
+    """
+    Compute limbs * mult + add per lane, where mult and add are uint64 arrays
+    small enough that no limb product overflows 64 bits.
+    Returns: (LIMB_COUNT + 1, len) limb array; the last row is the overflow
+    """
+    out = np.empty((LIMB_COUNT + 1, limbs.shape[1]), dtype=np.uint64)
+    carry = add
+    for i in range(LIMB_COUNT):
+        t = limbs[i] * mult + carry
+        out[i] = t & LIMB_MASK
+        carry = t >> LIMB_BITS
+    out[LIMB_COUNT] = carry
+    return out
+
+
+def _limbs_greater(a, b):
+    """Lane-wise a > b for two limb arrays of the same shape."""
+    greater = np.zeros(a.shape[1], dtype=bool)
+    equal = np.ones(a.shape[1], dtype=bool)
+    for i in range(a.shape[0] - 1, -1, -1):
+        greater |= equal & (a[i] > b[i])
+        equal &= a[i] == b[i]
+    return greater
+
+
+def collatz_steps_batch(numbers, bits=JUMP_BITS):
+    """
+    Compute every trajectory in `numbers` at once with numpy.
+    
+    Candidates are held as 32-bit limbs and advanced in lockstep with the same
+    jump table as collatz_steps_jump; lanes that drop below the table
+    threshold finish one shortcut step at a time in a single uint64 limb.
+    Finished lanes are dropped from the working arrays as they reach 1. Any
+    lane that would not fit in 128 bits, or that runs into the MAX_STEPS
+    safety limit, is recomputed with collatz_steps.
+    Returns: (steps, peaks) arrays in the same order as `numbers`
+    """
+    if np is None:
+        raise RuntimeError("The numpy batch engine requires numpy (pip install numpy)")
+    
+    count = len(numbers)
+    table = _get_numpy_jump_table(bits)
+    threshold = table['threshold']
+    steps_out = np.zeros(count, dtype=np.int64)
+    peaks_out = np.empty(count, dtype=object)
+    fallback = [i for i, n in enumerate(numbers) if not 0 < n < 1 << (LIMB_BITS * LIMB_COUNT)]
+    lanes = np.array([i for i, n in enumerate(numbers) if 0 < n < 1 << (LIMB_BITS * LIMB_COUNT)],
+                     dtype=np.int64)
+    
+    value = _to_limbs([numbers[i] for i in lanes.tolist()])
+    peak = value.copy()
+    steps = np.zeros(len(lanes), dtype=np.uint64)
+    step_limit = MAX_STEPS - 2 * bits
+    bits_u = np.uint64(bits)
+    back_u = np.uint64(LIMB_BITS - bits)
+    
+    # Phase 1: jump `bits` halving steps at a time while above the threshold
+    small = (value[1:] == 0).all(axis=0) & (value[0] < threshold)
+    tail_lanes, tail_value, tail_peak, tail_steps = [lanes[small]], [value[0, small]], [peak[:, small]], [steps[small]]
+    big = ~small
+    lanes, value, peak, steps = lanes[big], value[:, big], peak[:, big], steps[big]
+    
+    while len(lanes):
+        residue = value[0] & np.uint64(table['end_mult'].size - 1)
+        
+        # Largest 3x+1 value inside the jump: (n * M + A) >> s
+        product = _mul_add_limbs(value, table['peak_mult'][residue], table['peak_add'][residue])
+        shift = table['peak_shift'][residue]
+        back = np.uint64(LIMB_BITS) - shift
+        jump_peak = np.empty_like(value)
+        for i in range(LIMB_COUNT):
+            jump_peak[i] = (product[i] >> shift) | ((product[i + 1] << back) & LIMB_MASK)
+        overflow = (product[LIMB_COUNT] >> shift) != 0
+        higher = _limbs_greater(jump_peak, peak)
+        peak[:, higher] = jump_peak[:, higher]
+        
+        # Next value: (n >> bits) * 3^c + d
+        shifted = np.empty_like(value)
+        for i in range(LIMB_COUNT - 1):
+            shifted[i] = (value[i] >> bits_u) | ((value[i + 1] << back_u) & LIMB_MASK)
+        shifted[LIMB_COUNT - 1] = value[LIMB_COUNT - 1] >> bits_u
+        nxt = _mul_add_limbs(shifted, table['end_mult'][residue], table['end_add'][residue])
+        overflow |= nxt[LIMB_COUNT] != 0
+        value = nxt[:LIMB_COUNT]
+        steps += table['steps'][residue]
+        
+        overflow |= steps > step_limit
+        fallback.extend(lanes[overflow].tolist())
+        small = ~overflow & (value[1:] == 0).all(axis=0) & (value[0] < threshold)
+        tail_lanes.append(lanes[small])
+        tail_value.append(value[0, small])
+        tail_peak.append(peak[:, small])
+        tail_steps.append(steps[small])
+        keep = ~(overflow | small)
+        lanes, value, peak, steps = lanes[keep], value[:, keep], peak[:, keep], steps[keep]
+    
+    # Phase 2: shortcut steps on one limb; values stay far below 2^64 here
+    lanes = np.concatenate(tail_lanes)
+    value = np.concatenate(tail_value)
+    peak = np.concatenate(tail_peak, axis=1)
+    steps = np.concatenate(tail_steps)
+    one = np.uint64(1)
+    
+    while len(lanes):
+        done = value == one
+        if done.any():
+            steps_out[lanes[done]] = steps[done]
+            peaks_out[lanes[done]] = _from_limbs(peak[:, done])
+            keep = ~done
+            lanes, value, peak, steps = lanes[keep], value[keep], peak[:, keep], steps[keep]
+            if not len(lanes):
+                break
+        
+        odd = (value & one) == one
+        up = value * np.uint64(3) + one
+        fits = (peak[2:] == 0).all(axis=0)
+        low_peak = peak[0] | (peak[1] << np.uint64(LIMB_BITS))
+        higher = odd & fits & (up > low_peak)
+        peak[0, higher] = up[higher] & LIMB_MASK
+        peak[1, higher] = up[higher] >> np.uint64(LIMB_BITS)
+        value = np.where(odd, up, value) >> one
+        steps += odd.astype(np.uint64) + one
+        
+        limited = steps > MAX_STEPS - 2
+        if limited.any():
+            fallback.extend(lanes[limited].tolist())
+            keep = ~limited
+            lanes, value, peak, steps = lanes[keep], value[keep], peak[:, keep], steps[keep]
+    
+    for i in fallback:
+        steps_out[i], peaks_out[i] = collatz_steps(numbers[i])
+    
+    return steps_out, peaks_out
+
+
+# Batch kernels compute a whole batch per call instead of one number
+BATCH_KERNELS = {
+    'numpy': collatz_steps_batch
+}
+
+
+# Kernels selectable with --kernel; all return identical (steps, peak)
+KERNELS = {
+    'reference': collatz_steps,
+    'shift': collatz_steps_shift,
+    'jump': collatz_steps_jump,
+    'tail': collatz_steps_tail
+}
+if gmpy2 is not None:
+    KERNELS['gmpy2'] = collatz_steps_gmpy2
+
+KERNEL_CHECK_SAMPLE = 1000  # Random numbers per differential check
+KERNEL_CALIBRATION_SAMPLE = 500  # Numbers timed per kernel by calibrate_kernels
+
+
+def available_kernels():
+    """
+    Kernels usable without extra setup: batch kernels need numpy, and the
+    tail kernel is only included once its table has been built, since
+    building it takes a while and a few hundred MB of disk.
+    Returns: list of kernel names
+    """
+    names = [name for name in KERNELS
+             if name != 'tail' or TAIL_TABLE_FILE in _tail_tables or os.path.exists(TAIL_TABLE_FILE)]
+    if np is not None:
+        names.extend(BATCH_KERNELS)
+    return names
+
+
+def run_kernel(name, numbers):
+    """
+    Compute every number with one kernel from KERNELS or BATCH_KERNELS.
+    Returns: list of (steps, max_value_reached)
+    """
+    if name in BATCH_KERNELS:
+        steps_array, peaks = BATCH_KERNELS[name](numbers)
+        return list(zip(steps_array.tolist(), peaks))
+    compute = KERNELS[name]
+    return [compute(n) for n in numbers]
+
+
+def kernel_check_numbers(min_value, max_value, count=KERNEL_CHECK_SAMPLE, seed=None):
+    """
+    Numbers for a differential check: the edges of the range, small and
+    famous starting values, values around powers of two (where the table
+    kernels switch between jumps and single steps) and `count` random
+    numbers from the range.
+    """
+    rng = random.Random(seed)
+    numbers = [1, 2, 3, 7, 27, 97, 871, 77031, 837799, min_value, max_value]
+    for bits in (JUMP_BITS, JUMP_BITS + 1, TAIL_BITS, 32, 63, 64, 65, 100, 127, 128):
+        numbers.extend(((1 << bits) - 1, 1 << bits, (1 << bits) + 1))
+    threshold = get_jump_table()['threshold']
+    numbers.extend((threshold - 1, threshold, threshold + 1))
+    numbers.extend(rng.randint(min_value, max_value) for _ in range(count))
+    return numbers
+
+
+def check_kernels(numbers, kernels=None):
+    """
+    Differential check: compute `numbers` with every kernel (default:
+    available_kernels()) and compare steps and peaks exactly with the
+    reference collatz_steps.
+    Returns: dict of kernel name -> list of (n, expected, got) mismatches
+    """
+    expected = [collatz_steps(n) for n in numbers]
+    mismatches = {}
+    for name in kernels or available_kernels():
+        if name == 'reference':
+            continue
+        got = run_kernel(name, numbers)
+        mismatches[name] = [(n, want, tuple(have))
+                            for n, want, have in zip(numbers, expected, got)
+                            if tuple(have) != want]
+    return mismatches
+
+
+def calibrate_kernels(min_value, max_value, sample_size=KERNEL_CALIBRATION_SAMPLE, kernels=None):
+    """
+    Time every kernel (default: available_kernels()) on the same random
+    sample of the range, keeping the fastest of three runs. Lookup tables
+    are built before timing, and a kernel whose results differ from the
+    reference on the sample is left out.
+    Returns: (name of the fastest kernel, dict of name -> seconds per number)
+    """
+    rng = random.Random()
+    numbers = [rng.randint(min_value, max_value) for _ in range(sample_size)]
+    expected = run_kernel('reference', numbers)
+    
+    timings = {}
+    for name in kernels or available_kernels():
+        run_kernel(name, numbers[:10])  # Build any lookup tables outside the timing
+        best = float('inf')
+        for _ in range(3):
+            start = time.perf_counter()
+            results = run_kernel(name, numbers)
+            best = min(best, time.perf_counter() - start)
+        if [tuple(result) for result in results] != expected:
+            print(f"⚠️  Kernel {name} disagrees with the reference; not using it")
+            continue
+        timings[name] = best / len(numbers)
+    return min(timings, key=timings.get), timings
+
+
+def kernel_calibration_key(min_value, max_value, kernels=None):
+    """
+    What a calibration depends on: the machine, the Python build, the range
+    and the kernels available (see available_kernels).
+    """
+    return (f"{platform.system()}-{platform.machine()} {platform.python_implementation()} "
+            f"{platform.python_version()} {min_value}:{max_value} "
+            f"{','.join(sorted(kernels or available_kernels()))}")
+
+
+def load_kernel_calibration(conn, key):
+    """
+    Load a calibration saved by save_kernel_calibration for this key.
+    Returns: (kernel name, dict of name -> seconds per number), or None
+    """
+    try:
+        row = conn.execute('SELECT value FROM stats WHERE key = ?',
+                           ('kernel_calibration',)).fetchone()
+        if row:
+            entry = json.loads(row[0]).get(key)
+            if entry:
+                return entry['kernel'], entry['timings']
+    except Exception as e:
+        print(f"⚠️  Error loading kernel calibration: {e}")
+    return None
+
+
+def save_kernel_calibration(conn, key, kernel, timings):
+    """Record the result of calibrate_kernels for this key; the caller commits."""
+    try:
+        row = conn.execute('SELECT value FROM stats WHERE key = ?',
+                           ('kernel_calibration',)).fetchone()
+        calibrations = json.loads(row[0]) if row else {}
+        calibrations[key] = {'kernel': kernel, 'timings': timings,
+                             'calibrated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        conn.execute(
+            'INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)',
+            ('kernel_calibration', json.dumps(calibrations))
+        )
+    except Exception as e:
+        print(f"⚠️  Error saving kernel calibration: {e}")
+
+
+class QuantileSketch:
+    """
+    Constant-memory streaming quantile sketch (DDSketch-style).
+    
+    Values land in logarithmic buckets, so every quantile is answered within
+    `relative_accuracy` of the true value. Sketches merge by adding bucket
+    counts; when there are too many buckets the lowest ones are collapsed,
+    which only costs accuracy at the bottom of the distribution.
+    """
+    
+    def __init__(self, relative_accuracy=SKETCH_ACCURACY, max_buckets=SKETCH_MAX_BUCKETS):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+    
+    def add(self, value, count=1):
+        """Record `value` (count times)."""
+        if value <= 0:
+            self.zero_count += count
+        else:
+            index = math.ceil(math.log(value) / self.log_gamma)
+            self.buckets[index] = self.buckets.get(index, 0) + count
+            if len(self.buckets) > self.max_buckets:
+                self._collapse()
+        self.count += count
+    
+    def remove(self, value, count=1):
+        """
+        Take back `count` earlier adds of `value`. A value whose bucket has
+        since been collapsed is taken from the lowest bucket, where it went;
+        with no buckets left there is nothing to take it from.
+        """
+        if value <= 0:
+            self.zero_count -= count
+        else:
+            index = math.ceil(math.log(value) / self.log_gamma)
+            if index not in self.buckets:
+                if not self.buckets:
+                    return
+                index = min(self.buckets)
+            self.buckets[index] -= count
+            if not self.buckets[index]:
+                del self.buckets[index]
+        self.count -= count
+    
+    def merge(self, other):
+        """Add another sketch with the same accuracy into this one."""
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+    
+    def _collapse(self):
+        """Fold the lowest buckets together until the bucket limit holds."""
+        indexes = sorted(self.buckets)
+        excess = len(indexes) - self.max_buckets
+        folded = sum(self.buckets.pop(i) for i in indexes[:excess])
+        self.buckets[indexes[excess]] += folded
+    
+    def quantile(self, q):
+        """Approximate value at quantile q (0..1), or None if empty."""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+    
+    def to_dict(self):
+        """JSON-friendly representation."""
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'max_buckets': self.max_buckets,
+            'buckets': self.buckets,
+            'zero_count': self.zero_count,
+            'count': self.count
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a sketch saved with to_dict."""
+        sketch = cls(data['relative_accuracy'], data['max_buckets'])
+        sketch.buckets = {int(i): c for i, c in data['buckets'].items()}
+        sketch.zero_count = data['zero_count']
+        sketch.count = data['count']
+        return sketch
+
+
+class SessionStats:
+    """
+    Streaming statistics over a sequence of tested numbers.
+    
+    Keeps first-seen records, bounded top-K heaps, fixed-bucket histograms of
+    steps and of log2(peak/start) keyed by the starting number's bit length,
+    and quantile sketches for both. Memory does not grow with the number of
+    values. Instances built per batch or per worker merge cheaply; merging
+    in testing order keeps the first-seen records identical to adding the
+    numbers one by one.
+    """
+    
+    def __init__(self, top_k=TOP_K):
+        self.top_k = top_k
+        self.count = 0
+        self.total_steps = 0
+        self.longest = (-1, 0)
+        self.shortest = (float('inf'), 0)
+        self.highest = (-1, 0)
+        self.top_longest = []  # Min-heaps of (steps, num) / (peak, num)
+        self.top_highest = []
+        self.steps_histogram = {}  # bit length -> {bucket start: count}
+        self.ratio_histogram = {}  # bit length -> {floor(log2(peak/start)): count}
+        self.steps_sketch = QuantileSketch()
+        self.ratio_sketch = QuantileSketch()
+        self.records = None  # Packed per-number results for a ResultsStore; never merged
+    
+    def add(self, num, steps, peak):
+        """Record one tested number."""
+        self.count += 1
+        self.total_steps += steps
+        
+        # Strict comparisons keep the first number that set each record
+        if steps > self.longest[0]:
+            self.longest = (steps, num)
+        if steps < self.shortest[0]:
+            self.shortest = (steps, num)
+        if peak > self.highest[0]:
+            self.highest = (peak, num)
+        
+        self._push(self.top_longest, (steps, num))
+        self._push(self.top_highest, (peak, num))
+        
+        bits = num.bit_length()
+        histogram = self.steps_histogram.setdefault(bits, {})
+        bucket = steps - steps % STEPS_BUCKET_WIDTH
+        histogram[bucket] = histogram.get(bucket, 0) + 1
+        histogram = self.ratio_histogram.setdefault(bits, {})
+        bucket = peak.bit_length() - bits
+        histogram[bucket] = histogram.get(bucket, 0) + 1
+        
+        self.steps_sketch.add(steps)
+        self.ratio_sketch.add(peak / num)
+    
+    def remove(self, num, steps, peak):
+        """
+        Take back a number recorded with add, e.g. one found afterwards to
+        have been tested before. Counts, histograms and sketches are exact.
+        A record it held passes to the next entry of its top-K list, which
+        is one entry short until a later number fills it; the shortest
+        sequence record is left as it is.
+        """
+        self.count -= 1
+        self.total_steps -= steps
+        for heap, item in ((self.top_longest, (steps, num)), (self.top_highest, (peak, num))):
+            if item in heap:
+                heap.remove(item)
+                heapq.heapify(heap)
+        if self.longest == (steps, num):
+            self.longest = max(self.top_longest, default=(-1, 0))
+        if self.highest == (peak, num):
+            self.highest = max(self.top_highest, default=(-1, 0))
+        
+        bits = num.bit_length()
+        for histogram, bucket in ((self.steps_histogram, steps - steps % STEPS_BUCKET_WIDTH),
+                                  (self.ratio_histogram, peak.bit_length() - bits)):
+            buckets = histogram[bits]
+            buckets[bucket] -= 1
+            if not buckets[bucket]:
+                del buckets[bucket]
+                if not buckets:
+                    del histogram[bits]
+        
+        self.steps_sketch.remove(steps)
+        self.ratio_sketch.remove(peak / num)
+    
+    def _push(self, heap, item):
+        """Keep the top_k largest items in a min-heap."""
+        if len(heap) < self.top_k:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+    
+    def merge(self, other):
+        """Fold in the stats of numbers tested after the ones seen so far."""
+        self.count += other.count
+        self.total_steps += other.total_steps
+        if other.longest[0] > self.longest[0]:
+            self.longest = other.longest
+        if other.shortest[0] < self.shortest[0]:
+            self.shortest = other.shortest
+        if other.highest[0] > self.highest[0]:
+            self.highest = other.highest
+        
+        for item in other.top_longest:
+            self._push(self.top_longest, item)
+        for item in other.top_highest:
+            self._push(self.top_highest, item)
+        
+        for mine, theirs in ((self.steps_histogram, other.steps_histogram),
+                             (self.ratio_histogram, other.ratio_histogram)):
+            for bits, buckets in theirs.items():
+                histogram = mine.setdefault(bits, {})
+                for bucket, count in buckets.items():
+                    histogram[bucket] = histogram.get(bucket, 0) + count
+        
+        self.steps_sketch.merge(other.steps_sketch)
+        self.ratio_sketch.merge(other.ratio_sketch)
+    
+    def sorted_longest(self):
+        """This set's top_k longest sequences as (steps, num), best first."""
+        return sorted(self.top_longest, reverse=True)
+    
+    def sorted_highest(self):
+        """This set's top_k highest peaks as (peak, num), best first."""
+        return sorted(self.top_highest, reverse=True)
+    
+    def percentiles(self, quantiles=(0.5, 0.9, 0.99)):
+        """Approximate step and peak/start percentiles from the sketches."""
+        return {
+            'steps': {q: self.steps_sketch.quantile(q) for q in quantiles},
+            'peak_ratio': {q: self.ratio_sketch.quantile(q) for q in quantiles}
+        }
+    
+    def to_dict(self):
+        """JSON-friendly representation (infinite shortest is stored as None)."""
+        return {
+            'top_k': self.top_k,
+            'count': self.count,
+            'total_steps': self.total_steps,
+            'longest': list(self.longest),
+            'shortest': list(self.shortest) if self.count else None,
+            'highest': list(self.highest),
+            'top_longest': [list(item) for item in self.sorted_longest()],
+            'top_highest': [list(item) for item in self.sorted_highest()],
+            'steps_histogram': self.steps_histogram,
+            'ratio_histogram': self.ratio_histogram,
+            'steps_sketch': self.steps_sketch.to_dict(),
+            'ratio_sketch': self.ratio_sketch.to_dict()
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild stats saved with to_dict."""
+        stats = cls(data['top_k'])
+        stats.count = data['count']
+        stats.total_steps = data['total_steps']
+        stats.longest = tuple(data['longest'])
+        if data['shortest'] is not None:
+            stats.shortest = tuple(data['shortest'])
+        stats.highest = tuple(data['highest'])
+        stats.top_longest = [tuple(item) for item in data['top_longest']]
+        stats.top_highest = [tuple(item) for item in data['top_highest']]
+        heapq.heapify(stats.top_longest)
+        heapq.heapify(stats.top_highest)
+        for name in ('steps_histogram', 'ratio_histogram'):
+            setattr(stats, name, {int(bits): {int(b): c for b, c in buckets.items()}
+                                  for bits, buckets in data[name].items()})
+        stats.steps_sketch = QuantileSketch.from_dict(data['steps_sketch'])
+        stats.ratio_sketch = QuantileSketch.from_dict(data['ratio_sketch'])
+        return stats
+
+
+class CompactKeySet:
+    """
+    Open-addressing hash set of the numbers drawn in a session.
+    
+    A Python set of big ints costs about 80 bytes per number. Here every
+    number below 2^128 is stored as two uint64 halves in flat arrays (numpy
+    when installed, else array('Q')), with linear probing. The table grows
+    by half whenever it is 80% full, so it stays between 53% and 80% full:
+    16 bytes per slot, or 20-30 bytes per number. An all-zero slot is empty,
+    which is why 0 and numbers of 2^128 or more go to a small overflow set.
+    
+    add_batch and find_batch take whole blocks of candidates; with numpy
+    each probe round is one vectorized pass over the block.
+    """
+    
+    MAX_LOAD = 0.8
+    GROWTH = 1.5
+    MIN_CAPACITY = 1024
+    MULTIPLIER = 0x9E3779B97F4A7C15  # Fibonacci hashing spreads clustered keys
+    VECTOR_MIN = 32  # Below this many keys left, probe one key at a time
+    MASK64 = (1 << 64) - 1
+    
+    def __init__(self, capacity=MIN_CAPACITY):
+        self.capacity = max(self.MIN_CAPACITY, int(capacity))
+        self.count = 0
+        self.overflow = set()
+        self.hi, self.lo = self._empty_table(self.capacity)
+    
+    @staticmethod
+    def _empty_table(capacity):
+        """Zeroed high and low halves for `capacity` slots."""
+        if np is not None:
+            return np.zeros(capacity, dtype=np.uint64), np.zeros(capacity, dtype=np.uint64)
+        return array.array('Q', bytes(8 * capacity)), array.array('Q', bytes(8 * capacity))
+    
+    def __len__(self):
+        return self.count + len(self.overflow)
+    
+    def __contains__(self, n):
+        return bool(self.find_batch([n]))
+    
+    @property
+    def nbytes(self):
+        """Bytes used by the slot arrays."""
+        return 16 * self.capacity
+    
+    def _split(self, numbers):
+        """Separate the numbers that fit the table from the overflow ones."""
+        if numbers and min(numbers) > 0 and not max(numbers) >> 128:
+            return numbers, []
+        fits, overflow = [], []
+        for n in numbers:
+            if 0 < n and not n >> 128:
+                fits.append(n)
+            else:
+                overflow.append(n)
+        return fits, overflow
+    
+    def add(self, n):
+        """Add one number; returns True if it was not in the set yet."""
+        return bool(self.add_batch([n]))
+    
+    def add_batch(self, numbers):
+        """
+        Add a block of numbers.
+        Returns: the numbers that were not in the set yet, in their original
+        order (a number repeated within the block counts once)
+        """
+        if np is None:
+            return [n for n in numbers if self._add_one(n)]
+        numbers = list(dict.fromkeys(numbers))
+        fits, overflow = self._split(numbers)
+        new = {}
+        for n in overflow:
+            new[n] = n not in self.overflow
+            self.overflow.add(n)
+        if fits:
+            if self.count + len(fits) > self.MAX_LOAD * self.capacity:
+                self._resize(self.count + len(fits))
+            added = self._insert(*self._halves(fits)).tolist()
+            if not overflow:
+                return list(itertools.compress(fits, added))
+            new.update(zip(fits, added))
+        return [n for n in numbers if new[n]]
+    
+    def find_batch(self, numbers):
+        """Returns: set of the numbers that are in the set"""
+        if np is None:
+            return {n for n in numbers if self._find_one(n)}
+        fits, overflow = self._split(numbers)
+        found = {n for n in overflow if n in self.overflow}
+        if fits:
+            hi, lo = self._halves(fits)
+            found.update(fits[i] for i in np.flatnonzero(self._lookup(hi, lo)).tolist())
+        return found
+    
+    def _halves(self, numbers):
+        """High and low 64-bit halves of each number as uint64 arrays."""
+        mask = self.MASK64
+        return (np.array([n >> 64 for n in numbers], dtype=np.uint64),
+                np.array([n & mask for n in numbers], dtype=np.uint64))
+    
+    def _slots(self, hi, lo):
+        """Home slot of each key."""
+        mixed = (lo * np.uint64(self.MULTIPLIER)) ^ hi
+        return (mixed % np.uint64(self.capacity)).astype(np.int64)
+    
+    def _insert(self, hi, lo):
+        """
+        Vectorized insert of distinct keys. Each round, keys aimed at an
+        empty slot write their low half there, those whose low half stuck
+        write their high half, and whichever key the slot now holds has
+        claimed it (numpy does not say which of several writes to one slot
+        wins, but this way the slot always holds one whole key). Keys that
+        find themselves are done, the rest move one slot on, and the few
+        left in long probe chains are finished one at a time.
+        Returns: bool array, True where the key was added
+        """
+        added = np.zeros(len(hi), dtype=bool)
+        slots = self._slots(hi, lo)
+        todo = np.arange(len(hi))
+        table_hi, table_lo = self.hi, self.lo
+        while todo.size >= self.VECTOR_MIN:
+            s = slots[todo]
+            key_hi = hi[todo]
+            key_lo = lo[todo]
+            empty = (table_hi[s] == 0) & (table_lo[s] == 0)
+            claims = s[empty]
+            table_lo[claims] = key_lo[empty]
+            stuck = empty & (table_lo[s] == key_lo)
+            table_hi[s[stuck]] = key_hi[stuck]
+            match = (table_hi[s] == key_hi) & (table_lo[s] == key_lo)
+            added[todo[match & empty]] = True
+            
+            move = ~match
+            slots[todo[move]] = (s[move] + 1) % self.capacity
+            todo = todo[move]
+        
+        for j in todo.tolist():
+            i = int(slots[j])
+            key_hi, key_lo = hi[j], lo[j]
+            while table_hi[i] or table_lo[i]:
+                if table_hi[i] == key_hi and table_lo[i] == key_lo:
+                    break
+                i = (i + 1) % self.capacity
+            else:
+                table_hi[i] = key_hi
+                table_lo[i] = key_lo
+                added[j] = True
+        self.count += int(added.sum())
+        return added
     
-    # Create tables
-    conn.execute('''CREATE TABLE IF NOT EXISTS tested (
-        hash BLOB PRIMARY KEY
-    ) WITHOUT ROWID''')
+    def _lookup(self, hi, lo):
+        """Vectorized membership test. Returns: bool array"""
+        found = np.zeros(len(hi), dtype=bool)
+        slots = self._slots(hi, lo)
+        todo = np.arange(len(hi))
+        while todo.size >= self.VECTOR_MIN:
+            s = slots[todo]
+            slot_hi = self.hi[s]
+            slot_lo = self.lo[s]
+            match = (slot_hi == hi[todo]) & (slot_lo == lo[todo])
+            found[todo[match]] = True
+            # A miss ends at the first empty slot
+            occupied = ~match & ((slot_hi != 0) | (slot_lo != 0))
+            slots[todo[occupied]] = (s[occupied] + 1) % self.capacity
+            todo = todo[occupied]
+        
+        table_hi, table_lo = self.hi, self.lo
+        for j in todo.tolist():
+            i = int(slots[j])
+            key_hi, key_lo = hi[j], lo[j]
+            while table_hi[i] or table_lo[i]:
+                if table_hi[i] == key_hi and table_lo[i] == key_lo:
+                    found[j] = True
+                    break
+                i = (i + 1) % self.capacity
+        return found
     
-    conn.execute('''CREATE TABLE IF NOT EXISTS stats (
-        key TEXT PRIMARY KEY,
-        value TEXT
-    ) WITHOUT ROWID''')
+    def _slot_of(self, n):
+        """Pure-Python probe: slot holding n, or the empty slot where it would go."""
+        hi, lo = n >> 64, n & self.MASK64
+        capacity = self.capacity
+        i = (((lo * self.MULTIPLIER) & self.MASK64) ^ hi) % capacity
+        table_hi, table_lo = self.hi, self.lo
+        while True:
+            slot_hi, slot_lo = table_hi[i], table_lo[i]
+            if (slot_hi == hi and slot_lo == lo) or not (slot_hi or slot_lo):
+                return i
+            i += 1
+            if i == capacity:
+                i = 0
     
-    conn.commit()
-    return conn
+    def _find_one(self, n):
+        """Pure-Python membership test of one number."""
+        if not 0 < n or n >> 128:
+            return n in self.overflow
+        i = self._slot_of(n)
+        return bool(self.hi[i] or self.lo[i])
+    
+    def _add_one(self, n):
+        """Pure-Python insert of one number; returns True if it was new."""
+        if not 0 < n or n >> 128:
+            if n in self.overflow:
+                return False
+            self.overflow.add(n)
+            return True
+        if self.count + 1 > self.MAX_LOAD * self.capacity:
+            self._resize(self.count + 1)
+        i = self._slot_of(n)
+        if self.hi[i] or self.lo[i]:
+            return False
+        self.hi[i] = n >> 64
+        self.lo[i] = n & self.MASK64
+        self.count += 1
+        return True
+    
+    def _resize(self, needed):
+        """Grow by GROWTH (or more, for a large batch) and reinsert every key."""
+        capacity = self.capacity
+        while needed > self.MAX_LOAD * capacity:
+            capacity = int(capacity * self.GROWTH)
+        old_hi, old_lo = self.hi, self.lo
+        self.capacity = capacity
+        self.hi, self.lo = self._empty_table(capacity)
+        self.count = 0
+        if np is not None:
+            keep = (old_hi != 0) | (old_lo != 0)
+            self._insert(old_hi[keep], old_lo[keep])
+        else:
+            for hi, lo in zip(old_hi, old_lo):
+                if hi or lo:
+                    self._add_one((hi << 64) | lo)
 
 
-def load_all_time_stats(conn):
-    """Load all-time statistics from the database."""
+class FeistelPermutation:
+    """
+    Keyed pseudorandom permutation of range(size).
+    
+    A balanced Feistel network over the smallest even bit width covering
+    `size`, with BLAKE2b keyed by `seed` as the round function, is a bijection
+    on that power-of-two domain; cycle walking (re-encrypting until the value
+    falls below `size`) restricts it to a bijection on range(size). Position
+    i of the permutation is therefore distinct from every other position, so
+    walking a counter through it never repeats a value.
+    """
+    
+    ROUNDS = 4
+    
+    def __init__(self, size, seed):
+        self.size = size
+        self.seed = seed
+        bits = max(2, (size - 1).bit_length())
+        bits += bits % 2
+        self.half_bits = bits // 2
+        self.half_mask = (1 << self.half_bits) - 1
+        self.half_bytes = (self.half_bits + 7) // 8
+        self._hashers = [hashlib.blake2b(key=seed, salt=struct.pack('<Q', i),
+                                         digest_size=max(8, self.half_bytes))
+                         for i in range(self.ROUNDS)]
+    
+    def __reduce__(self):
+        # Hash objects cannot be pickled; workers rebuild them from the seed
+        return (FeistelPermutation, (self.size, self.seed))
+    
+    def _encrypt(self, x):
+        """One pass of the Feistel network over the power-of-two domain."""
+        half_bits, half_mask, half_bytes = self.half_bits, self.half_mask, self.half_bytes
+        left, right = x >> half_bits, x & half_mask
+        for hasher in self._hashers:
+            h = hasher.copy()
+            h.update(right.to_bytes(half_bytes, 'big'))
+            left, right = right, left ^ (int.from_bytes(h.digest(), 'big') & half_mask)
+        return (left << half_bits) | right
+    
+    def __getitem__(self, index):
+        """Value at position `index` (0 <= index < size)."""
+        x = self._encrypt(index)
+        while x >= self.size:
+            x = self._encrypt(x)
+        return x
+
+
+def load_sampler_state(conn, min_value, max_value, prefix=''):
+    """
+    Load the permutation sampler state (seed, counter) for a range from the
+    `stats` table, creating a fresh random seed the first time a range is used.
+    Each `prefix` keeps a permutation of its own (see coordinator.py).
+    """
+    states = {}
     try:
-        cursor = conn.execute('SELECT value FROM stats WHERE key = ?', ('all_time_stats',))
-        row = cursor.fetchone()
+        row = conn.execute('SELECT value FROM stats WHERE key = ?', ('sampler_state',)).fetchone()
         if row:
-            return json.loads(row[0])
+            states = json.loads(row[0])
     except Exception as e:
-        print(f"⚠️  Error loading stats: {e}")
+        print(f"⚠️  Error loading sampler state: {e}")
     
-    return {
-        'longest_sequence': 0,
-        'longest_num': 0,
-        'highest_peak': 0,
-        'highest_peak_num': 0,
-        'total_steps': 0,
-        'total_numbers': 0
-    }
+    state = states.get(f"{prefix}{min_value}:{max_value}")
+    if state:
+        return bytes.fromhex(state['seed']), state['counter']
+    return os.urandom(16), 0
 
 
-def save_all_time_stats(conn, all_time_stats):
-    """Save all-time statistics to the database."""
+def save_sampler_state(conn, min_value, max_value, seed, counter, prefix=''):
+    """Record how far the permutation for a range has been consumed; the caller commits."""
     try:
+        row = conn.execute('SELECT value FROM stats WHERE key = ?', ('sampler_state',)).fetchone()
+        states = json.loads(row[0]) if row else {}
+        states[f"{prefix}{min_value}:{max_value}"] = {'seed': seed.hex(), 'counter': counter}
         conn.execute(
             'INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)',
-            ('all_time_stats', json.dumps(all_time_stats))
+            ('sampler_state', json.dumps(states))
         )
-        conn.commit()
     except Exception as e:
-        print(f"⚠️  Error saving stats: {e}")
+        print(f"⚠️  Error saving sampler state: {e}")
 
 
-def get_tested_count(conn):
-    """Get the total number of tested entries in the database."""
-    cursor = conn.execute('SELECT COUNT(*) FROM tested')
-    return cursor.fetchone()[0]
+def _init_worker():
+    """Leave Ctrl-C to the parent, which checkpoints and stops the pool."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
 
 
-def has_been_tested(conn, n: int) -> bool:
-    """Check if a number has already been tested."""
-    h = hash_number(n)
-    cursor = conn.execute('SELECT 1 FROM tested WHERE hash = ?', (h,))
-    return cursor.fetchone() is not None
+def summarize_batch(numbers, kernel='reference', keep_records=False):
+    """
+    Run a Collatz kernel over a batch of numbers and summarize the results.
+    Used by both the serial path and the worker pool, so merging the
+    summaries in batch order gives the same records as testing one by one.
+    With keep_records, the per-number results are also packed for the
+    ResultsStore (in the worker, off the session's critical path).
+    Returns: SessionStats for the batch
+    """
+    stats = SessionStats()
+    
+    if kernel in BATCH_KERNELS:
+        steps_array, peaks = BATCH_KERNELS[kernel](numbers)
+        results = zip(numbers, steps_array.tolist(), peaks)
+    else:
+        compute = KERNELS[kernel]
+        results = ((num,) + compute(num) for num in numbers)
+    
+    if keep_records:
+        results = list(results)
+        stats.records = ResultsStore.pack(*zip(*results)) if results else (b'', b'', b'')
+    
+    for num, steps, max_val in results:
+        stats.add(num, steps, max_val)
+    
+    return stats
 
 
-def mark_tested_batch(conn, numbers):
-    """Mark multiple numbers as tested in a single transaction."""
-    hashes = [(hash_number(n),) for n in numbers]
-    conn.executemany('INSERT OR IGNORE INTO tested (hash) VALUES (?)', hashes)
+def summarize_permutation_block(permutation, offset, start, count, kernel='reference',
+                                keep_records=False):
+    """
+    Worker entry point for the permutation sampler: generate the numbers at
+    counter positions [start, start + count) and summarize them.
+    Returns: (numbers, SessionStats)
+    """
+    numbers = [offset + permutation[i] for i in range(start, start + count)]
+    return numbers, summarize_batch(numbers, kernel, keep_records)
 
 
-def append_to_results_log(session_info):
+class SessionMetrics:
     """
-    Append session results to a human-readable log file.
+    Low-overhead timers for the phases of a session.
+    
+    Each phase keeps a call count, the total and longest time, and how many
+    numbers it handled. Timings are taken per batch rather than per number,
+    so the cost is a few clock reads per thousand numbers. With a worker
+    pool, `compute` is the time the session spent waiting for results.
     """
-    try:
-        with open(RESULTS_LOG, 'a') as f:
-            f.write("="*70 + "\n")
-            f.write(f"Session Date: {session_info['timestamp']}\n")
-            f.write(f"Numbers tested this session: {session_info['tested_this_session']:,}\n")
-            f.write(f"Total unique numbers tested: {session_info['total_unique']:,}\n")
-            f.write(f"Longest sequence: {session_info['longest_sequence']:,} steps "
-                   f"(number: {session_info['longest_num']:,})\n")
-            f.write(f"Highest peak: {session_info['highest_peak']:,} "
-                   f"(from: {session_info['highest_peak_num']:,})\n")
-            f.write(f"Average steps: {session_info['average_steps']:.2f}\n")
-            f.write("="*70 + "\n\n")
-    except Exception as e:
-        print(f"⚠️  Error appending to results log: {e}")
+    PHASES = ('generate', 'dedup', 'compute', 'insert', 'commit')
+    
+    def __init__(self):
+        self.phases = {phase: {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'items': 0}
+                       for phase in self.PHASES}
+        self.start_time = time.time()
+        self.started = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    def record(self, phase, seconds, items=0):
+        """Add one timed call of `phase` that handled `items` numbers."""
+        stats = self.phases[phase]
+        stats['calls'] += 1
+        stats['seconds'] += seconds
+        stats['items'] += items
+        if seconds > stats['max_seconds']:
+            stats['max_seconds'] = seconds
+    
+    def timed(self, phase, items, func, *args):
+        """Call func(*args), recording its time under `phase`."""
+        start = time.perf_counter()
+        result = func(*args)
+        self.record(phase, time.perf_counter() - start, items)
+        return result
+    
+    def phase_totals(self):
+        """A copy of the per-phase totals."""
+        return {phase: dict(stats) for phase, stats in self.phases.items()}
+    
+    def snapshot(self, **counters):
+        """
+        Phase totals plus the session counters passed in (tested, duplicates,
+        attempts, db_rows, db_size_bytes).
+        Returns: dict ready for JSON
+        """
+        return {
+            'started': self.started,
+            'updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'elapsed': time.time() - self.start_time,
+            **counters,
+            'phases': self.phase_totals()
+        }
+    
+    def summary(self):
+        """One-line time split between the phases."""
+        return " | ".join(f"{phase} {stats['seconds']:.1f}s"
+                          for phase, stats in self.phases.items())
 
 
-def collatz_steps(n):
+def format_prometheus_metrics(snapshot):
+    """Render a metrics snapshot in the Prometheus text exposition format."""
+    lines = []
+    
+    def metric(name, kind, description, samples):
+        lines.append(f"# HELP collatz_{name} {description}")
+        lines.append(f"# TYPE collatz_{name} {kind}")
+        for labels, value in samples:
+            lines.append(f"collatz_{name}{labels} {value}")
+    
+    phases = snapshot['phases']
+    for field, name, kind, description in (
+            ('seconds', 'phase_seconds_total', 'counter', 'Time spent in each session phase.'),
+            ('calls', 'phase_calls_total', 'counter', 'Timed calls of each session phase.'),
+            ('items', 'phase_numbers_total', 'counter', 'Numbers handled by each session phase.'),
+            ('max_seconds', 'phase_max_seconds', 'gauge', 'Longest single call of each phase.')):
+        metric(name, kind, description,
+               [(f'{{phase="{phase}"}}', stats[field]) for phase, stats in phases.items()])
+    
+    for key, name, kind, description in (
+            ('tested', 'numbers_tested_total', 'counter', 'New numbers tested this run.'),
+            ('duplicates', 'duplicates_skipped_total', 'counter', 'Candidates skipped as already tested.'),
+            ('attempts', 'generation_attempts_total', 'counter', 'Candidates generated this run.'),
+            ('elapsed', 'session_elapsed_seconds', 'gauge', 'Seconds since the run started.'),
+            ('db_rows', 'db_rows', 'gauge', 'Numbers recorded in the database.'),
+            ('db_size_bytes', 'db_size_bytes', 'gauge', 'Size of the database and its WAL.')):
+        if key in snapshot:
+            metric(name, kind, description, [('', snapshot[key])])
+    
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics_snapshot(snapshot, json_path=None, prom_path=None):
     """
-    Count the number of steps to reach 1 in the Collatz sequence.
-    Returns: (steps, max_value_reached)
+    Write a metrics snapshot as JSON and/or a Prometheus textfile. Files are
+    replaced atomically, so a collector never reads a half-written snapshot.
     """
-    if n == 1:
-        return 0, 1
+    for path, text in ((json_path, lambda: json.dumps(snapshot, indent=2)),
+                       (prom_path, lambda: format_prometheus_metrics(snapshot))):
+        if not path:
+            continue
+        try:
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'w') as f:
+                f.write(text())
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"⚠️  Error writing metrics to {path}: {e}")
+
+
+def save_session_checkpoint(conn, numbers, sampler_state, distribution, cursor, all_time_stats,
+                            metrics=None, record=None, results_store=None):
+    """
+    Commit tested numbers, stats and the session cursor in one transaction.
+    Takes a snapshot of the session so it can also run on the writer thread
+    of a SessionPipeline while the session moves on. A final checkpoint also
+    stores the run's `record` in the `sessions` table, with the phase totals
+    of `metrics` as they stand when it is written.
+    """
+    start = time.perf_counter()
+    if numbers:
+        mark_tested_batch(conn, numbers)
+    if sampler_state is not None:
+        save_sampler_state(conn, *sampler_state)
+    save_distribution_stats(conn, distribution)
+    save_session_cursor(conn, cursor)
+    save_all_time_stats(conn, all_time_stats, commit=False)
+    if results_store is not None:
+        save_results_rows(conn, results_store)
+    if record is not None:
+        save_session_record(conn, dict(record, phases=metrics.phase_totals() if metrics else {}))
+    written = time.perf_counter()
+    conn.commit()
+    if metrics is not None:
+        metrics.record('insert', written - start, len(numbers))
+        metrics.record('commit', time.perf_counter() - written)
+
+
+class SessionPipeline:
+    """
+    Staged producer/consumer version of the session loop.
     
-    original = n
-    steps = 0
-    max_val = n
+        generate -> dedup -> compute -> (session merges results) -> write
     
-    while n != 1:
-        if n % 2 == 0:
-            n = n // 2
-        else:
-            n = 3 * n + 1
+    Each stage is a thread joined to the next by a bounded queue, so a slow
+    stage applies backpressure instead of letting work pile up in memory.
+    The dedup stage checks candidates through its own read connection, and
+    the writer thread is the only user of the session connection while the
+    pipeline runs: it inserts merged batches as they arrive and commits once
+    per checkpoint, grouping every batch since the previous one.
+    
+    stop() ends generation and lets the accepted work drain; abort() drops
+    whatever has not been merged yet. Either way close() finishes the writes
+    queued so far before returning.
+    """
+    QUEUE_SIZE = 4
+    WRITE_QUEUE_SIZE = 8
+    POLL_INTERVAL = 0.1
+    DONE = None  # End-of-stream marker passed down the queues
+    
+    def __init__(self, conn, quota, batch_size, min_value, max_value, kernel='reference',
+                 pool=None, max_in_flight=1, permutation=None, counter=0, max_attempts=None,
+                 metrics=None, keep_records=False):
+        if getattr(conn, 'db_path', None) is None:
+            raise ValueError("SessionPipeline needs a connection opened with init_db()")
+        self.conn = conn
+        self.quota = quota
+        self.batch_size = batch_size
+        self.min_value = min_value
+        self.max_value = max_value
+        self.kernel = kernel
+        self.pool = pool
+        self.max_in_flight = max_in_flight
+        self.permutation = permutation
+        self.counter = counter
+        self.max_attempts = max_attempts
+        self.metrics = metrics
+        self.keep_records = keep_records
         
-        steps += 1
-        max_val = max(max_val, n)
+        # (accepted, attempts, duplicates) as seen by the dedup stage,
+        # replaced as a whole so readers never see a half-updated set
+        self.counts = (0, 0, 0)
+        self.exhausted = False
+        self.error = None
+        self._stopping = threading.Event()
+        self._aborted = threading.Event()
         
-        # Safety check
-        if steps > 100000:
-            return steps, max_val
+        self.candidates = queue.Queue(self.QUEUE_SIZE)
+        self.accepted = queue.Queue(self.QUEUE_SIZE)
+        self.results = queue.Queue(self.QUEUE_SIZE)
+        self.writes = queue.Queue(self.WRITE_QUEUE_SIZE)
+        
+        # Per-stage [items, busy seconds] and the queue each stage reads from
+        self.stage_stats = {name: [0, 0.0] for name in ('generate', 'dedup', 'compute', 'write')}
+        
+        self.threads = [threading.Thread(target=self._run, args=(name, target),
+                                         name=f'collatz-{name}', daemon=True)
+                        for name, target in (('generate', self._generate),
+                                             ('dedup', self._dedup),
+                                             ('compute', self._compute))]
+        self.writer = threading.Thread(target=self._run, args=('write', self._write),
+                                       name='collatz-write', daemon=True)
+        self.start_time = time.time()
+        for thread in self.threads + [self.writer]:
+            thread.start()
     
-    return steps, max_val
+    def _run(self, name, target):
+        """Run a stage, handing any failure to the session thread."""
+        try:
+            target()
+        except BaseException as e:
+            self.error = self.error or e
+            self._aborted.set()
+            self._stopping.set()
+    
+    def _put(self, q, item):
+        """Put with backpressure, giving up if the pipeline is aborted."""
+        while not self._aborted.is_set():
+            try:
+                q.put(item, timeout=self.POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def _get(self, q):
+        """Get the next item, or DONE if the pipeline is aborted."""
+        while not self._aborted.is_set():
+            try:
+                return q.get(timeout=self.POLL_INTERVAL)
+            except queue.Empty:
+                pass
+        return self.DONE
+    
+    def _busy(self, name, items, since):
+        elapsed = time.time() - since
+        stats = self.stage_stats[name]
+        stats[0] += items
+        stats[1] += elapsed
+        if self.metrics is not None and name in self.metrics.phases:
+            self.metrics.record(name, elapsed, items)
+    
+    def _generate(self):
+        """Draw candidate blocks, or counter ranges of the permutation."""
+        session_tested = CompactKeySet()
+        attempts = 0
+        try:
+            while not self._stopping.is_set():
+                t0 = time.time()
+                if self.permutation is not None:
+                    count = min(self.batch_size, self.permutation.size - self.counter)
+                    if count <= 0:
+                        self.exhausted = True
+                        break
+                    item = (self.counter, count)
+                    self.counter += count
+                else:
+                    if self.max_attempts is not None and attempts >= self.max_attempts:
+                        break
+                    block = session_tested.add_batch(
+                        [random.randint(self.min_value, self.max_value)
+                         for _ in range(self.batch_size)])
+                    attempts += self.batch_size
+                    item = (block, self.batch_size - len(block))
+                    count = self.batch_size
+                self._busy('generate', count, t0)
+                if not self._put(self.candidates, item):
+                    break
+        finally:
+            self._put(self.candidates, self.DONE)
+    
+    def _dedup(self):
+        """Drop candidates already in the database and stop at the quota."""
+        read_conn = None
+        if self.permutation is None:
+            # Reads only see committed rows; anything newer is still in the
+            # generator's session set
+            read_conn = sqlite3.connect(self.conn.db_path, timeout=30, factory=TestedConnection)
+            read_conn.key_format = self.conn.key_format
+            read_conn.bloom = self.conn.bloom
+            if self.conn.shards:
+                read_conn.shards = open_shards(self.conn.db_path, len(self.conn.shards))
+        accepted = attempts = duplicates = 0
+        try:
+            while accepted < self.quota and not self._stopping.is_set():
+                item = self._get(self.candidates)
+                if item is self.DONE:
+                    break
+                t0 = time.time()
+                if self.permutation is not None:
+                    start, count = item
+                    count = min(count, self.quota - accepted)
+                    item = (None, start, count)
+                    attempts += count
+                else:
+                    block, session_dups = item
+                    already_tested = find_tested(read_conn, block)
+                    batch = [num for num in block if num not in already_tested]
+                    count = min(len(batch), self.quota - accepted)
+                    item = (batch[:count], None, None)
+                    attempts += len(block) + session_dups
+                    duplicates += session_dups + len(already_tested)
+                accepted += count
+                self.counts = (accepted, attempts, duplicates)
+                self._busy('dedup', count, t0)
+                if count and not self._put(self.accepted, item):
+                    break
+        finally:
+            # Unblock the generator so it sees the stop
+            self._stopping.set()
+            self._put(self.accepted, self.DONE)
+            if read_conn is not None:
+                read_conn.bloom = None  # Shared with the session connection
+                read_conn.close()
+    
+    def _compute(self):
+        """Summarize accepted batches, in the pool if there is one, in order."""
+        in_flight = deque()
+        
+        def emit(batch, start, count, result):
+            if self.pool is not None:
+                wait_start = time.time()
+                while True:
+                    try:
+                        result = result.get(timeout=self.POLL_INTERVAL)
+                        break
+                    except multiprocessing.TimeoutError:
+                        if self._aborted.is_set():
+                            return False
+                if self.metrics is not None:
+                    self.metrics.record('compute', time.time() - wait_start,
+                                        (result[1] if batch is None else result).count)
+            if batch is None:
+                batch, result = result
+                counter_end = start + count
+            else:
+                counter_end = None
+            self.stage_stats['compute'][0] += len(batch)
+            return self._put(self.results, (batch, counter_end, result))
+        
+        try:
+            while True:
+                item = self._get(self.accepted)
+                if item is self.DONE:
+                    break
+                batch, start, count = item
+                t0 = time.time()
+                if batch is None:
+                    args = (self.permutation, self.min_value, start, count, self.kernel,
+                            self.keep_records)
+                    func = summarize_permutation_block
+                else:
+                    args = (batch, self.kernel, self.keep_records)
+                    func = summarize_batch
+                if self.pool is not None:
+                    in_flight.append((batch, start, count, self.pool.apply_async(func, args)))
+                    if len(in_flight) < self.max_in_flight:
+                        continue
+                    item = in_flight.popleft()
+                else:
+                    item = (batch, start, count, func(*args))
+                    if self.metrics is not None:
+                        self.metrics.record('compute', time.time() - t0, count or len(batch))
+                self.stage_stats['compute'][1] += time.time() - t0
+                if not emit(*item):
+                    return
+            while in_flight:
+                if not emit(*in_flight.popleft()):
+                    return
+        finally:
+            self._put(self.results, self.DONE)
+    
+    def _write(self):
+        """Run database jobs on the session connection, in submission order."""
+        while True:
+            job = self.writes.get()
+            if job is self.DONE:
+                break
+            func, args, items = job
+            t0 = time.time()
+            func(*args)
+            self._busy('write', items, t0)
+    
+    def __iter__(self):
+        """Yield (batch, counter_end, SessionStats) in submission order."""
+        while True:
+            item = self._get(self.results)
+            if item is self.DONE:
+                break
+            yield item
+        if self.error is not None:
+            raise self.error
+    
+    def _submit(self, job):
+        """Queue a job for the writer, failing fast if the writer has died."""
+        while True:
+            try:
+                self.writes.put(job, timeout=self.POLL_INTERVAL)
+                return
+            except queue.Full:
+                if not self.writer.is_alive():
+                    raise self.error
+    
+    def write(self, func, *args, items=0):
+        """Queue a database job for the writer thread."""
+        if not self.writer.is_alive():
+            raise self.error
+        self._submit((func, args, items))
+    
+    def stop(self):
+        """Stop generating; work already accepted still comes out."""
+        self._stopping.set()
+    
+    def abort(self):
+        """Stop every stage except the writer, dropping work in flight."""
+        self._stopping.set()
+        self._aborted.set()
+        for thread in self.threads:
+            thread.join()
+    
+    def close(self):
+        """Wait for the stages to finish, then for the queued writes."""
+        for thread in self.threads:
+            thread.join()
+        if self.writer.is_alive():
+            self._submit(self.DONE)
+        self.writer.join()
+        if self.error is not None:
+            raise self.error
+    
+    def report(self):
+        """One-line summary of per-stage throughput and queue depths."""
+        elapsed = max(time.time() - self.start_time, 1e-9)
+        parts = []
+        for name, inbox in (('generate', None), ('dedup', self.candidates),
+                            ('compute', self.accepted), ('write', self.writes)):
+            items, busy = self.stage_stats[name]
+            part = f"{name} {items / elapsed:,.0f}/s ({busy / elapsed:.0%} busy)"
+            if inbox is not None:
+                part += f" q{inbox.qsize()}/{inbox.maxsize}"
+            parts.append(part)
+        return " | ".join(parts)
 
 
 def test_random_large_numbers(num_tests=100_000_000, min_value=10_000_000_000,
-                               max_value=1_000_000_000_000_000_000_000_000_000, conn=None):
+                               max_value=1_000_000_000_000_000_000_000_000_000, conn=None,
+                               workers=1, kernel='reference', sampler='random',
+                               time_budget=None, checkpoint_interval=CHECKPOINT_INTERVAL,
+                               pipeline=False, metrics_json=None, metrics_prom=None,
+                               results_store=None, skip_dedup=False):
     """
     Test random numbers >= min_value.
     Loads previous tests and avoids duplicates across all runs.
+    With workers > 1, batches of new numbers are computed in a process pool
+    while this process keeps generating candidates and owns the database.
+    `kernel` names the entry in KERNELS or BATCH_KERNELS used to compute
+    each trajectory.
+    With sampler='permutation', numbers come from a keyed permutation of the
+    range whose position is saved in the database, so they never repeat and
+    no duplicate lookups are needed.
+    
+    Tested numbers, all-time stats and a session cursor are committed
+    together every `checkpoint_interval` seconds (and at each 5% mark), so an
+    interrupted or crashed session resumes from its last checkpoint on the
+    next run. With `time_budget` (seconds), generation stops early enough for
+    the work in flight and the final save to finish before the deadline.
+    
+    With pipeline=True, generation, duplicate checks, computation and
+    database writes run as concurrent stages of a SessionPipeline, so the
+    session no longer waits on lookups and commits between batches.
+    
+    Time spent generating, checking, computing, inserting and committing is
+    tracked by SessionMetrics, written at every checkpoint to `metrics_json`
+    and/or `metrics_prom` (Prometheus textfile), and stored per run in the
+    `sessions` table.
+    
+    With a `results_store` (see open_results_store), the steps and peak of
+    every tested number are appended to it as batches are merged.
+    
+    With skip_dedup=True (random sampler, not pipelined), candidates are not
+    looked up in the database. Each checkpoint inserts its numbers first,
+    and the rare ones that were already there (see mark_tested_batch) are
+    taken back out of the session and all-time stats and counted as
+    duplicates. Repeats within the session are still caught in memory.
     """
+    if skip_dedup and pipeline:
+        raise ValueError("skip_dedup is not supported with pipeline=True")
     print(f"\nTesting {num_tests:,} NEW random numbers")
     print(f"Range: {min_value:,} to {max_value:,}")
+    if time_budget:
+        print(f"Time budget: {time_budget:,.0f} seconds")
     print("=" * 70)
     
+    # Build or map the tail table here, so worker processes inherit it
+    if kernel == 'tail':
+        get_tail_table()
+    
     # Initialize database connection if not provided
     close_conn = False
     if conn is None:
@@ -199,8 +3495,21 @@ def test_random_large_numbers(num_tests=100_000_000, min_value=10_000_000_000,
     
     all_time_stats = load_all_time_stats(conn)
     
+    skip_dedup = skip_dedup and sampler == 'random'
+    if skip_dedup:
+        expected, probability = estimate_duplicates(num_tests, initial_count, min_value, max_value)
+        print(f"✓ Skipping database duplicate checks: {expected:.3g} expected duplicates "
+              f"(chance of any: {probability:.3g}); any found are backed out when saved")
+    
     # Session-only cache to avoid DB lookups for numbers tested this session
-    session_tested = set()
+    session_tested = CompactKeySet()
+    
+    # The permutation sampler continues from where the last run stopped
+    if sampler == 'permutation':
+        seed, counter = load_sampler_state(conn, min_value, max_value)
+        permutation = FeistelPermutation(max_value - min_value + 1, seed)
+        saved_counter = counter
+        print(f"✓ Permutation sampler at position {counter:,} of {permutation.size:,}")
     
     # Current session statistics
     all_reach_one = True
@@ -211,117 +3520,411 @@ def test_random_large_numbers(num_tests=100_000_000, min_value=10_000_000_000,
     highest_peak = all_time_stats.get('highest_peak', 0)
     highest_peak_num = all_time_stats.get('highest_peak_num', 0)
     
-    shortest_sequence = float('inf')
-    shortest_sequence_num = 0
+    # This session's totals, top performers and distributions; `unsaved`
+    # holds the part not yet merged into the database distribution
+    session = SessionStats()
+    unsaved = SessionStats()
     
-    session_total_steps = 0
+    test_count = 0
+    attempts = 0
+    duplicates_skipped = 0
+    started = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
-    # For this session's top performers
-    session_top_10_longest = []
-    session_top_10_highest = []
+    # Pick up an interrupted session from its last checkpoint
+    cursor = load_session_cursor(conn)
+    if cursor and (cursor['min_value'], cursor['max_value'], cursor['sampler']) == (
+            min_value, max_value, sampler):
+        session = SessionStats.from_dict(cursor['session'])
+        num_tests = cursor['num_tests']
+        test_count = cursor['tested']
+        attempts = cursor['attempts']
+        duplicates_skipped = cursor['duplicates_skipped']
+        initial_count = cursor['initial_count']
+        started = cursor['started']
+        print(f"↩️  Resuming session started {started}: "
+              f"{test_count:,} of {num_tests:,} numbers already tested")
+    elif cursor:
+        print(f"⚠️  Discarding unfinished session for a different range/sampler "
+              f"({cursor['tested']:,} numbers it tested stay recorded)")
+    resumed = test_count
+    resumed_attempts, resumed_duplicates = attempts, duplicates_skipped
     
     # Progress tracking
-    checkpoint = num_tests // 20  # 5% increments
+    checkpoint = max(1, num_tests // 20)  # 5% increments
     start_time = time.time()
+    last_save = start_time
+    metrics = SessionMetrics()
+    deadline = start_time + time_budget * (1 - TIME_BUDGET_RESERVE) if time_budget else None
+    budget_reached = False
     
     print("\n🎲 Generating and testing NEW random numbers...")
-    print("   (Automatically skipping any previously tested numbers)")
+    if sampler == 'permutation':
+        print("   (Walking a keyed permutation of the range: no repeats, no lookups)")
+    elif skip_dedup:
+        print("   (Skipping repeats within the session; database duplicates are found on insert)")
+    else:
+        print("   (Automatically skipping any previously tested numbers)")
+    if workers > 1:
+        print(f"   (Computing batches on {workers} worker processes)")
+    if pipeline:
+        print("   (Generating, checking, computing and saving in pipelined stages)")
+    if results_store is not None:
+        print(f"   (Saving steps and peaks to {results_store.path})")
     print()
     
-    test_count = 0
-    attempts = 0
-    duplicates_skipped = 0
+    completed = test_count
+    next_checkpoint = (completed // checkpoint + 1) * checkpoint
     max_attempts = num_tests * 100  # Safety limit
     batch_to_save = []  # Batch inserts for performance
-    batch_size = 1000
+    # With skip_dedup, the results of batch_to_save until its insert has
+    # shown which of them were tested before (see back_out)
+    unsaved_records = []
+    # Batch kernels amortize their per-call overhead over more lanes
+    batch_size = 10000 if kernel in BATCH_KERNELS else 1000
+    keep_records = results_store is not None or skip_dedup
     
-    while test_count < num_tests and attempts < max_attempts:
-        # Generate random number
-        num = random.randint(min_value, max_value)
-        attempts += 1
-        
-        # Skip if already tested (check session cache first, then DB)
-        if num in session_tested or has_been_tested(conn, num):
-            duplicates_skipped += 1
-            continue
-        
-        session_tested.add(num)
-        batch_to_save.append(num)
-        test_count += 1
-        
-        # Test this number
-        steps, max_val = collatz_steps(num)
+    def write(func, *args, items=0):
+        """Run a database job now, or queue it for the pipeline's writer thread."""
+        if stages is not None:
+            stages.write(func, *args, items=items)
+        else:
+            func(*args)
+    
+    def metrics_snapshot():
+        """Phase timings plus this run's counters."""
+        return metrics.snapshot(
+            tested=completed - resumed,
+            duplicates=duplicates_skipped - resumed_duplicates,
+            attempts=attempts - resumed_attempts,
+            db_rows=initial_count + completed,
+            db_size_bytes=get_db_size(conn)
+        )
+    
+    def export_metrics():
+        """Write the current snapshot to the metrics files, if any."""
+        if metrics_json or metrics_prom:
+            write_metrics_snapshot(metrics_snapshot(), metrics_json, metrics_prom)
+    
+    def save_checkpoint(finished, status=None):
+        """
+        Commit tested numbers, stats and the session cursor in one transaction.
+        With a `status`, this is the run's last checkpoint and also records
+        the run in the `sessions` table.
+        """
+        nonlocal unsaved, batch_to_save, unsaved_records
+        if skip_dedup and batch_to_save:
+            # Insert first, so numbers that turn out to be tested already
+            # are backed out before the stats, cursor and results are saved
+            collisions = set()
+            metrics.timed('insert', len(batch_to_save), mark_tested_batch,
+                          conn, batch_to_save, collisions)
+            batch_to_save = []
+            records, unsaved_records = unsaved_records, []
+            if collisions:
+                records = back_out(collisions, records)
+            if results_store is not None:
+                for columns in records:
+                    results_store.append(columns)
+        sampler_state = None
+        if sampler == 'permutation':
+            sampler_state = (min_value, max_value, seed, saved_counter)
+        record = None
+        if status is not None:
+            record = dict(metrics_snapshot(), status=status,
+                          finished=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        write(save_session_checkpoint, conn, batch_to_save, sampler_state, unsaved,
+              None if finished else {
+                  'started': started,
+                  'min_value': min_value,
+                  'max_value': max_value,
+                  'sampler': sampler,
+                  'num_tests': num_tests,
+                  'tested': completed,
+                  'attempts': attempts - (test_count - completed),
+                  'duplicates_skipped': duplicates_skipped,
+                  'initial_count': initial_count,
+                  'session': session.to_dict()
+              }, dict(all_time_stats), metrics, record, results_store,
+              items=len(batch_to_save))
+        batch_to_save = []
+        unsaved = SessionStats()
+        export_metrics()
+    
+    def back_out(collisions, records):
+        """
+        Take numbers found in the database after all out of this session,
+        using the steps and peaks recorded for them in `records`.
+        Returns: records without the rows of those numbers
+        """
+        nonlocal completed, test_count, duplicates_skipped
+        kept_records = []
+        for columns in records:
+            rows = ResultsStore.unpack(columns)
+            kept = [row for row in rows if row[0] not in collisions]
+            if len(kept) == len(rows):
+                kept_records.append(columns)
+                continue
+            for num, steps, peak in rows:
+                if num in collisions:
+                    session.remove(num, steps, peak)
+                    unsaved.remove(num, steps, peak)
+                    all_time_stats['total_steps'] -= steps
+                    all_time_stats['total_numbers'] -= 1
+            if kept:
+                kept_records.append(ResultsStore.pack(*zip(*kept)))
+        # Still not new: counted as duplicates, and replaced if the session goes on
+        completed -= len(collisions)
+        test_count -= len(collisions)
+        duplicates_skipped += len(collisions)
+        print(f"⚠️  {len(collisions):,} number(s) had been tested before; "
+              f"backed out of the stats")
+        return kept_records
+    
+    def merge(batch, counter_end, batch_stats):
+        """Merge a finished batch into the session and all-time stats."""
+        nonlocal completed, saved_counter, next_checkpoint, last_save
+        nonlocal longest_sequence, longest_sequence_num, highest_peak, highest_peak_num
+        if counter_end is not None:
+            saved_counter = counter_end
+        completed += batch_stats.count
+        if stages is not None:
+            # Inserted right away; committed with the next checkpoint
+            stages.write(metrics.timed, 'insert', len(batch), mark_tested_batch, conn, batch,
+                         items=len(batch))
+        else:
+            batch_to_save.extend(batch)
+        if skip_dedup:
+            unsaved_records.append(batch_stats.records)  # Stored by save_checkpoint
+        elif results_store is not None:
+            write(results_store.append, batch_stats.records)
         
-        # Track session statistics
-        session_total_steps += steps
-        all_time_stats['total_steps'] += steps
-        all_time_stats['total_numbers'] += 1
+        session.merge(batch_stats)
+        unsaved.merge(batch_stats)
+        all_time_stats['total_steps'] += batch_stats.total_steps
+        all_time_stats['total_numbers'] += batch_stats.count
         
         # Update all-time records
+        steps, num = batch_stats.longest
         if steps > longest_sequence:
             longest_sequence = steps
             longest_sequence_num = num
             all_time_stats['longest_sequence'] = steps
             all_time_stats['longest_num'] = num
         
-        if steps < shortest_sequence:
-            shortest_sequence = steps
-            shortest_sequence_num = num
-        
+        max_val, num = batch_stats.highest
         if max_val > highest_peak:
             highest_peak = max_val
             highest_peak_num = num
             all_time_stats['highest_peak'] = max_val
             all_time_stats['highest_peak_num'] = num
         
-        # Track session top 10
-        session_top_10_longest.append((steps, num))
-        session_top_10_longest.sort(reverse=True)
-        session_top_10_longest = session_top_10_longest[:10]
-        
-        session_top_10_highest.append((max_val, num))
-        session_top_10_highest.sort(reverse=True)
-        session_top_10_highest = session_top_10_highest[:10]
-        
-        # Progress indicator and periodic batch save
-        if test_count % checkpoint == 0:
-            progress = (test_count / num_tests) * 100
+        # Progress indicator and periodic checkpoint
+        if completed >= next_checkpoint:
+            next_checkpoint = (completed // checkpoint + 1) * checkpoint
+            progress = (completed / num_tests) * 100
             elapsed = time.time() - start_time
-            rate = test_count / elapsed if elapsed > 0 else 0
-            print(f"Progress: {progress:5.1f}% | {test_count:,} new | "
+            rate = (completed - resumed) / elapsed if elapsed > 0 else 0
+            print(f"Progress: {progress:5.1f}% | {completed:,} new | "
                   f"{duplicates_skipped:,} dups skipped | {rate:.0f} tests/sec")
-            
-            # Save batch to DB
-            if batch_to_save:
-                mark_tested_batch(conn, batch_to_save)
-                conn.commit()
-                batch_to_save = []
+            if stages is not None:
+                print(f"          {stages.report()}")
+            save_checkpoint(finished=False)
+            last_save = time.time()
+        elif time.time() - last_save >= checkpoint_interval:
+            save_checkpoint(finished=False)
+            last_save = time.time()
+    
+    def budget_exhausted():
+        """Whether the work in flight will take the session to the deadline."""
+        if deadline is None or test_count >= num_tests or completed <= resumed:
+            return False
+        now = time.time()
+        rate = (completed - resumed) / (now - start_time)
+        if now + (test_count - completed) / rate < deadline:
+            return False
+        print(f"⏱️  Time budget reached after {test_count:,} numbers; finishing up")
+        return True
+    
+    # Batches handed to the pool, merged back strictly in submission order
+    pool = multiprocessing.Pool(processes=workers, initializer=_init_worker) if workers > 1 else None
+    max_in_flight = workers * 2
+    pending = deque()
+    stages = None
+    interrupted = False
+    
+    try:
+        if pipeline:
+            stages = SessionPipeline(
+                conn, num_tests - test_count, batch_size, min_value, max_value, kernel,
+                pool, max_in_flight,
+                permutation=permutation if sampler == 'permutation' else None,
+                counter=counter if sampler == 'permutation' else 0,
+                max_attempts=max_attempts - attempts, metrics=metrics,
+                keep_records=keep_records)
+            base_counts = (test_count, attempts, duplicates_skipped)
+            for batch, counter_end, batch_stats in stages:
+                test_count, attempts, duplicates_skipped = (
+                    base + n for base, n in zip(base_counts, stages.counts))
+                merge(batch, counter_end, batch_stats)
+                if not budget_reached and budget_exhausted():
+                    budget_reached = True
+                    stages.stop()
+            test_count, attempts, duplicates_skipped = (
+                base + n for base, n in zip(base_counts, stages.counts))
+            if stages.exhausted and test_count < num_tests:
+                print("⚠️  Every number in the range has been tested; stopping early")
+            if budget_reached or stages.exhausted:
+                num_tests = test_count
+        else:
+            while pending or (test_count < num_tests and attempts < max_attempts):
+                # Stop generating once the work in flight will take us to the deadline
+                if budget_exhausted():
+                    budget_reached = True
+                    num_tests = test_count
+                
+                # Generate the next batch of new numbers
+                if sampler == 'permutation' and counter >= permutation.size:
+                    if test_count < num_tests:
+                        print("⚠️  Every number in the range has been tested; stopping early")
+                    num_tests = test_count
+                
+                if test_count < num_tests and attempts < max_attempts and sampler == 'permutation':
+                    # Positions [counter, counter + count) are fresh by construction
+                    count = min(batch_size, num_tests - test_count, permutation.size - counter)
+                    if pool is not None:
+                        pending.append((None, counter + count, pool.apply_async(
+                            summarize_permutation_block,
+                            (permutation, min_value, counter, count, kernel, keep_records))))
+                    else:
+                        pending.append((None, counter + count, metrics.timed(
+                            'compute', count, summarize_permutation_block,
+                            permutation, min_value, counter, count, kernel, keep_records)))
+                    counter += count
+                    attempts += count
+                    test_count += count
+                    
+                    generating = test_count < num_tests
+                    if generating and len(pending) < max_in_flight:
+                        continue
+                
+                elif test_count < num_tests and attempts < max_attempts:
+                    batch = []
+                    while (len(batch) < batch_size and test_count < num_tests
+                           and attempts < max_attempts):
+                        # Draw a block, drop session repeats, then check the rest
+                        # against the DB in one round trip
+                        block_size = min(batch_size - len(batch), num_tests - test_count,
+                                         max_attempts - attempts)
+                        generate_start = time.perf_counter()
+                        block = session_tested.add_batch(
+                            [random.randint(min_value, max_value) for _ in range(block_size)])
+                        duplicates_skipped += block_size - len(block)
+                        attempts += block_size
+                        metrics.record('generate', time.perf_counter() - generate_start, block_size)
+                        
+                        if skip_dedup:
+                            already_tested = set()
+                        else:
+                            already_tested = metrics.timed('dedup', len(block), find_tested,
+                                                           conn, block)
+                        duplicates_skipped += len(already_tested)
+                        for num in block:
+                            if num not in already_tested:
+                                batch.append(num)
+                        test_count += len(block) - len(already_tested)
+                    
+                    if batch:
+                        if pool is not None:
+                            pending.append((batch, None, pool.apply_async(
+                                summarize_batch, (batch, kernel, keep_records))))
+                        else:
+                            pending.append((batch, None, metrics.timed(
+                                'compute', len(batch), summarize_batch, batch, kernel,
+                                keep_records)))
+                    
+                    # Keep generating while the pool has room for more work
+                    generating = test_count < num_tests and attempts < max_attempts
+                    if generating and len(pending) < max_in_flight:
+                        continue
+                
+                if not pending:
+                    continue
+                
+                # Merge the oldest finished batch into the session and all-time stats
+                batch, counter_end, result = pending.popleft()
+                if pool is not None:
+                    wait_start = time.perf_counter()
+                    result = result.get()
+                    metrics.record('compute', time.perf_counter() - wait_start,
+                                   (result[1] if batch is None else result).count)
+                if batch is None:
+                    batch, result = result
+                merge(batch, counter_end, result)
+    except KeyboardInterrupt:
+        interrupted = True
+    finally:
+        if stages is not None:
+            stages.abort()
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    
+    if interrupted:
+        # Keep everything merged so far; the cursor lets the next run resume
+        save_checkpoint(finished=False, status='interrupted')
+        if stages is not None:
+            stages.close()
+        export_metrics()
+        print(f"\n⏸️  Interrupted after {completed:,} of {num_tests:,} numbers. "
+              f"Progress saved; run again to resume.")
+        final_count = get_tested_count(conn)
+        if close_conn:
+            conn.close()
+        return {
+            'session_tested': completed,
+            'total_unique': final_count,
+            'duplicates_skipped': duplicates_skipped,
+            'all_time_stats': all_time_stats,
+            'session_stats': session,
+            'metrics': metrics_snapshot(),
+            'interrupted': True
+        }
     
     end_time = time.time()
     elapsed = end_time - start_time
     
-    # Save any remaining batch and stats
-    if batch_to_save:
-        mark_tested_batch(conn, batch_to_save)
-    save_all_time_stats(conn, all_time_stats)
-    conn.commit()
+    # Save any remaining batch and stats, and close out the session cursor
+    save_checkpoint(finished=True, status='budget' if budget_reached else 'complete')
+    if stages is not None:
+        stages.close()
+    export_metrics()
     
     final_count = get_tested_count(conn)
     print(f"✓ Database now contains {final_count:,} tested numbers")
     
     # Final results
     print(f"\n{'='*70}")
-    print("✓ SESSION COMPLETE!")
+    print("✓ SESSION COMPLETE!" + (" (time budget reached)" if budget_reached else ""))
     print(f"{'='*70}\n")
     
     print(f"📊 THIS SESSION:")
     print(f"   New numbers tested: {test_count:,}")
+    if resumed:
+        print(f"   Resumed from checkpoint: {resumed:,} (session started {started})")
     print(f"   Duplicates skipped: {duplicates_skipped:,}")
     print(f"   Generation attempts: {attempts:,}")
     print(f"   All numbers reached 1: {all_reach_one}")
-    print(f"   Session average steps: {session_total_steps / test_count:.2f}")
+    print(f"   Session average steps: {session.total_steps / test_count:.2f}")
+    percentiles = session.percentiles()
+    print("   Steps p50/p90/p99: " + " / ".join(
+        f"{v:,.0f}" for v in percentiles['steps'].values()))
+    print("   Peak ratio p50/p90/p99: " + " / ".join(
+        f"{v:,.0f}x" for v in percentiles['peak_ratio'].values()))
     print(f"   Execution time: {elapsed:.2f} seconds")
-    print(f"   Testing rate: {test_count / elapsed:.0f} numbers/second")
+    print(f"   Testing rate: {(test_count - resumed) / elapsed:.0f} numbers/second")
+    print(f"   Time by phase: {metrics.summary()}")
+    if stages is not None:
+        print(f"   Pipeline: {stages.report()}")
     
     print(f"\n📚 ALL-TIME TOTALS:")
     print(f"   Total unique numbers ever tested: {final_count:,}")
@@ -337,12 +3940,12 @@ def test_random_large_numbers(num_tests=100_000_000, min_value=10_000_000_000,
     print(f"   └─ Peak is {highest_peak / highest_peak_num:.0f}x the starting number")
     
     print(f"\n🥇 THIS SESSION'S TOP 10 LONGEST:")
-    for i, (steps, num) in enumerate(session_top_10_longest, 1):
+    for i, (steps, num) in enumerate(session.sorted_longest(), 1):
         marker = "🆕 NEW RECORD!" if steps == longest_sequence and num == longest_sequence_num else ""
         print(f"   {i:2d}. {num:,} → {steps:,} steps {marker}")
     
     print(f"\n🚀 THIS SESSION'S TOP 10 HIGHEST PEAKS:")
-    for i, (peak, num) in enumerate(session_top_10_highest, 1):
+    for i, (peak, num) in enumerate(session.sorted_highest(), 1):
         ratio = peak / num
         marker = "🆕 NEW RECORD!" if peak == highest_peak and num == highest_peak_num else ""
         print(f"   {i:2d}. {num:,} → {peak:,} ({ratio:.0f}x) {marker}")
@@ -356,7 +3959,7 @@ def test_random_large_numbers(num_tests=100_000_000, min_value=10_000_000_000,
         'longest_num': longest_sequence_num,
         'highest_peak': highest_peak,
         'highest_peak_num': highest_peak_num,
-        'average_steps': session_total_steps / test_count
+        'average_steps': session.total_steps / test_count
     }
     append_to_results_log(session_info)
     
@@ -368,39 +3971,514 @@ def test_random_large_numbers(num_tests=100_000_000, min_value=10_000_000_000,
         'session_tested': test_count,
         'total_unique': final_count,
         'duplicates_skipped': duplicates_skipped,
-        'all_time_stats': all_time_stats
+        'all_time_stats': all_time_stats,
+        'session_stats': session,
+        'metrics': metrics_snapshot()
+    }
+
+
+def verify_range(low, high, conn=None, bits=SIEVE_BITS, time_budget=None,
+                 checkpoint_interval=CHECKPOINT_INTERVAL):
+    """
+    Verify every number in the contiguous interval [low, high].
+    
+    Instead of following each trajectory to 1 and storing every number, a
+    number only has to drop below itself (first_failure_to_descend): with
+    everything below it verified, it then reaches 1 too. Residue classes mod
+    2^bits that provably descend are skipped without being looked at, and
+    the survivors start `bits` steps in. Parts of the interval that are
+    already covered are skipped, and progress is recorded in the
+    `verified_ranges` table as merged intervals every `checkpoint_interval`
+    seconds, so an interrupted run continues where it stopped when it is
+    started again with the same interval.
+    Returns: dict with the counts, elapsed time and how the run ended
+    """
+    if conn is None:
+        conn = init_db()
+    if not 1 <= low <= high < (1 << (8 * KEY_WIDTH)) - 1:
+        raise ValueError(f"range must satisfy 1 <= low <= high < 2^{8 * KEY_WIDTH} - 1")
+    
+    print(f"\nVerifying every number from {low:,} to {high:,}")
+    sieve = get_descent_sieve(bits)
+    print(f"Residue sieve mod 2^{bits}: {len(sieve['residues']):,} of {1 << bits:,} "
+          f"classes need checking ({len(sieve['residues']) / (1 << bits):.2%})")
+    if time_budget:
+        print(f"Time budget: {time_budget:,.0f} seconds")
+    print("=" * 70)
+    
+    # The parts of [low, high] not verified yet
+    gaps = []
+    n = low
+    for covered_low, covered_high in load_verified_ranges(conn):
+        if covered_high < n or covered_low > high:
+            continue
+        if covered_low > n:
+            gaps.append((n, covered_low - 1))
+        n = covered_high + 1
+    if n <= high:
+        gaps.append((n, high))
+    skipped = high - low + 1 - sum(gap_high - gap_low + 1 for gap_low, gap_high in gaps)
+    if skipped:
+        print(f"↩️  {skipped:,} numbers of the range were already verified")
+    
+    start_time = time.time()
+    last_save = start_time
+    chunk = 1 << (bits + 4)  # Numbers per call between interrupt and checkpoint checks
+    verified = 0
+    followed = 0
+    failed = None
+    interrupted = False
+    budget_exhausted = False
+    saved_to = done_to = None
+    
+    def save():
+        """Record the numbers verified since the last save."""
+        nonlocal saved_to, last_save
+        if done_to is not None and done_to > saved_to:
+            add_verified_range(conn, saved_to + 1, done_to)
+            conn.commit()
+            saved_to = done_to
+        last_save = time.time()
+    
+    try:
+        for gap_low, gap_high in gaps:
+            saved_to = done_to = gap_low - 1
+            n = gap_low
+            while n <= gap_high:
+                chunk_high = min(gap_high, n | (chunk - 1))
+                failure, count = first_failure_to_descend(n, chunk_high, bits)
+                followed += count
+                if failure is not None:
+                    failed = failure
+                    verified += failure - n
+                    done_to = failure - 1
+                    break
+                verified += chunk_high - n + 1
+                done_to = chunk_high
+                n = chunk_high + 1
+                
+                if time.time() - last_save >= checkpoint_interval:
+                    save()
+                    elapsed = time.time() - start_time
+                    print(f"   Verified up to {done_to:,} | {verified / elapsed:,.0f} numbers/sec | "
+                          f"{followed / verified:.2%} followed")
+                if time_budget and time.time() - start_time >= time_budget:
+                    budget_exhausted = True
+                    break
+            save()
+            if failed is not None or budget_exhausted:
+                break
+    except KeyboardInterrupt:
+        interrupted = True
+        save()
+    
+    elapsed = time.time() - start_time
+    print("\n" + "=" * 70)
+    if failed is not None:
+        print(f"🚨 {failed:,} did not drop below itself within {MAX_STEPS:,} steps!")
+        print("   Check it with collatz_steps: this is either a very long trajectory or a")
+        print("   counterexample. Everything below it in the range was verified.")
+    elif interrupted:
+        print(f"⏸️  Interrupted; verified up to {done_to:,}. Run the same range again to continue.")
+    elif budget_exhausted:
+        print(f"⏱️  Time budget used; verified up to {done_to:,}. Run the same range again to continue.")
+    else:
+        print("✓ Every number in the range was verified")
+    rate = verified / elapsed if elapsed > 0 else 0
+    print(f"   Numbers verified this run: {verified:,} in {elapsed:.2f} seconds "
+          f"({rate:,.0f} numbers/sec)")
+    if verified:
+        print(f"   Trajectories followed: {followed:,} ({followed / verified:.2%}; "
+              f"the rest were skipped by the sieve)")
+    print(f"   Verified intervals stored: {len(load_verified_ranges(conn)):,}")
+    print(f"   Everything up to {verified_prefix(conn):,} is verified to reach 1")
+    print("=" * 70)
+    
+    return {
+        'verified': verified,
+        'followed': followed,
+        'elapsed': elapsed,
+        'failed': failed,
+        'interrupted': interrupted,
+        'budget_exhausted': budget_exhausted
     }
 
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description='Test random large numbers against the Collatz conjecture'
+    )
+    parser.add_argument(
+        '--tests',
+        type=int,
+        default=1_000_000,
+        help='Number of new numbers to test this session (default: 1,000,000)'
+    )
+    parser.add_argument(
+        '--time-budget',
+        type=float,
+        default=None,
+        help='Stop the session in time to finish within this many seconds'
+    )
+    parser.add_argument(
+        '--checkpoint-interval',
+        type=float,
+        default=CHECKPOINT_INTERVAL,
+        help=f'Seconds between checkpoints of tested numbers and stats '
+             f'(default: {CHECKPOINT_INTERVAL})'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of worker processes used to compute batches (default: 1)'
+    )
+    parser.add_argument(
+        '--pipeline',
+        action='store_true',
+        help='Run generation, duplicate checks, computation and database writes '
+             'as concurrent stages with a background writer thread'
+    )
+    parser.add_argument(
+        '--metrics-json',
+        default=None,
+        help='Write a JSON snapshot of per-phase timings and counters to this '
+             'file at every checkpoint'
+    )
+    parser.add_argument(
+        '--metrics-prom',
+        default=None,
+        help='Write the same snapshot in Prometheus textfile format to this file'
+    )
+    parser.add_argument(
+        '--kernel',
+        choices=['auto'] + sorted(KERNELS) + sorted(BATCH_KERNELS),
+        default='auto',
+        help='Trajectory kernel; all kernels give identical results. auto times '
+             'each available kernel on a sample of the range at startup and '
+             'uses the fastest (default: auto)'
+    )
+    parser.add_argument(
+        '--check-kernels',
+        action='store_true',
+        help=f'Check that every available kernel agrees exactly with the reference '
+             f'on edge cases and {KERNEL_CHECK_SAMPLE:,} random numbers, and exit'
+    )
+    parser.add_argument(
+        '--recalibrate',
+        action='store_true',
+        help='With --kernel auto, time the kernels again instead of reusing the '
+             'choice saved in the database for this machine and range'
+    )
+    parser.add_argument(
+        '--tail-bits',
+        type=int,
+        default=None,
+        metavar='K',
+        help=f'With --kernel tail, bound of the cached small-value table: 2^K, '
+             f'8 <= K <= {TAIL_MAX_BITS} (default: the existing {TAIL_TABLE_FILE}, or '
+             f'{TAIL_BITS}). Building it takes about 25 bytes of RAM and 10 bytes of '
+             f'disk per value: about 1.7 GB and 640 MB at 2^{TAIL_MAX_BITS}'
+    )
+    parser.add_argument(
+        '--sampler',
+        choices=['random', 'permutation'],
+        default='random',
+        help='How candidates are drawn: independent random draws checked against '
+             'the database, or a keyed permutation of the range that never '
+             'repeats and needs no lookups (default: random)'
+    )
+    parser.add_argument(
+        '--skip-dedup',
+        action='store_true',
+        help='With the random sampler, skip the per-number database lookup and '
+             'back out the rare numbers that turn out to be tested already when '
+             'they are inserted; prints the expected number of such duplicates'
+    )
+    parser.add_argument(
+        '--db',
+        default=DB_FILE,
+        help=f'Path to the SQLite database (default: {DB_FILE})'
+    )
+    parser.add_argument(
+        '--startup-check',
+        choices=STARTUP_CHECKS,
+        default='auto',
+        help='Validate the database on open: full integrity_check, quick_check, '
+             'or auto (skip it if the files are unchanged since the last clean '
+             'close, else quick_check) (default: auto)'
+    )
+    parser.add_argument(
+        '--mmap-size',
+        type=int,
+        default=MMAP_SIZE,
+        metavar='BYTES',
+        help=f'Bytes of each database file SQLite may memory-map; 0 disables '
+             f'(default: {MMAP_SIZE})'
+    )
+    parser.add_argument(
+        '--warmup',
+        action='store_true',
+        help='Ask the OS to read the database files into its page cache on open'
+    )
+    parser.add_argument(
+        '--bloom',
+        action='store_true',
+        help=f'Answer definite misses from a Bloom filter sidecar (<db>{BLOOM_SUFFIX})'
+    )
+    parser.add_argument(
+        '--bloom-fp-rate',
+        type=float,
+        default=None,
+        help=f'Target false-positive rate for the Bloom filter (default: {BLOOM_FP_RATE})'
+    )
+    parser.add_argument(
+        '--bloom-capacity',
+        type=int,
+        default=None,
+        help='Keys the Bloom filter is sized for (default: 2x the current row count)'
+    )
+    parser.add_argument(
+        '--results',
+        action='store_true',
+        help=f'Keep the steps and peak of every tested number in a columnar '
+             f'store (<db>{RESULTS_SUFFIX}/)'
+    )
+    parser.add_argument(
+        '--query-steps',
+        type=int,
+        default=None,
+        metavar='N',
+        help='Print every stored number with more than N steps and exit'
+    )
+    parser.add_argument(
+        '--range',
+        nargs=2,
+        type=int,
+        default=None,
+        metavar=('A', 'B'),
+        help='Verify every number in [A, B] (residue sieve, stop below start) '
+             'instead of testing random numbers, and exit'
+    )
+    parser.add_argument(
+        '--sieve-bits',
+        type=int,
+        default=SIEVE_BITS,
+        metavar='K',
+        help=f'Residue sieve modulus 2^K for --range (default: {SIEVE_BITS})'
+    )
+    parser.add_argument(
+        '--reshard',
+        type=int,
+        default=None,
+        metavar='N',
+        help='Move the tested numbers into N shard files (1 = back into the '
+             'main database file) and exit'
+    )
+    parser.add_argument(
+        '--merge',
+        nargs='+',
+        default=None,
+        metavar='DB',
+        help='Merge the tested numbers and stats of these databases into a new '
+             'database at --db and exit'
+    )
+    parser.add_argument(
+        '--export-snapshot',
+        action='store_true',
+        help=f'Write a sorted, memory-mappable snapshot of the tested keys '
+             f'(<db>{SNAPSHOT_SUFFIX}) for read-only consumers and exit'
+    )
+    parser.add_argument(
+        '--rebuild-bloom',
+        action='store_true',
+        help='Rebuild the Bloom filter from the database and exit'
+    )
+    
+    args = parser.parse_args()
+    if args.kernel in BATCH_KERNELS and np is None:
+        parser.error(f"--kernel {args.kernel} requires numpy (pip install numpy)")
+    if args.skip_dedup and args.pipeline:
+        parser.error("--skip-dedup cannot be combined with --pipeline")
+    if args.tail_bits is not None and not 8 <= args.tail_bits <= TAIL_MAX_BITS:
+        parser.error(f"--tail-bits must be between 8 and {TAIL_MAX_BITS}")
+    if args.bloom_fp_rate is not None and not 0 < args.bloom_fp_rate < 1:
+        parser.error("--bloom-fp-rate must be between 0 and 1")
+    
+    # Range of the random sessions (and of the kernel check and calibration)
+    min_value = 10_000_000_000
+    max_value = 1_000_000_000_000_000_000_000_000_000_000
+    
+    if args.check_kernels:
+        if args.tail_bits is not None:
+            get_tail_table(args.tail_bits)
+        names = available_kernels()
+        numbers = kernel_check_numbers(min_value, max_value)
+        print(f"🔬 Checking {', '.join(name for name in names if name != 'reference')} "
+              f"against the reference on {len(numbers):,} numbers...")
+        mismatches = check_kernels(numbers, names)
+        for name, bad in mismatches.items():
+            if bad:
+                n, want, got = bad[0]
+                print(f"   ❌ {name}: {len(bad):,} mismatches, e.g. {n:,}: "
+                      f"expected {want}, got {got}")
+            else:
+                print(f"   ✓ {name}: identical")
+        raise SystemExit(1 if any(mismatches.values()) else 0)
+    
+    if args.reshard is not None:
+        if args.reshard < 1:
+            parser.error("--reshard needs at least 1 shard")
+        print(f"🔀 Re-sharding {args.db} into {args.reshard} shard file(s)...")
+        start = time.time()
+        moved = reshard_database(args.db, args.reshard)
+        if moved is None:
+            print("   ✓ Already in that layout; nothing to do")
+        else:
+            print(f"   ✓ Moved {moved:,} keys in {time.time() - start:.1f} seconds")
+        raise SystemExit(0)
+    
+    if args.range:
+        if not 1 <= args.sieve_bits <= 24:
+            parser.error("--sieve-bits must be between 1 and 24")
+        conn = init_db(args.db, args.startup_check, args.mmap_size, args.warmup)
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            results = verify_range(args.range[0], args.range[1], conn, args.sieve_bits,
+                                   args.time_budget, args.checkpoint_interval)
+        except ValueError as e:
+            parser.error(str(e))
+        finally:
+            conn.close()
+        if results['failed'] is not None:
+            raise SystemExit(1)
+        raise SystemExit(130 if results['interrupted'] else 0)
+    
+    if args.merge:
+        print(f"🔗 Merging {len(args.merge)} database(s) into {args.db}...")
+        start = time.time()
+        try:
+            report = merge_databases(args.merge, args.db)
+        except ValueError as e:
+            parser.error(str(e))
+        for source in report['inputs']:
+            print(f"   {source['path']}: {source['rows']:,} keys, "
+                  f"{source['shared']:,} also in another input")
+        print(f"   ✓ {report['rows']:,} unique keys written; {report['overlap_keys']:,} keys were in "
+              f"more than one input ({report['extra_copies']:,} extra copies dropped) "
+              f"in {time.time() - start:.1f} seconds")
+        if report['unresolved_steps']:
+            print(f"   ⚠️  Steps of {report['unresolved_steps']:,} extra copies could not be "
+                  f"recomputed from their keys; total_steps and the distribution "
+                  f"still count them")
+        raise SystemExit(0)
+    
+    if args.export_snapshot:
+        conn = init_db(args.db, args.startup_check, args.mmap_size, args.warmup)
+        print(f"📸 Exporting key snapshot of {args.db}...")
+        start = time.time()
+        rows = export_key_snapshot(conn)
+        path = args.db + SNAPSHOT_SUFFIX
+        print(f"   ✓ {rows:,} keys written to {path} "
+              f"({os.path.getsize(path) / 1024 / 1024:.1f} MB) in {time.time() - start:.1f} seconds")
+        conn.close()
+        raise SystemExit(0)
+    
+    if args.rebuild_bloom:
+        conn = init_db(args.db, args.startup_check, args.mmap_size, args.warmup)
+        print(f"🔄 Rebuilding Bloom filter for {args.db}...")
+        bloom = rebuild_bloom_filter(conn, args.bloom_capacity,
+                                     args.bloom_fp_rate or BLOOM_FP_RATE)
+        print(f"   ✓ {bloom.items:,} keys, {bloom.num_bits / 8 / 1024 / 1024:.1f} MB, "
+              f"{bloom.num_hashes} hashes, capacity {bloom.capacity:,} "
+              f"at {bloom.fp_rate:.2%} false positives")
+        bloom.close()
+        conn.close()
+        raise SystemExit(0)
+    
+    if args.query_steps is not None:
+        conn = init_db(args.db, args.startup_check, args.mmap_size, args.warmup)
+        store = open_results_store(conn)
+        matches = store.query_steps(args.query_steps)
+        for num, steps, peak in matches:
+            print(f"{num}\t{steps}\t{peak}")
+        print(f"✓ {len(matches):,} of {len(store):,} stored numbers take more than "
+              f"{args.query_steps:,} steps", file=sys.stderr)
+        store.close()
+        conn.close()
+        raise SystemExit(0)
+    
     print("\n" + "="*70)
     print("COLLATZ CONJECTURE - PERSISTENT RANDOM TESTER")
     print("School Project Edition - Remembers All Previous Tests!")
     print("="*70)
     
+    # Initialize database
+    conn = init_db(args.db, args.startup_check, args.mmap_size, args.warmup)
+    
     print("\n📁 Storage:")
-    print(f"   Numbers database: {DB_FILE} (SQLite with SHA-256 hashes)")
+    shards = f", {len(conn.shards)} shards" if conn.shards else ""
+    print(f"   Numbers database: {args.db} (SQLite with {conn.key_format} keys{shards})")
     print(f"   Results history: {RESULTS_LOG}")
-    
-    # Initialize database
-    conn = init_db()
+    if args.bloom:
+        attach_bloom_filter(conn, args.bloom_fp_rate, args.bloom_capacity)
+    results_store = open_results_store(conn) if args.results else None
+    if results_store is not None:
+        print(f"   Results store: {results_store.path} ({len(results_store):,} rows)")
+    if args.kernel == 'tail' or (args.kernel == 'auto' and args.tail_bits is not None):
+        tail = get_tail_table(args.tail_bits)
+        print(f"   Tail table: {tail.path} (values below 2^{tail.bits})")
+    if args.kernel == 'auto':
+        # Calibrated once per machine and range, then reused (see --recalibrate)
+        key = kernel_calibration_key(min_value, max_value)
+        calibration = None if args.recalibrate else load_kernel_calibration(conn, key)
+        source = "saved calibration:"
+        if calibration is None:
+            calibration = calibrate_kernels(min_value, max_value)
+            save_kernel_calibration(conn, key, *calibration)
+            conn.commit()
+            source = "fastest of"
+        args.kernel, timings = calibration
+        print(f"   Kernel: {args.kernel} ({source} " + ", ".join(
+            f"{name} {seconds * 1e6:.0f} µs" for name, seconds in
+            sorted(timings.items(), key=lambda item: item[1])) + " per number)")
     
     # Use a fixed number of tests (non-interactive)
     print("\n" + "="*70)
-    num_tests = 1_000_000
+    num_tests = args.tests
     print(f"Automatically testing {num_tests:,} new numbers this session (no prompt).")
     
+    # Treat a cancelled CI job (SIGTERM) like Ctrl-C: checkpoint and stop
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    
     # Test random large numbers
     results = test_random_large_numbers(
         num_tests=num_tests,
-        min_value=10_000_000_000,      
-        max_value=1_000_000_000_000_000_000_000_000_000_000,
-        conn=conn
+        min_value=min_value,
+        max_value=max_value,
+        conn=conn,
+        workers=args.workers,
+        kernel=args.kernel,
+        sampler=args.sampler,
+        time_budget=args.time_budget,
+        checkpoint_interval=args.checkpoint_interval,
+        pipeline=args.pipeline,
+        metrics_json=args.metrics_json,
+        metrics_prom=args.metrics_prom,
+        results_store=results_store,
+        skip_dedup=args.skip_dedup
     )
     
     # Close database
+    if results_store is not None:
+        results_store.close()
     conn.close()
     
+    if results.get('interrupted'):
+        raise SystemExit(130)
+    
     print("\n" + "="*70)
     print("🎯 CONCLUSION:")
     print(f"   Session successfully tested {results['session_tested']:,} new numbers!")
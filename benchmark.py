@@ -0,0 +1,615 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the hot paths of 3x1.py.
+
+Times the trajectory kernels, key generation, duplicate lookups, batch
+inserts and database startup on fixed-seed inputs (numbers from 10^10 to
+10^30, databases from 10^5 rows up), writes the results as JSON and can
+compare them against a stored baseline, failing when any benchmark got
+slower than the baseline by more than a threshold.
+
+    python3 benchmark.py --output baseline.json
+    python3 benchmark.py --baseline baseline.json --threshold 0.15
+
+With --scaling it instead synthesizes databases of each given size (up to
+10^9 rows) and reports how lookup latency, insert throughput, startup time
+and file size change with the size of `tested`, as JSON and/or CSV.
+
+    python3 benchmark.py --scaling 1e6,1e7,1e8,1e9 --csv scaling.csv
+"""
+
+import csv
+import importlib.util
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+
+# Configuration
+COLLATZ_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '3x1.py')
+SEED = 3141592653
+MIN_VALUE = 10_000_000_000
+MAX_VALUE = 1_000_000_000_000_000_000_000_000_000_000
+DB_SIZES = '1e5,1e6'  # Up to 1e8 rows; databases are built once and reused
+WORK_DIR = 'benchmark_dbs'
+REPEAT = 5
+THRESHOLD = 0.20  # Allowed slowdown against the baseline (20%)
+BUILD_CHUNK = 100_000
+LOOKUP_SAMPLE = 1000
+INSERT_BATCH = 1000
+SCALING_SIZES = '1e6,1e7,1e8,1e9'
+SCALING_SUFFIX_BYTES = 11  # Random low bytes of each synthesized key
+SCALING_BYTES_PER_ROW = 26  # Size estimate before the first database is measured
+SCALING_LATENCY_SAMPLE = 2000
+SCALING_INSERT_BATCHES = 20
+DISK_RESERVE = 1024 ** 3  # Free space always left on the disk
+
+
+def load_collatz(path=COLLATZ_SCRIPT):
+    """Import 3x1.py, whose file name is not a valid module name."""
+    spec = importlib.util.spec_from_file_location('collatz', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(func, ops, repeat=REPEAT):
+    """
+    Time func() `repeat` times and keep the fastest run, which is the one
+    least disturbed by the rest of the system.
+    Returns: seconds per operation
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best / ops
+
+
+def sample_numbers(count, seed=SEED):
+    """Fixed-seed numbers spread over the tested range."""
+    rng = random.Random(seed)
+    return [rng.randint(MIN_VALUE, MAX_VALUE) for _ in range(count)]
+
+
+def bench_kernels(collatz, repeat):
+    """
+    Time every available kernel on the same numbers. The tail kernel is
+    only timed once its table exists, so a benchmark run never builds it.
+    """
+    results = {}
+    for name in sorted(collatz.available_kernels()):
+        if name in collatz.BATCH_KERNELS:
+            compute = collatz.BATCH_KERNELS[name]
+            numbers = sample_numbers(10_000)
+            compute(numbers[:10])
+            results[f'kernel.{name}'] = measure(lambda: compute(numbers), len(numbers), repeat)
+            continue
+        compute = collatz.KERNELS[name]
+        numbers = sample_numbers(2000)
+        compute(numbers[0])  # Build any lookup tables outside the timing
+        results[f'kernel.{name}'] = measure(
+            lambda: [compute(n) for n in numbers], len(numbers), repeat)
+    return results
+
+
+def bench_keys(collatz, repeat):
+    """Time key generation for both key formats and the session dedup set."""
+    numbers = sample_numbers(100_000)
+    return {
+        'hash_number': measure(
+            lambda: [collatz.hash_number(n) for n in numbers], len(numbers), repeat),
+        'number_key.int128': measure(
+            lambda: [collatz.number_key(n) for n in numbers], len(numbers), repeat),
+        'session_set.add_batch': measure(
+            lambda: collatz.CompactKeySet().add_batch(numbers), len(numbers), repeat),
+    }
+
+
+def build_database(collatz, path, rows, seed=SEED):
+    """
+    Create an int128-keyed database holding `rows` numbers from the range.
+    Numbers are generated in increasing order with random gaps, so they are
+    spread uniformly over the range and every insert appends to the B-tree.
+    """
+    rng = random.Random(seed)
+    conn = collatz.init_db(path)
+    gap = (MAX_VALUE - MIN_VALUE) // rows
+    n = MIN_VALUE
+    written = 0
+    while written < rows:
+        chunk = min(BUILD_CHUNK, rows - written)
+        keys = []
+        for _ in range(chunk):
+            n += rng.randint(1, 2 * gap - 1)
+            keys.append((n.to_bytes(collatz.KEY_WIDTH, 'big'),))
+        conn.executemany('INSERT INTO tested (hash) VALUES (?)', keys)
+        written += chunk
+        collatz.save_tested_count(conn, written)
+        conn.commit()
+    conn.close()
+
+
+def open_database(collatz, rows, work_dir):
+    """Open the benchmark database with `rows` rows, building it if needed."""
+    path = os.path.join(work_dir, f'bench_{rows}.db')
+    if os.path.exists(path):
+        conn = collatz.init_db(path)
+        if collatz.get_tested_count(conn) == rows:
+            return path, conn
+        conn.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    print(f"   Building {rows:,} row database in {path}...")
+    start = time.time()
+    build_database(collatz, path, rows)
+    print(f"   ✓ Built in {time.time() - start:.1f} seconds")
+    return path, collatz.init_db(path)
+
+
+def bench_database(collatz, rows, work_dir, repeat):
+    """Time lookups, batch inserts and startup on a database of `rows` rows."""
+    path, conn = open_database(collatz, rows, work_dir)
+    prefix = f'db{rows:.0e}'.replace('+', '')
+    rng = random.Random(SEED + rows)
+    
+    # Existing numbers: the first key at or after random points of the range
+    hits = []
+    while len(hits) < LOOKUP_SAMPLE:
+        probe = rng.randint(MIN_VALUE, MAX_VALUE).to_bytes(collatz.KEY_WIDTH, 'big')
+        row = conn.execute('SELECT hash FROM tested WHERE hash >= ? LIMIT 1',
+                           (probe,)).fetchone()
+        if row:
+            hits.append(int.from_bytes(row[0], 'big'))
+    misses = [rng.randint(MIN_VALUE, MAX_VALUE) for _ in range(LOOKUP_SAMPLE)]
+    
+    results = {
+        f'{prefix}.has_been_tested.hit': measure(
+            lambda: [collatz.has_been_tested(conn, n) for n in hits], len(hits), repeat),
+        f'{prefix}.has_been_tested.miss': measure(
+            lambda: [collatz.has_been_tested(conn, n) for n in misses], len(misses), repeat),
+        f'{prefix}.find_tested': measure(
+            lambda: collatz.find_tested(conn, hits + misses), len(hits) + len(misses), repeat),
+    }
+    
+    # Insert and commit a fresh batch, then take it out again untimed so
+    # the database stays the same size between runs
+    best = float('inf')
+    for _ in range(repeat):
+        batch = [rng.randint(MIN_VALUE, MAX_VALUE) for _ in range(INSERT_BATCH)]
+        start = time.perf_counter()
+        collatz.mark_tested_batch(conn, batch)
+        conn.commit()
+        best = min(best, time.perf_counter() - start)
+        conn.executemany('DELETE FROM tested WHERE hash = ?',
+                         [(collatz.number_key(n),) for n in batch])
+        collatz.save_tested_count(conn, rows)
+        conn.commit()
+    results[f'{prefix}.mark_tested_batch'] = best / INSERT_BATCH
+    
+    # The same lookups against a memory-mapped key snapshot
+    snapshot = None
+    if os.path.exists(path + collatz.SNAPSHOT_SUFFIX):
+        snapshot = collatz.open_key_snapshot(conn)
+    if snapshot is None:
+        collatz.export_key_snapshot(conn)
+        snapshot = collatz.open_key_snapshot(conn)
+    results[f'{prefix}.snapshot.hit'] = measure(
+        lambda: [collatz.has_been_tested(snapshot, n) for n in hits], len(hits), repeat)
+    results[f'{prefix}.snapshot.miss'] = measure(
+        lambda: [collatz.has_been_tested(snapshot, n) for n in misses], len(misses), repeat)
+    snapshot.close()
+    conn.close()
+    
+    results[f'{prefix}.init_db'] = measure(lambda: collatz.init_db(path).close(), 1, repeat)
+    return results
+
+
+def synthesize_database(collatz, path, rows):
+    """
+    Create a database with the real schema holding about `rows` random
+    int128 keys from the range, generated inside SQLite. The range is cut
+    into chunks of 2^(8 * SCALING_SUFFIX_BYTES) numbers; each chunk's rows
+    share its fixed high bytes, get random low bytes and are inserted
+    sorted, so the B-tree is built by appending. Unlike build_database the
+    keys do not depend on SEED.
+    Returns: number of rows written
+    """
+    shift = 8 * SCALING_SUFFIX_BYTES
+    first, last = MIN_VALUE >> shift, MAX_VALUE >> shift
+    chunks = last - first + 1
+    conn = collatz.init_db(path)
+    conn.execute('PRAGMA journal_mode=OFF;')  # A failed build is simply built again
+    conn.execute('PRAGMA synchronous=OFF;')
+    insert = '''WITH RECURSIVE seq(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM seq WHERE i < ?)
+        INSERT OR IGNORE INTO tested (hash)
+        SELECT key FROM (SELECT CAST(? || randomblob(?) AS BLOB) AS key FROM seq)
+        ORDER BY key'''
+    written = 0
+    reported = 0
+    for j in range(chunks):
+        count = rows * (j + 1) // chunks - rows * j // chunks
+        if count == 0:
+            continue
+        prefix = (first + j).to_bytes(collatz.KEY_WIDTH - SCALING_SUFFIX_BYTES, 'big')
+        changes = conn.total_changes  # rowcount is not set for statements starting with WITH
+        conn.execute(insert, (count, prefix, SCALING_SUFFIX_BYTES))
+        written += conn.total_changes - changes
+        if written - reported >= max(rows // 10, 10 * BUILD_CHUNK):
+            conn.commit()
+            reported = written
+            print(f"   {written:,} / {rows:,} rows")
+    collatz.save_tested_count(conn, written)
+    conn.commit()
+    conn.close()
+    return written
+
+
+def evict_page_cache(path):
+    """Ask the OS to drop the cached pages of a file, so the next reads go to disk."""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    for name in (path, f"{path}-wal"):
+        try:
+            fd = os.open(name, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+def latency_percentiles(func, items, label):
+    """
+    Time func(item) for each item separately.
+    Returns: dict of '<label>_p50_us', _p90_us, _p99_us and _max_us
+    """
+    times = []
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    result = {}
+    for name, q in (('p50', 0.50), ('p90', 0.90), ('p99', 0.99)):
+        result[f'{label}_{name}_us'] = times[min(len(times) - 1, int(q * len(times)))] * 1e6
+    result[f'{label}_max_us'] = times[-1] * 1e6
+    return result
+
+
+def bench_scaling(collatz, rows, work_dir, discard=False):
+    """
+    Measure one database size: file size, build time, init_db startup with
+    a cold page cache, has_been_tested latency percentiles for hits and
+    misses, find_tested and mark_tested_batch throughput.
+    Returns: dict of metric name -> value
+    """
+    path = os.path.join(work_dir, f'scale_{rows}.db')
+    result = {'rows': rows, 'build_seconds': None}
+    existing = None
+    if os.path.exists(path):
+        conn = collatz.init_db(path)
+        existing = collatz.get_tested_count(conn)
+        conn.close()
+    if existing is None or abs(existing - rows) > rows // 1000:
+        for name in [path] + [path + suffix for suffix in
+                              ('-wal', '-shm', collatz.FINGERPRINT_SUFFIX)]:
+            if os.path.exists(name):
+                os.remove(name)
+        print(f"   Synthesizing {rows:,} row database in {path}...")
+        start = time.time()
+        existing = synthesize_database(collatz, path, rows)
+        result['build_seconds'] = time.time() - start
+        print(f"   ✓ Built in {result['build_seconds']:.1f} seconds")
+    result['rows'] = existing
+    result['file_bytes'] = os.path.getsize(path)
+    result['bytes_per_row'] = result['file_bytes'] / max(existing, 1)
+    
+    # Startup: the fingerprint check of a clean database, then a quick_check
+    evict_page_cache(path)
+    start = time.perf_counter()
+    collatz.init_db(path, check='auto').close()
+    result['init_db_auto_seconds'] = time.perf_counter() - start
+    evict_page_cache(path)
+    start = time.perf_counter()
+    collatz.init_db(path, check='quick').close()
+    result['init_db_quick_seconds'] = time.perf_counter() - start
+    
+    # Existing numbers: the first key at or after random points of the range
+    conn = collatz.init_db(path)
+    rng = random.Random(SEED + rows)
+    hits = []
+    while len(hits) < SCALING_LATENCY_SAMPLE:
+        probe = rng.randint(MIN_VALUE, MAX_VALUE).to_bytes(collatz.KEY_WIDTH, 'big')
+        row = conn.execute('SELECT hash FROM tested WHERE hash >= ? LIMIT 1',
+                           (probe,)).fetchone()
+        if row:
+            hits.append(int.from_bytes(row[0], 'big'))
+    misses = [rng.randint(MIN_VALUE, MAX_VALUE) for _ in range(SCALING_LATENCY_SAMPLE)]
+    
+    # Lookups start from a cold page cache, as at the start of a session
+    conn.close()
+    evict_page_cache(path)
+    conn = collatz.init_db(path)
+    result.update(latency_percentiles(lambda n: collatz.has_been_tested(conn, n), misses, 'miss'))
+    result.update(latency_percentiles(lambda n: collatz.has_been_tested(conn, n), hits, 'hit'))
+    numbers = hits + misses
+    start = time.perf_counter()
+    collatz.find_tested(conn, numbers)
+    result['find_tested_per_second'] = len(numbers) / (time.perf_counter() - start)
+    
+    # Commit fresh batches, then take them out again untimed
+    inserted = []
+    elapsed = 0.0
+    for _ in range(SCALING_INSERT_BATCHES):
+        batch = [rng.randint(MIN_VALUE, MAX_VALUE) for _ in range(INSERT_BATCH)]
+        start = time.perf_counter()
+        collatz.mark_tested_batch(conn, batch)
+        conn.commit()
+        elapsed += time.perf_counter() - start
+        inserted.extend(batch)
+    result['mark_tested_per_second'] = len(inserted) / elapsed
+    conn.executemany('DELETE FROM tested WHERE hash = ?',
+                     [(collatz.number_key(n),) for n in inserted])
+    collatz.save_tested_count(conn, existing)
+    conn.commit()
+    conn.close()
+    
+    if discard:
+        for name in [path] + [path + suffix for suffix in
+                              ('-wal', '-shm', collatz.FINGERPRINT_SUFFIX)]:
+            if os.path.exists(name):
+                os.remove(name)
+    return result
+
+
+def run_scaling(sizes, work_dir=WORK_DIR, disk_budget=None, discard=False):
+    """
+    Measure each database size in turn, skipping sizes whose database would
+    not fit in `disk_budget` bytes (counting the databases kept so far) or
+    in the free disk space. Sizes are projected from the bytes per row of
+    the last measured database.
+    Returns: list of result dicts, one per measured size
+    """
+    collatz = load_collatz()
+    os.makedirs(work_dir, exist_ok=True)
+    bytes_per_row = SCALING_BYTES_PER_ROW
+    used = 0
+    results = []
+    for rows in sizes:
+        path = os.path.join(work_dir, f'scale_{rows}.db')
+        on_disk = os.path.getsize(path) if os.path.exists(path) else 0
+        needed = max(rows * bytes_per_row - on_disk, 0)
+        free = shutil.disk_usage(work_dir).free - DISK_RESERVE
+        if needed > free or (disk_budget is not None and used + on_disk + needed > disk_budget):
+            print(f"⚠️  Skipping {rows:,} rows: needs about {(on_disk + needed) / 1e9:.1f} GB "
+                  f"({free / 1e9:.1f} GB free"
+                  + (f", {(disk_budget - used) / 1e9:.1f} GB left in the budget)"
+                     if disk_budget is not None else ")"))
+            continue
+        print(f"⏱️  Database with {rows:,} rows...")
+        result = bench_scaling(collatz, rows, work_dir, discard)
+        bytes_per_row = result['bytes_per_row']
+        if not discard:
+            used += result['file_bytes']
+        results.append(result)
+    return results
+
+
+def print_scaling(results):
+    """Print the scaling results as a table."""
+    print(f"\n{'Rows':>14} {'Size':>10} {'B/row':>6} {'Startup':>10} "
+          f"{'Hit p50':>10} {'Hit p99':>10} {'Miss p50':>10} {'Miss p99':>10} {'Inserts/s':>11}")
+    print("-" * 99)
+    for r in results:
+        print(f"{r['rows']:>14,} {r['file_bytes'] / 1e9:>8.2f}GB {r['bytes_per_row']:>6.1f} "
+              f"{format_time(r['init_db_auto_seconds']):>10} "
+              f"{format_time(r['hit_p50_us'] / 1e6):>10} {format_time(r['hit_p99_us'] / 1e6):>10} "
+              f"{format_time(r['miss_p50_us'] / 1e6):>10} {format_time(r['miss_p99_us'] / 1e6):>10} "
+              f"{r['mark_tested_per_second']:>11,.0f}")
+
+
+def write_scaling_csv(results, path):
+    """Write the scaling results to a CSV file, one row per database size."""
+    fields = []
+    for result in results:
+        fields.extend(name for name in result if name not in fields)
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def run_benchmarks(db_sizes, work_dir=WORK_DIR, repeat=REPEAT, only=None):
+    """
+    Run every benchmark whose name matches `only` (a regular expression).
+    Returns: dict of benchmark name -> seconds per operation
+    """
+    collatz = load_collatz()
+    pattern = re.compile(only) if only else None
+    results = {}
+    
+    print("⏱️  Kernels and keys...")
+    results.update(bench_kernels(collatz, repeat))
+    results.update(bench_keys(collatz, repeat))
+    
+    if db_sizes:
+        os.makedirs(work_dir, exist_ok=True)
+    for rows in db_sizes:
+        print(f"⏱️  Database with {rows:,} rows...")
+        results.update(bench_database(collatz, rows, work_dir, repeat))
+    
+    if pattern:
+        results = {name: value for name, value in results.items() if pattern.search(name)}
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold=THRESHOLD):
+    """
+    Print each benchmark against the baseline.
+    Returns: list of benchmark names that are slower by more than `threshold`
+    """
+    regressions = []
+    print(f"\n{'Benchmark':<36} {'Baseline':>12} {'Current':>12} {'Change':>9}")
+    print("-" * 72)
+    for name, value in sorted(results.items()):
+        if name not in baseline:
+            print(f"{name:<36} {'-':>12} {format_time(value):>12} {'new':>9}")
+            continue
+        change = value / baseline[name] - 1
+        marker = ""
+        if change > threshold:
+            regressions.append(name)
+            marker = " ⚠️"
+        print(f"{name:<36} {format_time(baseline[name]):>12} {format_time(value):>12} "
+              f"{change:>+8.1%}{marker}")
+    return regressions
+
+
+def format_time(seconds):
+    """Format a per-operation time with a readable unit."""
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('µs', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description='Benchmark the hot paths of the Collatz tester'
+    )
+    parser.add_argument(
+        '--db-sizes',
+        default=DB_SIZES,
+        help=f'Comma-separated database sizes in rows, e.g. 1e5,1e6,1e8; '
+             f'empty to skip database benchmarks (default: {DB_SIZES})'
+    )
+    parser.add_argument(
+        '--work-dir',
+        default=WORK_DIR,
+        help=f'Where benchmark databases are built and kept (default: {WORK_DIR})'
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=REPEAT,
+        help=f'Runs per benchmark; the fastest is kept (default: {REPEAT})'
+    )
+    parser.add_argument(
+        '--only',
+        default=None,
+        help='Only report benchmarks whose name matches this regular expression'
+    )
+    parser.add_argument(
+        '--output',
+        default=None,
+        help='Write the results as JSON to this file'
+    )
+    parser.add_argument(
+        '--baseline',
+        default=None,
+        help='JSON results of an earlier run to compare against'
+    )
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=THRESHOLD,
+        help=f'Fail if a benchmark is this much slower than the baseline '
+             f'(default: {THRESHOLD})'
+    )
+    parser.add_argument(
+        '--scaling',
+        nargs='?',
+        const=SCALING_SIZES,
+        default=None,
+        metavar='SIZES',
+        help=f'Instead of the benchmarks, measure how the database scales at these '
+             f'comma-separated sizes in rows (default: {SCALING_SIZES})'
+    )
+    parser.add_argument(
+        '--csv',
+        default=None,
+        help='Write the --scaling results as CSV to this file'
+    )
+    parser.add_argument(
+        '--disk-budget',
+        type=float,
+        default=None,
+        metavar='GB',
+        help='Skip --scaling sizes whose databases would take more than this '
+             'many GB in total (default: the free disk space)'
+    )
+    parser.add_argument(
+        '--discard',
+        action='store_true',
+        help='Delete each --scaling database after measuring it instead of '
+             'keeping it for the next run'
+    )
+    
+    args = parser.parse_args()
+    
+    if args.scaling is not None:
+        sizes = [int(float(size)) for size in args.scaling.split(',') if size.strip()]
+        budget = args.disk_budget * 1e9 if args.disk_budget is not None else None
+        results = run_scaling(sizes, args.work_dir, budget, args.discard)
+        print_scaling(results)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({
+                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'sqlite': sqlite3.sqlite_version,
+                    'scaling': results
+                }, f, indent=2)
+            print(f"\n✓ Results written to {args.output}")
+        if args.csv:
+            write_scaling_csv(results, args.csv)
+            print(f"✓ Results written to {args.csv}")
+        sys.exit(0)
+    db_sizes = [int(float(size)) for size in args.db_sizes.split(',') if size.strip()]
+    
+    results = run_benchmarks(db_sizes, args.work_dir, args.repeat, args.only)
+    report = {
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': SEED,
+        'unit': 'seconds per operation',
+        'results': results
+    }
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Results written to {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} benchmark(s) regressed by more than "
+                  f"{args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"\n✓ No benchmark regressed by more than {args.threshold:.0%}")
+    else:
+        print(f"\n{'Benchmark':<36} {'Time per op':>12}")
+        print("-" * 50)
+        for name, value in sorted(results.items()):
+            print(f"{name:<36} {format_time(value):>12}")
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+Work-unit coordinator for running the Collatz tester on several machines.
+
+One coordinator owns the database and hands out work units: ranges of
+positions of the permutation sampler (see FeistelPermutation in 3x1.py), so
+no number is ever handed out twice and workers need no duplicate lookups.
+Workers compute a unit and send back its SessionStats summary; the
+coordinator regenerates the unit's numbers from the permutation, marks them
+tested and folds the summary into the all-time stats, all in the existing
+`tested` and `stats` tables. A unit whose lease runs out before its result
+arrives is handed out again.
+    
+    python3 coordinator.py serve --tests 1000000 --host 0.0.0.0
+    python3 coordinator.py work --host coordinator.local --processes 4
+
+The protocol is one JSON object per line over TCP:
+    {"op": "lease", "worker": NAME}          -> {"unit": {...}} | {"wait": S} | {"done": true}
+    {"op": "result", "unit": ID, "stats": {...}} -> {"ok": true} | {"ok": false, "error": ...}
+    {"op": "status"}                         -> counters
+"""
+
+import asyncio
+import importlib.util
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from collections import deque
+from datetime import datetime
+
+
+# Configuration
+COLLATZ_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '3x1.py')
+HOST = '127.0.0.1'
+PORT = 8765
+UNIT_SIZE = 10_000  # Permutation positions per work unit
+LEASE_SECONDS = 120  # A unit not reported back by then is handed out again
+WAIT_SECONDS = 1.0  # Suggested retry delay when every remaining unit is leased
+STATE_PREFIX = 'coordinator:'  # Sampler state apart from 3x1.py --sampler permutation
+MIN_VALUE = 10_000_000_000
+MAX_VALUE = 1_000_000_000_000_000_000_000_000_000_000
+
+
+def load_collatz(path=COLLATZ_SCRIPT):
+    """Import 3x1.py, whose file name is not a valid module name."""
+    spec = importlib.util.spec_from_file_location('collatz', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+collatz = load_collatz()
+
+
+def load_completed_units(conn, min_value, max_value):
+    """
+    Load the units completed past the sampler counter (they finished out of
+    order), as a dict of start -> count.
+    """
+    row = conn.execute('SELECT value FROM stats WHERE key = ?', ('coordinator_units',)).fetchone()
+    units = json.loads(row[0]) if row else {}
+    return {start: count for start, count in
+            units.get(f"{STATE_PREFIX}{min_value}:{max_value}", [])}
+
+
+def save_completed_units(conn, min_value, max_value, done):
+    """Save the out-of-order completed units for a range; the caller commits."""
+    row = conn.execute('SELECT value FROM stats WHERE key = ?', ('coordinator_units',)).fetchone()
+    units = json.loads(row[0]) if row else {}
+    units[f"{STATE_PREFIX}{min_value}:{max_value}"] = sorted(done.items())
+    conn.execute(
+        'INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)',
+        ('coordinator_units', json.dumps(units))
+    )
+
+
+class Coordinator:
+    """
+    Leases permutation ranges to workers and records their results.
+    
+    Units are identified by their start position. The sampler counter saved
+    in `stats` only moves past a unit once every unit before it is done;
+    units completed ahead of it are saved separately, so after a restart the
+    coordinator hands out exactly the gaps that were leased but never
+    reported. The counter is kept under STATE_PREFIX, with a seed of its
+    own, so local `3x1.py --sampler permutation` sessions on the same range
+    cannot move it.
+    """
+    
+    def __init__(self, conn, num_tests, min_value=MIN_VALUE, max_value=MAX_VALUE,
+                 unit_size=UNIT_SIZE, lease_seconds=LEASE_SECONDS):
+        self.conn = conn
+        self.num_tests = num_tests
+        self.min_value = min_value
+        self.max_value = max_value
+        self.unit_size = unit_size
+        self.lease_seconds = lease_seconds
+        
+        self.seed, self.frontier = collatz.load_sampler_state(conn, min_value, max_value,
+                                                              STATE_PREFIX)
+        self.permutation = collatz.FeistelPermutation(max_value - min_value + 1, self.seed)
+        self.done = load_completed_units(conn, min_value, max_value)
+        self.all_time_stats = collatz.load_all_time_stats(conn)
+        self.session = collatz.SessionStats()
+        
+        # Gaps between the counter and the units already completed past it
+        self.pending = deque()
+        position = self.frontier
+        for start, count in sorted(self.done.items()):
+            if start > position:
+                self.pending.append((position, start - position))
+            position = max(position, start + count)
+        self.next_start = position
+        self.assigned = sum(count for _, count in self.pending)
+        
+        self.leases = {}  # start -> (count, worker, expiry)
+        self.completed = 0
+        self.expired = 0
+        self.started = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.start_time = time.time()
+        self.interrupted = False
+        self.finished = asyncio.Event()
+        self.connections = {}  # writer -> handler task
+    
+    def reclaim_expired(self):
+        """Put units whose lease ran out back in front of the queue."""
+        now = time.time()
+        for start, (count, worker, expiry) in list(self.leases.items()):
+            if expiry < now:
+                del self.leases[start]
+                self.pending.appendleft((start, count))
+                self.expired += 1
+                print(f"⚠️  Lease of unit {start:,} by {worker} expired; handing it out again")
+    
+    def lease(self, worker):
+        """Lease the next unit to `worker`."""
+        self.reclaim_expired()
+        if self.pending:
+            start, count = self.pending.popleft()
+        elif self.assigned < self.num_tests and self.next_start < self.permutation.size:
+            start = self.next_start
+            count = min(self.unit_size, self.num_tests - self.assigned,
+                        self.permutation.size - start)
+            self.next_start += count
+            self.assigned += count
+        elif self.leases:
+            return {'wait': WAIT_SECONDS}
+        else:
+            self.finished.set()  # Also when the range ran out before the target
+            return {'done': True}
+        
+        self.leases[start] = (count, worker, time.time() + self.lease_seconds)
+        return {'unit': {
+            'id': start,
+            'seed': self.seed.hex(),
+            'min_value': self.min_value,
+            'max_value': self.max_value,
+            'start': start,
+            'count': count
+        }}
+    
+    def record(self, start, stats_data):
+        """
+        Store a reported unit: mark its numbers tested, fold its summary into
+        the all-time stats and distribution, and advance the counter, all in
+        one commit.
+        """
+        if start in self.done or start < self.frontier:
+            return {'ok': False, 'error': 'unit already recorded'}
+        lease = self.leases.pop(start, None)
+        if lease is None:
+            # Expired but nobody else has reported it yet: the work still counts
+            for i, (pending_start, count) in enumerate(self.pending):
+                if pending_start == start:
+                    del self.pending[i]
+                    break
+            else:
+                return {'ok': False, 'error': 'unknown unit'}
+        else:
+            count = lease[0]
+        
+        stats = collatz.SessionStats.from_dict(stats_data)
+        if stats.count != count:
+            self.pending.appendleft((start, count))
+            return {'ok': False, 'error': f'expected {count} results, got {stats.count}'}
+        
+        numbers = [self.min_value + self.permutation[i] for i in range(start, start + count)]
+        collatz.mark_tested_batch(self.conn, numbers)
+        collatz.save_distribution_stats(self.conn, stats)
+        self.session.merge(stats)
+        
+        all_time_stats = self.all_time_stats
+        all_time_stats['total_steps'] += stats.total_steps
+        all_time_stats['total_numbers'] += stats.count
+        steps, num = stats.longest
+        if steps > all_time_stats['longest_sequence']:
+            all_time_stats['longest_sequence'] = steps
+            all_time_stats['longest_num'] = num
+        max_val, num = stats.highest
+        if max_val > all_time_stats['highest_peak']:
+            all_time_stats['highest_peak'] = max_val
+            all_time_stats['highest_peak_num'] = num
+        
+        self.done[start] = count
+        while self.frontier in self.done:
+            self.frontier += self.done.pop(self.frontier)
+        collatz.save_sampler_state(self.conn, self.min_value, self.max_value,
+                                   self.seed, self.frontier, STATE_PREFIX)
+        save_completed_units(self.conn, self.min_value, self.max_value, self.done)
+        collatz.save_all_time_stats(self.conn, all_time_stats)  # Commits
+        
+        self.completed += count
+        if self.exhausted():
+            self.finished.set()
+        return {'ok': True}
+    
+    def exhausted(self):
+        """True once every unit is recorded: the target is reached or the range ran out."""
+        return ((self.assigned >= self.num_tests or self.next_start >= self.permutation.size)
+                and not self.pending and not self.leases)
+    
+    def stop(self):
+        """Stop early (Ctrl-C); leased units are handed out again on the next run."""
+        self.interrupted = True
+        self.finished.set()
+    
+    def status(self):
+        """Counters for monitoring."""
+        elapsed = time.time() - self.start_time
+        return {
+            'completed': self.completed,
+            'target': self.num_tests,
+            'leased': len(self.leases),
+            'pending': len(self.pending),
+            'expired': self.expired,
+            'rate': self.completed / elapsed if elapsed > 0 else 0
+        }
+    
+    async def handle(self, reader, writer):
+        """Serve one worker connection, one JSON request per line."""
+        peer = writer.get_extra_info('peername')
+        self.connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    op = request.get('op')
+                    if op == 'lease':
+                        reply = self.lease(request.get('worker', str(peer)))
+                    elif op == 'result':
+                        reply = self.record(request['unit'], request['stats'])
+                    elif op == 'status':
+                        reply = self.status()
+                    else:
+                        reply = {'ok': False, 'error': f'unknown op {op!r}'}
+                except (ValueError, KeyError, TypeError) as e:
+                    reply = {'ok': False, 'error': f'bad request: {e}'}
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.pop(writer, None)
+            writer.close()
+    
+    async def report(self, interval=10):
+        """Print progress until the run is finished."""
+        while not self.finished.is_set():
+            try:
+                await asyncio.wait_for(self.finished.wait(), interval)
+            except asyncio.TimeoutError:
+                self.reclaim_expired()
+                status = self.status()
+                print(f"   Progress: {status['completed']:,}/{status['target']:,} | "
+                      f"{status['rate']:,.0f} numbers/sec | {status['leased']} leased | "
+                      f"{status['pending']} waiting")
+
+
+async def serve(coordinator, host=HOST, port=PORT):
+    """Run the coordinator until every unit of the target is recorded."""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, coordinator.stop)
+    server = await asyncio.start_server(coordinator.handle, host, port)
+    port = server.sockets[0].getsockname()[1]  # The one picked for port 0
+    print(f"📡 Coordinator listening on {host}:{port}", flush=True)
+    reporter = asyncio.ensure_future(coordinator.report())
+    async with server:
+        await coordinator.finished.wait()
+        await reporter
+        if not coordinator.interrupted:
+            # Give waiting workers a moment to receive their 'done' replies
+            await asyncio.sleep(2 * WAIT_SECONDS)
+        handlers = list(coordinator.connections.values())
+        for writer in list(coordinator.connections):
+            writer.close()
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+
+def run_worker(host=HOST, port=PORT, kernel='jump', name=None):
+    """
+    Lease units from the coordinator, compute them and report the summaries
+    until the coordinator has no more work.
+    Returns: number of numbers computed
+    """
+    name = name or f"{socket.gethostname()}-{os.getpid()}"
+    computed = 0
+    permutations = {}
+    if kernel == 'tail':
+        collatz.get_tail_table()
+    with socket.create_connection((host, port)) as sock:
+        stream = sock.makefile('rwb')
+        
+        def call(request):
+            stream.write(json.dumps(request).encode() + b'\n')
+            stream.flush()
+            line = stream.readline()
+            if not line:
+                raise ConnectionError("coordinator closed the connection")
+            return json.loads(line)
+        
+        while True:
+            reply = call({'op': 'lease', 'worker': name})
+            if reply.get('done'):
+                return computed
+            if 'wait' in reply:
+                time.sleep(reply['wait'])
+                continue
+            
+            unit = reply['unit']
+            key = (unit['seed'], unit['min_value'], unit['max_value'])
+            permutation = permutations.get(key)
+            if permutation is None:
+                permutation = permutations[key] = collatz.FeistelPermutation(
+                    unit['max_value'] - unit['min_value'] + 1, bytes.fromhex(unit['seed']))
+            _, stats = collatz.summarize_permutation_block(
+                permutation, unit['min_value'], unit['start'], unit['count'], kernel)
+            reply = call({'op': 'result', 'unit': unit['id'], 'stats': stats.to_dict()})
+            if not reply.get('ok'):
+                print(f"⚠️  {name}: unit {unit['id']:,} rejected: {reply.get('error')}")
+            computed += unit['count']
+
+
+def _worker_main(host, port, kernel, index):
+    """Entry point of one local worker process."""
+    try:
+        computed = run_worker(host, port, kernel, f"{socket.gethostname()}-{os.getpid()}")
+        print(f"   Worker {index}: computed {computed:,} numbers")
+    except (ConnectionError, OSError) as e:
+        print(f"⚠️  Worker {index}: {e}")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description='Distribute Collatz sessions across worker processes and machines'
+    )
+    parser.add_argument(
+        'mode',
+        choices=['serve', 'work'],
+        help='serve: lease work units and own the database; work: compute units'
+    )
+    parser.add_argument(
+        '--host',
+        default=HOST,
+        help=f'Address to listen on or connect to (default: {HOST})'
+    )
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=PORT,
+        help=f'TCP port (default: {PORT})'
+    )
+    parser.add_argument(
+        '--db',
+        default=collatz.DB_FILE,
+        help=f'serve: database to record results in (default: {collatz.DB_FILE})'
+    )
+    parser.add_argument(
+        '--tests',
+        type=int,
+        default=1_000_000,
+        help='serve: numbers to test in this run (default: 1000000)'
+    )
+    parser.add_argument(
+        '--unit-size',
+        type=int,
+        default=UNIT_SIZE,
+        help=f'serve: numbers per work unit (default: {UNIT_SIZE})'
+    )
+    parser.add_argument(
+        '--lease-seconds',
+        type=float,
+        default=LEASE_SECONDS,
+        help=f'serve: time a worker has to report a unit before it is handed out '
+             f'again (default: {LEASE_SECONDS})'
+    )
+    parser.add_argument(
+        '--processes',
+        type=int,
+        default=1,
+        help='work: worker processes to run on this machine (default: 1)'
+    )
+    parser.add_argument(
+        '--kernel',
+        choices=['auto'] + sorted(collatz.KERNELS) + sorted(collatz.BATCH_KERNELS),
+        default='auto',
+        help='work: trajectory kernel; auto picks the fastest on this machine (default: auto)'
+    )
+    
+    args = parser.parse_args()
+    
+    if args.mode == 'work':
+        if args.kernel in collatz.BATCH_KERNELS and collatz.np is None:
+            parser.error(f"--kernel {args.kernel} requires numpy (pip install numpy)")
+        if args.kernel == 'auto':
+            args.kernel, _ = collatz.calibrate_kernels(MIN_VALUE, MAX_VALUE)
+            print(f"   Kernel: {args.kernel}")
+        processes = [multiprocessing.Process(target=_worker_main,
+                                             args=(args.host, args.port, args.kernel, i))
+                     for i in range(args.processes)]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.join()
+        raise SystemExit(0)
+    
+    conn = collatz.init_db(args.db)
+    initial_count = collatz.get_tested_count(conn)
+    coordinator = Coordinator(conn, args.tests, unit_size=args.unit_size,
+                              lease_seconds=args.lease_seconds)
+    print(f"✓ Database contains {initial_count:,} previously tested numbers")
+    if coordinator.pending:
+        print(f"↩️  {coordinator.assigned:,} numbers from units that were leased but never "
+              f"reported last time will be handed out first")
+    print(f"🎯 Testing {args.tests:,} numbers in units of {args.unit_size:,}")
+    
+    asyncio.run(serve(coordinator, args.host, args.port))
+    status = 'interrupted' if coordinator.interrupted else 'complete'
+    if coordinator.interrupted:
+        print("\n⏸️  Stopped; leased units will be handed out again on the next run")
+    
+    elapsed = time.time() - coordinator.start_time
+    final_count = collatz.get_tested_count(conn)
+    collatz.save_session_record(conn, {
+        'started': coordinator.started,
+        'finished': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'status': status,
+        'tested': coordinator.completed,
+        'duplicates': 0,
+        'attempts': coordinator.completed,
+        'elapsed': elapsed,
+        'db_rows': final_count,
+        'db_size_bytes': collatz.get_db_size(conn),
+        'phases': {}
+    })
+    conn.commit()
+    if coordinator.completed:
+        all_time_stats = coordinator.all_time_stats
+        collatz.append_to_results_log({
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'tested_this_session': coordinator.completed,
+            'total_unique': final_count,
+            'longest_sequence': all_time_stats['longest_sequence'],
+            'longest_num': all_time_stats['longest_num'],
+            'highest_peak': all_time_stats['highest_peak'],
+            'highest_peak_num': all_time_stats['highest_peak_num'],
+            'average_steps': coordinator.session.total_steps / coordinator.session.count
+        })
+    conn.close()
+    
+    print(f"\n✓ Recorded {coordinator.completed:,} numbers in {elapsed:.1f} seconds "
+          f"({coordinator.completed / elapsed if elapsed else 0:,.0f} numbers/sec); "
+          f"database now holds {final_count:,}")
+    if status == 'interrupted':
+        raise SystemExit(130)
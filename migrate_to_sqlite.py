@@ -2,32 +2,257 @@
 """
 Migration script to convert legacy JSON storage to efficient SQLite database.
 This script reads the old collatz_tested_numbers.json file and imports all 
-tested numbers into the new SQLite database using compact SHA-256 hashes.
+tested numbers into the new SQLite database using compact fixed-width keys.
+It can also convert an existing SHA-256 keyed database to int128 keys.
 """
 
 import json
 import os
+import re
 import sys
 import sqlite3
 import hashlib
+import multiprocessing
+import signal
+from collections import deque
 from datetime import datetime
 
 
+# Key formats for the `tested` table (must match 3x1.py)
+KEY_FORMAT_SHA256 = 'sha256'
+KEY_FORMAT_INT128 = 'int128'
+KEY_WIDTH = 16
+BLOOM_SUFFIX = '.bloom'
+
+# Streaming import of the legacy JSON file
+NUMBERS_ARRAY = re.compile(rb'"tested_numbers"\s*:\s*\[')
+READ_BLOCK = 4 * 1024 * 1024  # Bytes of the numbers array per worker task
+LOAD_BATCH = 1_000_000  # Keys sorted and committed together
+
+
 def hash_number(n: int) -> bytes:
     """Generate a compact SHA-256 hash of a number for storage."""
     return hashlib.sha256(str(n).encode('utf-8')).digest()
 
 
+def number_key(n: int, key_format=KEY_FORMAT_INT128) -> bytes:
+    """Generate the `tested` table key for a number (see 3x1.py)."""
+    if key_format == KEY_FORMAT_INT128 and 0 <= n < 1 << (8 * KEY_WIDTH):
+        return n.to_bytes(KEY_WIDTH, 'big')
+    return hash_number(n)
+
+
+def get_key_format(conn):
+    """
+    Return the key format recorded in the database. Databases without a
+    marker that already hold rows predate it and use SHA-256 hashes.
+    """
+    row = conn.execute('SELECT value FROM stats WHERE key = ?', ('key_format',)).fetchone()
+    if row:
+        return row[0]
+    has_rows = conn.execute('SELECT 1 FROM tested LIMIT 1').fetchone() is not None
+    return KEY_FORMAT_SHA256 if has_rows else None
+
+
+def get_shard_count(conn):
+    """Number of shard files the keys are spread over (see 3x1.py --reshard); 1 if unsharded."""
+    try:
+        row = conn.execute('SELECT value FROM stats WHERE key = ?', ('shards',)).fetchone()
+    except sqlite3.OperationalError:
+        return 1  # No stats table yet
+    return json.loads(row[0]) if row else 1
+
+
+def refuse_sharded(conn, db_path):
+    """Exit if the database keeps its keys in shard files, which this script does not write."""
+    shards = get_shard_count(conn)
+    if shards > 1:
+        print(f"   ❌ {db_path} is split into {shards} shard files")
+        print(f"      Gather it first with: python3 3x1.py --db {db_path} --reshard 1")
+        conn.close()
+        sys.exit(1)
+
+
+def find_numbers_array(json_path):
+    """
+    Locate the `tested_numbers` array in the legacy JSON file without
+    parsing it, reading one block at a time.
+    Returns: (offset just inside the '[', offset of the closing ']'), or None
+    """
+    with open(json_path, 'rb') as f:
+        head = b''
+        while True:
+            block = f.read(READ_BLOCK)
+            head += block
+            match = NUMBERS_ARRAY.search(head)
+            if match:
+                start = match.end()
+                break
+            if not block:
+                return None
+        
+        # Numbers never contain ']', so the first one closes the array
+        f.seek(start)
+        pos = start
+        while True:
+            block = f.read(READ_BLOCK)
+            if not block:
+                return None
+            i = block.find(b']')
+            if i >= 0:
+                return start, pos + i
+            pos += len(block)
+
+
+def load_legacy_stats(json_path, array):
+    """Load the all-time stats from the legacy JSON file, skipping the numbers array."""
+    start, end = array
+    with open(json_path, 'rb') as f:
+        prefix = f.read(start)
+        f.seek(end)
+        suffix = f.read()
+    return json.loads(prefix + suffix).get('all_time_stats', {})
+
+
+def iter_number_blocks(json_path, start, end, block_size=READ_BLOCK):
+    """
+    Read the numbers array between `start` and `end` in blocks, cut at the
+    last comma so every block holds whole numbers.
+    Yields: (comma-separated bytes, offset where the next block starts)
+    """
+    with open(json_path, 'rb') as f:
+        f.seek(start)
+        pos = start
+        pending = b''
+        while pos < end:
+            block = f.read(min(block_size, end - pos))
+            if not block:
+                break
+            pos += len(block)
+            data = pending + block
+            if pos < end:
+                cut = data.rfind(b',')
+                if cut < 0:
+                    pending = data
+                    continue
+                pending = data[cut + 1:]
+                yield data[:cut], pos - len(pending)
+            else:
+                yield data, end
+
+
+def parse_numbers(data):
+    """Parse a comma-separated run of JSON numbers (or numeric strings)."""
+    return [int(item.strip(b' \t\r\n"')) for item in data.split(b',') if item.strip()]
+
+
+def sorted_keys_for_block(data, key_format):
+    """Worker: the sorted `tested` keys of one block of numbers."""
+    keys = [number_key(n, key_format) for n in parse_numbers(data)]
+    keys.sort()
+    return keys
+
+
+def key_pairs_for_block(data):
+    """Worker: (SHA-256 hash, int128 key) for each number in one block."""
+    return [(hash_number(n), number_key(n)) for n in parse_numbers(data)]
+
+
+def _init_worker():
+    """Leave Ctrl-C to the parent, which stops the pool."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def map_number_blocks(json_path, start, end, func, args=(), workers=1):
+    """
+    Run func(block, *args) over the blocks of the numbers array, on a process
+    pool when workers > 1. At most two blocks per worker are in flight, so
+    memory stays bounded however large the file is, and results come back
+    in file order so the offsets can serve as a resume point.
+    Yields: (result, offset where the next block starts)
+    """
+    blocks = iter_number_blocks(json_path, start, end)
+    if workers <= 1:
+        for data, offset in blocks:
+            yield func(data, *args), offset
+        return
+    
+    pool = multiprocessing.Pool(processes=workers, initializer=_init_worker)
+    pending = deque()
+    try:
+        for data, offset in blocks:
+            pending.append((pool.apply_async(func, (data,) + tuple(args)), offset))
+            if len(pending) >= workers * 2:
+                result, next_offset = pending.popleft()
+                yield result.get(), next_offset
+        while pending:
+            result, next_offset = pending.popleft()
+            yield result.get(), next_offset
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def load_migration_cursor(conn, json_path):
+    """
+    Load the resume point of an interrupted migration of `json_path`, or
+    None if there is none or the file has changed since.
+    """
+    row = conn.execute('SELECT value FROM stats WHERE key = ?', ('migration_cursor',)).fetchone()
+    if not row:
+        return None
+    cursor = json.loads(row[0])
+    stat = os.stat(json_path)
+    if (cursor['json'], cursor['size'], cursor['mtime']) != (
+            os.path.abspath(json_path), stat.st_size, stat.st_mtime):
+        print("   ⚠️  Found an unfinished migration of a different or changed file; starting over")
+        return None
+    return cursor
+
+
+def save_migration_cursor(conn, cursor):
+    """Save (or with None, clear) the migration resume point; the caller commits."""
+    if cursor is None:
+        conn.execute('DELETE FROM stats WHERE key = ?', ('migration_cursor',))
+    else:
+        conn.execute(
+            'INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)',
+            ('migration_cursor', json.dumps(cursor))
+        )
+
+
+def create_backup(db_path):
+    """Copy the database to a timestamped backup file and return its path."""
+    import shutil
+    backup_path = f"{db_path}.backup.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    print(f"\n💾 Creating backup: {backup_path}")
+    shutil.copy2(db_path, backup_path)
+    print(f"   ✓ Backup created")
+    return backup_path
+
+
 def migrate_json_to_sqlite(json_path='collatz_tested_numbers.json', 
                            db_path='collatz_tested.db',
-                           backup=True):
+                           backup=True,
+                           key_format=None,
+                           workers=None):
     """
     Migrate from JSON to SQLite database.
     
+    The numbers array is streamed from the file in blocks and turned into
+    keys on a process pool, so memory stays bounded. Keys are loaded in
+    sorted batches with synchronous=OFF, and durability is switched back on
+    (and the WAL checkpointed) once the load is done. Each batch commits a
+    cursor with the file offset it reached, so an interrupted migration
+    picks up from there when run again.
+    
     Args:
         json_path: Path to the legacy JSON file
         db_path: Path to the new SQLite database
         backup: If True, create a backup of existing DB before migration
+        key_format: Key format for a new database (default: int128); an
+            existing database keeps the format it was created with
+        workers: Processes used to parse and hash numbers (default: all CPUs)
     """
     print("="*70)
     print("COLLATZ DATABASE MIGRATION: JSON → SQLite")
@@ -41,33 +266,27 @@ def migrate_json_to_sqlite(json_path='collatz_tested_numbers.json',
     
     print(f"\n📂 Reading JSON file: {json_path}")
     
-    # Load JSON data
+    # Find the numbers array without loading it
     try:
-        with open(json_path, 'r') as f:
-            data = json.load(f)
+        array = find_numbers_array(json_path)
+        if array is None:
+            raise ValueError("no tested_numbers array")
+        all_time_stats = load_legacy_stats(json_path, array)
         
-        numbers = data.get('tested_numbers', [])
-        all_time_stats = data.get('all_time_stats', {})
-        
-        print(f"   ✓ Found {len(numbers):,} tested numbers")
-        print(f"   ✓ Found all-time statistics")
+        start, end = array
+        print(f"   ✓ Found tested_numbers array ({(end - start) / 1024 / 1024:.1f} MB)")
+        if all_time_stats:
+            print(f"   ✓ Found all-time statistics")
         
     except Exception as e:
         print(f"   ❌ Error reading JSON: {e}")
         sys.exit(1)
     
-    # Backup existing database if requested
-    backup_path = None
-    if backup and os.path.exists(db_path):
-        backup_path = f"{db_path}.backup.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        print(f"\n💾 Creating backup: {backup_path}")
-        import shutil
-        shutil.copy2(db_path, backup_path)
-        print(f"   ✓ Backup created")
-    
     # Initialize SQLite database
     print(f"\n🗄️  Initializing SQLite database: {db_path}")
+    exists = os.path.exists(db_path)
     conn = sqlite3.connect(db_path, timeout=30)
+    refuse_sharded(conn, db_path)
     conn.execute('PRAGMA journal_mode=WAL;')
     conn.execute('PRAGMA synchronous=NORMAL;')
     conn.execute('PRAGMA cache_size=-64000;')  # 64MB cache
@@ -82,53 +301,112 @@ def migrate_json_to_sqlite(json_path='collatz_tested_numbers.json',
         value TEXT
     ) WITHOUT ROWID''')
     
+    existing_format = get_key_format(conn)
+    if existing_format and key_format and existing_format != key_format:
+        print(f"   ❌ Database uses {existing_format} keys, not {key_format}")
+        print("      Convert it first with --convert-keys")
+        conn.close()
+        sys.exit(1)
+    key_format = existing_format or key_format or KEY_FORMAT_INT128
+    conn.execute(
+        'INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)',
+        ('key_format', key_format)
+    )
+    
     conn.commit()
-    print("   ✓ Database initialized")
+    print(f"   ✓ Database initialized ({key_format} keys)")
+    
+    stat = os.stat(json_path)
+    cursor = load_migration_cursor(conn, json_path)
+    if cursor:
+        print(f"   ↩️  Resuming at {(cursor['offset'] - start) / (end - start):.1%} of the array "
+              f"({cursor['imported']:,} numbers already imported)")
+    else:
+        cursor = {
+            'json': os.path.abspath(json_path),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'offset': start,
+            'imported': 0,
+            'duplicates': 0
+        }
+    
+    # Backup existing database if requested (the first attempt already did
+    # when resuming)
+    backup_path = None
+    if backup and exists and cursor['offset'] == start:
+        backup_path = create_backup(db_path)
     
-    # Import numbers in batches
-    print(f"\n🔄 Importing {len(numbers):,} numbers...")
+    # Import numbers in sorted batches with relaxed durability
+    workers = workers or os.cpu_count() or 1
+    print(f"\n🔄 Importing numbers on {workers} worker process(es)...")
     print("   (This may take a few minutes for large datasets)")
+    conn.execute('PRAGMA synchronous=OFF;')
+    conn.execute('PRAGMA cache_size=-256000;')
     
-    batch_size = 10000
-    total_imported = 0
-    duplicates_skipped = 0
+    batch = []
+    next_report = 0.0
     
-    for i in range(0, len(numbers), batch_size):
-        batch = numbers[i:i + batch_size]
-        hashes = [(hash_number(n),) for n in batch]
-        
-        # Use INSERT OR IGNORE to skip duplicates
-        cursor = conn.executemany('INSERT OR IGNORE INTO tested (hash) VALUES (?)', hashes)
-        imported_in_batch = cursor.rowcount
-        total_imported += imported_in_batch
-        duplicates_skipped += (len(batch) - imported_in_batch)
-        
-        if (i + batch_size) % 100000 == 0 or (i + batch_size) >= len(numbers):
-            progress = min(100, ((i + batch_size) / len(numbers)) * 100)
-            print(f"   Progress: {progress:5.1f}% | {total_imported:,} imported | "
-                  f"{duplicates_skipped:,} duplicates skipped")
-        
-        # Commit periodically
-        if (i + batch_size) % 50000 == 0:
-            conn.commit()
+    # 3x1.py keeps the row count in `stats`; drop it until the load is done
+    conn.execute('DELETE FROM stats WHERE key = ?', ('tested_count',))
     
-    conn.commit()
+    def load_batch(offset):
+        """Insert the buffered keys in key order and commit the cursor with them."""
+        batch.sort()
+        rows = conn.executemany('INSERT OR IGNORE INTO tested (hash) VALUES (?)',
+                                ((key,) for key in batch)).rowcount
+        cursor['imported'] += rows
+        cursor['duplicates'] += len(batch) - rows
+        cursor['offset'] = offset
+        save_migration_cursor(conn, cursor)
+        conn.commit()
+        batch.clear()
+    
+    try:
+        offset = cursor['offset']
+        for keys, offset in map_number_blocks(json_path, offset, end, sorted_keys_for_block,
+                                              (key_format,), workers):
+            batch.extend(keys)
+            if len(batch) >= LOAD_BATCH:
+                load_batch(offset)
+                progress = (offset - start) / (end - start) * 100
+                if progress >= next_report:
+                    next_report = progress + 5
+                    print(f"   Progress: {progress:5.1f}% | {cursor['imported']:,} imported | "
+                          f"{cursor['duplicates']:,} duplicates skipped")
+        load_batch(offset)
+    except KeyboardInterrupt:
+        conn.close()
+        print(f"\n⏸️  Interrupted after {cursor['imported']:,} numbers. "
+              f"Run the migration again to resume.")
+        sys.exit(130)
+    
+    # Switch durability back on and fold the WAL into the database
+    conn.execute('PRAGMA synchronous=NORMAL;')
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE);')
+    total_imported = cursor['imported']
+    duplicates_skipped = cursor['duplicates']
     print(f"   ✓ Imported {total_imported:,} unique numbers")
     
-    # Import statistics
+    # Import statistics and close out the migration
     if all_time_stats:
         print(f"\n📊 Importing all-time statistics...")
         conn.execute(
             'INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)',
             ('all_time_stats', json.dumps(all_time_stats))
         )
-        conn.commit()
+    db_count = conn.execute('SELECT COUNT(*) FROM tested').fetchone()[0]
+    conn.execute(
+        'INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)',
+        ('tested_count', json.dumps(db_count))
+    )
+    save_migration_cursor(conn, None)
+    conn.commit()
+    if all_time_stats:
         print("   ✓ Statistics imported")
     
     # Verify database
     print(f"\n✅ Verifying database...")
-    cursor = conn.execute('SELECT COUNT(*) FROM tested')
-    db_count = cursor.fetchone()[0]
     print(f"   Database contains: {db_count:,} tested numbers")
     
     conn.close()
@@ -156,6 +434,132 @@ def migrate_json_to_sqlite(json_path='collatz_tested_numbers.json',
     print()
 
 
+def convert_keys_to_int128(db_path='collatz_tested.db',
+                           json_path='collatz_tested_numbers.json',
+                           backup=True,
+                           allow_unmatched=False,
+                           workers=None):
+    """
+    Convert a SHA-256 keyed database to int128 keys.
+    
+    SHA-256 rows cannot be turned back into numbers, so the numbers come from
+    the legacy JSON file: each one is hashed and matched against `tested`.
+    If some rows have no matching number the conversion stops and leaves the
+    database alone, unless allow_unmatched is set, in which case those rows
+    are dropped: lookups only probe int128 keys, so a row left as a 32-byte
+    key would never be found yet would still count in tested_count. Those
+    numbers may then be tested again; the backup keeps the old rows.
+    
+    Args:
+        db_path: Path to the SQLite database to convert in place
+        json_path: Path to the legacy JSON file holding the original numbers
+        backup: If True, create a backup of the DB before converting
+        allow_unmatched: Drop rows that no JSON number maps to instead of stopping
+        workers: Processes used to parse and hash numbers (default: all CPUs)
+    """
+    print("="*70)
+    print("COLLATZ DATABASE KEY CONVERSION: sha256 → int128")
+    print("="*70)
+    
+    if not os.path.exists(db_path):
+        print(f"\n⚠️  Database not found: {db_path}")
+        return
+    
+    conn = sqlite3.connect(db_path, timeout=30)
+    refuse_sharded(conn, db_path)
+    key_format = get_key_format(conn)
+    if key_format != KEY_FORMAT_SHA256:
+        print(f"\n✓ Database already uses {key_format or KEY_FORMAT_INT128} keys. Nothing to do.")
+        conn.close()
+        return
+    
+    if not os.path.exists(json_path):
+        print(f"\n❌ JSON file not found: {json_path}")
+        print("   The original numbers are needed to rebuild int128 keys.")
+        conn.close()
+        sys.exit(1)
+    
+    print(f"\n📂 Reading JSON file: {json_path}")
+    array = find_numbers_array(json_path)
+    if array is None:
+        print("   ❌ No tested_numbers array in the JSON file")
+        conn.close()
+        sys.exit(1)
+    
+    # Map every known number's SHA-256 hash to its int128 key, streaming the
+    # numbers through the worker pool
+    print("\n🔄 Matching hashes to numbers...")
+    conn.execute('''CREATE TEMP TABLE key_map (
+        hash BLOB PRIMARY KEY,
+        key BLOB
+    ) WITHOUT ROWID''')
+    found = 0
+    for pairs, _ in map_number_blocks(json_path, *array, key_pairs_for_block,
+                                      workers=workers or os.cpu_count() or 1):
+        conn.executemany('INSERT OR IGNORE INTO key_map (hash, key) VALUES (?, ?)', pairs)
+        found += len(pairs)
+    print(f"   ✓ Found {found:,} tested numbers")
+    
+    total_rows = conn.execute('SELECT COUNT(*) FROM tested').fetchone()[0]
+    matched = conn.execute(
+        'SELECT COUNT(*) FROM tested JOIN key_map USING (hash)'
+    ).fetchone()[0]
+    unmatched = total_rows - matched
+    print(f"   Rows in database: {total_rows:,}")
+    print(f"   Rows matched to a number: {matched:,}")
+    print(f"   Rows with no known number: {unmatched:,}")
+    
+    if unmatched and not allow_unmatched:
+        print("\n❌ Some rows cannot be converted, so the database was left unchanged.")
+        print("   Hashes are one-way; only numbers present in the JSON file can be")
+        print("   re-keyed. Re-run with --allow-unmatched to drop those rows")
+        print("   (those numbers may then be tested again).")
+        conn.close()
+        sys.exit(1)
+    
+    backup_path = create_backup(db_path) if backup else None
+    
+    print("\n🗄️  Rebuilding tested table with int128 keys...")
+    conn.execute('''CREATE TABLE tested_int128 (
+        hash BLOB PRIMARY KEY
+    ) WITHOUT ROWID''')
+    conn.execute(
+        'INSERT INTO tested_int128 (hash) '
+        'SELECT key_map.key FROM tested JOIN key_map USING (hash) ORDER BY key_map.key'
+    )
+    if unmatched:
+        print(f"   ⚠️  Dropping {unmatched:,} rows with no known number "
+              f"(kept in the backup: {backup_path or 'none'})")
+    conn.execute('DROP TABLE tested')
+    conn.execute('ALTER TABLE tested_int128 RENAME TO tested')
+    conn.execute(
+        'INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)',
+        ('key_format', KEY_FORMAT_INT128)
+    )
+    conn.execute(
+        'INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)',
+        ('tested_count', json.dumps(conn.execute('SELECT COUNT(*) FROM tested').fetchone()[0]))
+    )
+    conn.commit()
+    conn.execute('VACUUM')
+    conn.close()
+    
+    # The Bloom filter sidecar holds the old keys and must be rebuilt
+    if os.path.exists(db_path + BLOOM_SUFFIX):
+        os.remove(db_path + BLOOM_SUFFIX)
+        print(f"   ✓ Removed stale Bloom filter: {db_path + BLOOM_SUFFIX}")
+    
+    print(f"\n{'='*70}")
+    print("✓ CONVERSION COMPLETE!")
+    print(f"{'='*70}")
+    print(f"\n📈 Summary:")
+    print(f"   Rows converted to int128 keys: {matched:,}")
+    print(f"   Rows dropped (no known number): {unmatched:,}")
+    print(f"   Database size: {os.path.getsize(db_path) / 1024 / 1024:.2f} MB")
+    print(f"   Backup: {backup_path or 'N/A'}")
+    print()
+
+
 if __name__ == "__main__":
     import argparse
     
@@ -177,11 +581,46 @@ if __name__ == "__main__":
         action='store_true',
         help='Skip creating backup of existing database'
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Processes used to parse and hash numbers (default: all CPUs)'
+    )
+    parser.add_argument(
+        '--key-format',
+        choices=[KEY_FORMAT_INT128, KEY_FORMAT_SHA256],
+        default=None,
+        help='Key format for a new database (default: int128)'
+    )
+    parser.add_argument(
+        '--convert-keys',
+        action='store_true',
+        help='Convert an existing SHA-256 keyed database to int128 keys '
+             'using the numbers in the JSON file'
+    )
+    parser.add_argument(
+        '--allow-unmatched',
+        action='store_true',
+        help='With --convert-keys, drop rows that no JSON number maps to '
+             'instead of stopping'
+    )
     
     args = parser.parse_args()
     
-    migrate_json_to_sqlite(
-        json_path=args.json,
-        db_path=args.db,
-        backup=not args.no_backup
-    )
+    if args.convert_keys:
+        convert_keys_to_int128(
+            db_path=args.db,
+            json_path=args.json,
+            backup=not args.no_backup,
+            allow_unmatched=args.allow_unmatched,
+            workers=args.workers
+        )
+    else:
+        migrate_json_to_sqlite(
+            json_path=args.json,
+            db_path=args.db,
+            backup=not args.no_backup,
+            key_format=args.key_format,
+            workers=args.workers
+        )
@@ -0,0 +1,53 @@
+"""
+Shared fixtures. The scripts are not a package (3x1.py is not even a valid
+module name), so they are loaded from their paths, and every test runs in
+its own temporary directory because the scripts write next to their
+working directory.
+"""
+
+import importlib.util
+import os
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_script(name, filename):
+    """Import one of the repository's scripts under `name`."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='session')
+def collatz():
+    return load_script('collatz', '3x1.py')
+
+
+@pytest.fixture(scope='session')
+def migrate():
+    return load_script('migrate_to_sqlite', 'migrate_to_sqlite.py')
+
+
+@pytest.fixture(scope='session')
+def coordinator(collatz):
+    return load_script('coordinator', 'coordinator.py')
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def db(collatz, workdir):
+    """A fresh int128-keyed database, closed after the test."""
+    conn = collatz.init_db(str(workdir / 'test.db'))
+    yield conn
+    conn.close()
@@ -0,0 +1,85 @@
+"""The Bloom filter sidecar in front of the `tested` table."""
+
+import random
+
+import pytest
+
+
+def draw(seed, count):
+    """Numbers of mixed widths; some too wide for int128 keys, so they use SHA-256 keys."""
+    rng = random.Random(seed)
+    return [rng.randrange(1, 1 << rng.choice([20, 64, 127, 200])) for _ in range(count)]
+
+
+@pytest.mark.parametrize('shards', [None, 3])
+def test_no_false_negatives_after_mark_tested_batch(collatz, db, shards):
+    if shards:
+        db.close()
+        collatz.reshard_database(db.db_path, shards)
+        db = collatz.init_db(db.db_path)
+    collatz.attach_bloom_filter(db)
+    numbers = draw(1, 3000)
+    for start in range(0, len(numbers), 500):
+        batch = numbers[start:start + 500]
+        collatz.mark_tested_batch(db, batch + batch[:50])  # With repeats
+        db.commit()
+    
+    assert db.bloom.items == collatz.get_tested_count(db) == len(set(numbers))
+    assert all(db.bloom.might_contain(collatz.number_key(n, db.key_format)) for n in numbers)
+    assert all(collatz.has_been_tested(db, n) for n in numbers)
+    assert collatz.find_tested(db, numbers) == set(numbers)
+    absent = set(draw(2, 3000)) - set(numbers)
+    assert not any(collatz.has_been_tested(db, n) for n in absent)
+    # Most absent numbers are answered by the filter alone
+    misses = sum(not db.bloom.might_contain(collatz.number_key(n, db.key_format))
+                 for n in absent)
+    assert misses > 0.9 * len(absent)
+
+
+def test_sidecar_persists_across_close_and_init_db(collatz, db, capsys):
+    collatz.attach_bloom_filter(db)
+    numbers = draw(3, 2000)
+    collatz.mark_tested_batch(db, numbers)
+    db.commit()
+    db.close()
+    capsys.readouterr()
+    
+    conn = collatz.init_db(db.db_path)
+    bloom = collatz.attach_bloom_filter(conn)
+    assert 'Rebuilding' not in capsys.readouterr().out
+    assert bloom.items == collatz.get_tested_count(conn) == len(set(numbers))
+    assert all(collatz.has_been_tested(conn, n) for n in numbers)
+    conn.close()
+
+
+def test_rebuilt_when_its_row_count_differs(collatz, db, capsys):
+    collatz.attach_bloom_filter(db)
+    collatz.mark_tested_batch(db, draw(4, 1000))
+    db.commit()
+    db.close()
+    
+    # Keys added while no filter was attached
+    conn = collatz.init_db(db.db_path)
+    later = draw(5, 500)
+    collatz.mark_tested_batch(conn, later)
+    conn.commit()
+    conn.close()
+    capsys.readouterr()
+    
+    conn = collatz.init_db(db.db_path)
+    bloom = collatz.attach_bloom_filter(conn)
+    out = capsys.readouterr().out
+    assert 'Bloom filter is stale' in out and 'Rebuilding' in out
+    assert bloom.items == collatz.get_tested_count(conn)
+    assert all(bloom.might_contain(collatz.number_key(n, conn.key_format)) for n in later)
+    conn.close()
+    
+    # A header that claims more rows than the database has
+    bloom = collatz.BloomFilter.open(db.db_path + collatz.BLOOM_SUFFIX)
+    bloom.items += 1
+    bloom.close()
+    conn = collatz.init_db(db.db_path)
+    bloom = collatz.attach_bloom_filter(conn)
+    assert 'Bloom filter is stale' in capsys.readouterr().out
+    assert bloom.items == collatz.get_tested_count(conn)
+    conn.close()
@@ -0,0 +1,67 @@
+"""CompactKeySet against a built-in set, through resizes, collisions and the overflow set."""
+
+import random
+
+import pytest
+
+
+INT128 = 1 << 128
+SHA256 = 1 << 256
+
+
+def batches(seed):
+    """
+    Blocks of numbers that mix fresh ones with repeats: numbers below 2^128
+    (the width of an int128 key, stored in the table), ones sharing their
+    low or high 64-bit half, including a zero half (an all-zero slot is
+    empty), runs of consecutive numbers, and numbers as wide as a SHA-256
+    key, which with 0 go to the overflow set.
+    """
+    rng = random.Random(seed)
+    seen = []
+    for size in [1, 5, 31, 32, 33, 500, 3000, 7, 6000, 64, 9000]:
+        block = []
+        while len(block) < size:
+            kind = rng.randrange(7)
+            if kind == 0 and seen:
+                block.append(rng.choice(seen))
+            elif kind == 1:
+                block.append((rng.randrange(1, 64) << 64) | rng.choice([0, 0x1234]))
+            elif kind == 2:
+                block.append((rng.choice([0, 0xABCD]) << 64) | rng.randrange(1, 1 << 64))
+            elif kind == 3:
+                start = rng.randrange(1, INT128 - 50)
+                block.extend(range(start, start + rng.randrange(1, 50)))
+            elif kind == 4:
+                block.append(rng.choice([0, INT128 - 1, INT128, rng.randrange(INT128, SHA256)]))
+            else:
+                block.append(rng.randrange(1, INT128))
+        if block and rng.random() < 0.5:
+            block.append(block[0])  # A repeat within the block
+        seen.extend(rng.sample(block, min(len(block), 50)))
+        yield block
+
+
+@pytest.mark.parametrize('vectorized', [True, False])
+def test_matches_a_set(collatz, monkeypatch, vectorized):
+    if not vectorized:
+        monkeypatch.setattr(collatz, 'np', None)
+    elif collatz.np is None:
+        pytest.skip('numpy is not installed')
+    keys = collatz.CompactKeySet()
+    reference = set()
+    capacities = {keys.capacity}
+    for block in batches(seed=5):
+        expected = [n for n in dict.fromkeys(block) if n not in reference]
+        assert keys.add_batch(block) == expected
+        reference.update(block)
+        assert len(keys) == len(reference)
+        capacities.add(keys.capacity)
+    assert len(capacities) >= 4  # Grew several times along the way
+    assert keys.count <= keys.MAX_LOAD * keys.capacity
+    
+    probe = list(reference) + [n + 1 for n in reference] + [0, SHA256 - 1, 2 * SHA256]
+    assert keys.find_batch(probe) == reference & set(probe)
+    wide = [n for n in reference if n >= INT128]
+    assert wide and all(n in keys for n in wide)
+    assert keys.add_batch(list(reference)) == []
@@ -0,0 +1,104 @@
+"""The work-unit coordinator: leases, results and a run with local worker processes."""
+
+import json
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+
+from conftest import ROOT
+
+
+COORDINATOR = os.path.join(ROOT, 'coordinator.py')
+
+
+def run_units(coordinator, collatz):
+    """Lease and record units in this process until the coordinator is finished."""
+    while not coordinator.finished.is_set():
+        reply = coordinator.lease('test')
+        unit = reply['unit']
+        permutation = collatz.FeistelPermutation(unit['max_value'] - unit['min_value'] + 1,
+                                                 bytes.fromhex(unit['seed']))
+        _, stats = collatz.summarize_permutation_block(permutation, unit['min_value'],
+                                                       unit['start'], unit['count'])
+        assert coordinator.record(unit['id'], stats.to_dict()) == {'ok': True}
+
+
+def test_finishes_when_the_range_runs_out(coordinator, collatz, db):
+    work = coordinator.Coordinator(db, 100, min_value=1, max_value=20, unit_size=8)
+    run_units(work, collatz)
+    assert collatz.get_tested_count(db) == 20
+    assert collatz.load_all_time_stats(db)['total_numbers'] == 20
+    assert work.lease('test') == {'done': True}
+
+
+def test_state_is_apart_from_local_permutation_sessions(coordinator, collatz, db):
+    collatz.test_random_large_numbers(num_tests=20, min_value=1, max_value=1000, conn=db,
+                                      sampler='permutation')
+    local = collatz.load_sampler_state(db, 1, 1000)
+    
+    work = coordinator.Coordinator(db, 30, min_value=1, max_value=1000, unit_size=10)
+    assert work.frontier == 0 and work.seed != local[0]
+    run_units(work, collatz)
+    assert collatz.load_sampler_state(db, 1, 1000) == local
+    assert collatz.load_sampler_state(db, 1, 1000, coordinator.STATE_PREFIX) == (work.seed, 30)
+    
+    # A restarted coordinator continues from its own counter
+    again = coordinator.Coordinator(db, 10, min_value=1, max_value=1000, unit_size=10)
+    assert (again.seed, again.frontier) == (work.seed, 30)
+
+
+def test_local_workers_with_a_killed_worker(collatz, workdir):
+    tests = 120
+    server = subprocess.Popen(
+        [sys.executable, COORDINATOR, 'serve', '--db', 'test.db', '--port', '0',
+         '--tests', str(tests), '--unit-size', '10', '--lease-seconds', '1'],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    workers = None
+    try:
+        output = []
+        for line in server.stdout:
+            output.append(line)
+            match = re.search(r'listening on [^:]+:(\d+)', line)
+            if match:
+                port = int(match.group(1))
+                break
+        else:
+            raise AssertionError(''.join(output))
+        
+        # A worker that takes a unit and dies before reporting it
+        killed = subprocess.run([sys.executable, '-c', f'''
+import json, os, signal, socket
+sock = socket.create_connection(('127.0.0.1', {port}))
+sock.sendall(json.dumps({{"op": "lease", "worker": "doomed"}}).encode() + b"\\n")
+assert b'"unit"' in sock.makefile("rb").readline()
+os.kill(os.getpid(), signal.SIGKILL)
+'''])
+        assert killed.returncode == -signal.SIGKILL
+        
+        workers = subprocess.Popen(
+            [sys.executable, COORDINATOR, 'work', '--port', str(port), '--processes', '3',
+             '--kernel', 'jump'],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        assert workers.wait(timeout=120) == 0
+        output.extend(server.stdout)
+        assert server.wait(timeout=60) == 0, ''.join(output)
+    finally:
+        for process in (server, workers):
+            if process is not None and process.poll() is None:
+                process.kill()
+    
+    assert 'by doomed expired' in ''.join(output)
+    
+    conn = collatz.init_db('test.db')
+    numbers = [int.from_bytes(key, 'big') for key in collatz.iter_sorted_keys(conn)]
+    assert len(numbers) == collatz.get_tested_count(conn) == tests
+    all_time = collatz.load_all_time_stats(conn)
+    assert all_time['total_numbers'] == collatz.load_distribution_stats(conn).count == tests
+    assert all_time['total_steps'] == sum(collatz.collatz_steps(n)[0] for n in numbers)
+    assert all_time['longest_sequence'] == max(collatz.collatz_steps(n)[0] for n in numbers)
+    status, tested = conn.execute('SELECT status, tested FROM sessions').fetchone()
+    assert (status, tested) == ('complete', tests)
+    conn.close()
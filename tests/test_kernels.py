@@ -0,0 +1,60 @@
+"""Differential checks of the trajectory kernels against the reference."""
+
+import pytest
+
+
+MIN_VALUE = 10_000_000_000
+MAX_VALUE = 10 ** 30
+
+
+def test_reference_known_values(collatz):
+    assert collatz.collatz_steps(1) == (0, 1)
+    assert collatz.collatz_steps(27) == (111, 9232)
+    assert collatz.collatz_steps(837799) == (524, 2974984576)
+
+
+def test_available_kernels_match_reference(collatz):
+    numbers = collatz.kernel_check_numbers(MIN_VALUE, MAX_VALUE, count=200, seed=1)
+    mismatches = collatz.check_kernels(numbers)
+    assert mismatches  # Something besides the reference was checked
+    assert mismatches == {name: [] for name in mismatches}
+
+
+def test_tail_kernel_matches_reference(collatz):
+    collatz.get_tail_table(12)
+    try:
+        numbers = collatz.kernel_check_numbers(1, 1 << 20, count=500, seed=2)
+        assert collatz.check_kernels(numbers, ['tail']) == {'tail': []}
+    finally:
+        collatz._tail_tables.pop(collatz.TAIL_TABLE_FILE).close()
+
+
+@pytest.mark.parametrize('max_steps', [0, 1, 5, 333])
+def test_kernels_agree_when_max_steps_cuts_trajectories(collatz, monkeypatch, max_steps):
+    monkeypatch.setattr(collatz, 'MAX_STEPS', max_steps)
+    numbers = collatz.kernel_check_numbers(MIN_VALUE, MAX_VALUE, count=50, seed=3)
+    mismatches = collatz.check_kernels(numbers)
+    assert mismatches == {name: [] for name in mismatches}
+
+
+def test_check_kernels_reports_a_wrong_kernel(collatz, monkeypatch):
+    monkeypatch.setitem(collatz.KERNELS, 'broken', lambda n: (0, n))
+    mismatches = collatz.check_kernels([27, 97], ['broken'])
+    assert mismatches == {'broken': [(27, (111, 9232), (0, 27)), (97, (118, 9232), (0, 97))]}
+
+
+def test_calibration_is_saved_per_key(collatz, db):
+    kernel, timings = collatz.calibrate_kernels(MIN_VALUE, MAX_VALUE, sample_size=20,
+                                                kernels=['reference', 'jump'])
+    assert kernel in ('reference', 'jump') and set(timings) == {'reference', 'jump'}
+    
+    key = collatz.kernel_calibration_key(MIN_VALUE, MAX_VALUE, ['reference', 'jump'])
+    assert collatz.load_kernel_calibration(db, key) is None
+    collatz.save_kernel_calibration(db, key, kernel, timings)
+    db.commit()
+    assert collatz.load_kernel_calibration(db, key) == (kernel, timings)
+    
+    # Another range or set of kernels needs its own calibration
+    for other in (collatz.kernel_calibration_key(1, MAX_VALUE, ['reference', 'jump']),
+                  collatz.kernel_calibration_key(MIN_VALUE, MAX_VALUE, ['reference'])):
+        assert collatz.load_kernel_calibration(db, other) is None
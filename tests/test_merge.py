@@ -0,0 +1,99 @@
+"""Merging tested databases with merge_databases."""
+
+import random
+
+import pytest
+
+
+def run_session(collatz, path, seed, num_tests=300):
+    """Test `num_tests` numbers from a small range, so databases overlap."""
+    conn = collatz.init_db(path)
+    random.seed(seed)
+    collatz.test_random_large_numbers(num_tests=num_tests, min_value=1, max_value=2000,
+                                      conn=conn)
+    keys = set(collatz.iter_sorted_keys(conn))
+    distribution = collatz.load_distribution_stats(conn)
+    conn.close()
+    return keys, distribution
+
+
+@pytest.mark.parametrize('shards', [None, 3])
+def test_merge_round_trip(collatz, workdir, shards):
+    keys_a, dist_a = run_session(collatz, str(workdir / 'a.db'), seed=1)
+    if shards:
+        collatz.reshard_database(str(workdir / 'a.db'), shards)
+    keys_b, dist_b = run_session(collatz, str(workdir / 'b.db'), seed=2)
+    shared = keys_a & keys_b
+    assert shared  # The ranges are small enough to overlap
+    
+    out_path = str(workdir / 'merged.db')
+    report = collatz.merge_databases([str(workdir / 'a.db'), str(workdir / 'b.db')], out_path)
+    assert report['rows'] == len(keys_a | keys_b)
+    assert report['overlap_keys'] == len(shared)
+    assert report['extra_copies'] == len(shared)
+    
+    conn = collatz.init_db(out_path)
+    assert conn.key_format == collatz.KEY_FORMAT_INT128
+    merged = list(collatz.iter_sorted_keys(conn))
+    assert merged == sorted(keys_a | keys_b)
+    assert collatz.get_tested_count(conn) == len(merged)
+    
+    numbers = [int.from_bytes(key, 'big') for key in merged]
+    all_time = collatz.load_all_time_stats(conn)
+    assert all_time['total_numbers'] == len(numbers)
+    assert all_time['total_steps'] == sum(collatz.collatz_steps(n)[0] for n in numbers)
+    longest = max(collatz.collatz_steps(n)[0] for n in numbers)
+    assert all_time['longest_sequence'] == longest
+    
+    # The distribution counts each number once too
+    distribution = collatz.load_distribution_stats(conn)
+    assert distribution.count == len(numbers)
+    assert distribution.total_steps == all_time['total_steps']
+    assert distribution.longest[0] == longest
+    assert sum(sum(buckets.values()) for buckets in distribution.steps_histogram.values()) \
+        == len(numbers)
+    conn.close()
+
+
+def test_merge_leaves_read_only_inputs_unchanged(collatz, workdir):
+    run_session(collatz, str(workdir / 'a.db'), seed=1)
+    collatz.reshard_database(str(workdir / 'a.db'), 2)
+    run_session(collatz, str(workdir / 'b.db'), seed=2)
+    before = {}
+    for path in sorted(workdir.iterdir()):
+        path.chmod(0o444)
+        before[path.name] = (path.read_bytes(), path.stat().st_mtime_ns)
+    
+    report = collatz.merge_databases([str(workdir / 'a.db'), str(workdir / 'b.db')],
+                                     str(workdir / 'merged.db'))
+    assert report['rows'] > 0
+    for path in workdir.iterdir():
+        if path.name.startswith('merged.db'):
+            continue
+        assert before.pop(path.name) == (path.read_bytes(), path.stat().st_mtime_ns), path.name
+    assert not before
+
+
+def test_merge_refuses_an_existing_output(collatz, workdir):
+    run_session(collatz, str(workdir / 'a.db'), seed=1, num_tests=10)
+    run_session(collatz, str(workdir / 'b.db'), seed=2, num_tests=10)
+    with pytest.raises(ValueError):
+        collatz.merge_databases([str(workdir / 'a.db')], str(workdir / 'b.db'))
+    with pytest.raises(ValueError):
+        collatz.merge_databases([str(workdir / 'missing.db')], str(workdir / 'c.db'))
+
+
+def test_merge_unites_verified_ranges(collatz, workdir):
+    for name, ranges in (('a.db', [(1, 100), (301, 400)]), ('b.db', [(101, 250), (390, 500)])):
+        conn = collatz.init_db(str(workdir / name))
+        for low, high in ranges:
+            collatz.add_verified_range(conn, low, high)
+        conn.commit()
+        conn.close()
+    
+    out_path = str(workdir / 'merged.db')
+    collatz.merge_databases([str(workdir / 'a.db'), str(workdir / 'b.db')], out_path)
+    conn = collatz.init_db(out_path)
+    assert collatz.load_verified_ranges(conn) == [(1, 250), (301, 500)]
+    assert collatz.verified_prefix(conn) == 250
+    conn.close()
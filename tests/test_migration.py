@@ -0,0 +1,122 @@
+"""JSON migration and the sha256 -> int128 key conversion in migrate_to_sqlite.py."""
+
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+
+import pytest
+
+
+NUMBERS = list(range(10 ** 12, 10 ** 12 + 3000, 3)) + [10 ** 30 + 7, 27]
+
+
+def write_json(path, numbers):
+    with open(path, 'w') as f:
+        json.dump({'tested_numbers': numbers,
+                   'all_time_stats': {'longest_sequence': 111, 'longest_num': 27}}, f)
+
+
+def sha256_database(path, numbers, extra_hashes=()):
+    """A database as the SHA-256 era of 3x1.py left it."""
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE tested (hash BLOB PRIMARY KEY) WITHOUT ROWID')
+    conn.execute('CREATE TABLE stats (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID')
+    hashes = [hashlib.sha256(str(n).encode('utf-8')).digest() for n in numbers]
+    conn.executemany('INSERT INTO tested (hash) VALUES (?)',
+                     [(h,) for h in hashes + list(extra_hashes)])
+    conn.execute("INSERT INTO stats (key, value) VALUES ('key_format', 'sha256')")
+    conn.commit()
+    conn.close()
+
+
+@pytest.mark.parametrize('key_format', ['int128', 'sha256'])
+def test_migrate_imports_every_number(collatz, migrate, workdir, key_format):
+    write_json('numbers.json', NUMBERS + NUMBERS[:10])  # Repeats are skipped
+    migrate.migrate_json_to_sqlite('numbers.json', 'test.db', backup=False,
+                                   key_format=key_format, workers=1)
+    conn = collatz.init_db('test.db')
+    assert conn.key_format == key_format
+    assert collatz.get_tested_count(conn) == len(NUMBERS)
+    assert collatz.find_tested(conn, NUMBERS + [5, 10 ** 12 + 1]) == set(NUMBERS)
+    assert collatz.load_all_time_stats(conn)['longest_num'] == 27
+    conn.close()
+
+
+def test_migrate_resumes_after_an_interruption(collatz, migrate, workdir, monkeypatch):
+    write_json('numbers.json', NUMBERS)
+    monkeypatch.setattr(migrate, 'iter_number_blocks',
+                        functools.partial(migrate.iter_number_blocks, block_size=1024))
+    monkeypatch.setattr(migrate, 'LOAD_BATCH', 100)
+    
+    # Interrupt the third batch before it commits
+    save_cursor = migrate.save_migration_cursor
+    calls = []
+    
+    def interrupting(conn, cursor):
+        calls.append(cursor)
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        save_cursor(conn, cursor)
+    
+    monkeypatch.setattr(migrate, 'save_migration_cursor', interrupting)
+    with pytest.raises(SystemExit) as exit_info:
+        migrate.migrate_json_to_sqlite('numbers.json', 'test.db', backup=False, workers=1)
+    assert exit_info.value.code == 130
+    conn = sqlite3.connect('test.db')
+    partial = conn.execute('SELECT COUNT(*) FROM tested').fetchone()[0]
+    conn.close()
+    assert 0 < partial < len(NUMBERS)
+    
+    monkeypatch.setattr(migrate, 'save_migration_cursor', save_cursor)
+    migrate.migrate_json_to_sqlite('numbers.json', 'test.db', backup=False, workers=1)
+    conn = collatz.init_db('test.db')
+    assert collatz.get_tested_count(conn) == collatz.count_tested_rows(conn) == len(NUMBERS)
+    assert collatz.find_tested(conn, NUMBERS) == set(NUMBERS)
+    assert conn.execute("SELECT 1 FROM stats WHERE key = 'migration_cursor'").fetchone() is None
+    conn.close()
+
+
+def test_convert_keys_to_int128(collatz, migrate, workdir):
+    write_json('numbers.json', NUMBERS)
+    sha256_database('test.db', NUMBERS)
+    migrate.convert_keys_to_int128('test.db', 'numbers.json', backup=False, workers=1)
+    conn = collatz.init_db('test.db')
+    assert conn.key_format == collatz.KEY_FORMAT_INT128
+    assert collatz.get_tested_count(conn) == len(NUMBERS)
+    assert all(collatz.has_been_tested(conn, n) for n in NUMBERS)
+    assert conn.execute('SELECT COUNT(*) FROM tested WHERE length(hash) != 16').fetchone()[0] == 0
+    conn.close()
+
+
+def test_convert_keys_stops_on_unmatched_rows(migrate, workdir):
+    write_json('numbers.json', NUMBERS)
+    sha256_database('test.db', NUMBERS, [hashlib.sha256(b'5').digest()])
+    with open('test.db', 'rb') as f:
+        before = f.read()
+    with pytest.raises(SystemExit) as exit_info:
+        migrate.convert_keys_to_int128('test.db', 'numbers.json', backup=False, workers=1)
+    assert exit_info.value.code == 1
+    with open('test.db', 'rb') as f:
+        assert f.read() == before
+
+
+def test_convert_keys_drops_unmatched_rows_when_allowed(collatz, migrate, workdir):
+    write_json('numbers.json', NUMBERS)
+    unmatched = [hashlib.sha256(str(n).encode('utf-8')).digest() for n in (5, 6, 7)]
+    sha256_database('test.db', NUMBERS, unmatched)
+    migrate.convert_keys_to_int128('test.db', 'numbers.json', backup=True,
+                                   allow_unmatched=True, workers=1)
+    conn = collatz.init_db('test.db')
+    assert conn.key_format == collatz.KEY_FORMAT_INT128
+    assert collatz.get_tested_count(conn) == collatz.count_tested_rows(conn) == len(NUMBERS)
+    assert conn.execute('SELECT COUNT(*) FROM tested WHERE length(hash) != 16').fetchone()[0] == 0
+    conn.close()
+    
+    # The backup still holds the dropped rows
+    backups = [name for name in os.listdir(workdir) if name.startswith('test.db.backup')]
+    assert len(backups) == 1
+    backup = sqlite3.connect(backups[0])
+    assert backup.execute('SELECT COUNT(*) FROM tested').fetchone()[0] == len(NUMBERS) + 3
+    backup.close()
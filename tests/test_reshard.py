@@ -0,0 +1,47 @@
+"""Moving the `tested` keys between a single file and shard files with reshard_database."""
+
+import os
+import random
+
+
+def test_reshard_one_to_four_and_back(collatz, db):
+    rng = random.Random(7)
+    numbers = [rng.randrange(1, 1 << rng.choice([30, 100, 180])) for _ in range(4000)]
+    collatz.mark_tested_batch(db, numbers)
+    db.commit()
+    keys = set(collatz.iter_sorted_keys(db))
+    count = collatz.get_tested_count(db)
+    assert count == len(keys) == len(set(numbers))
+    path = db.db_path
+    db.close()
+    tested = set(numbers)
+    absent = [n + 1 for n in numbers if n + 1 not in tested][:500]
+    
+    assert collatz.reshard_database(path, 4) == count
+    assert collatz.reshard_database(path, 4) is None  # Already in that layout
+    conn = collatz.init_db(path)
+    assert len(conn.shards) == 4
+    assert conn.execute('SELECT COUNT(*) FROM tested').fetchone()[0] == 0
+    assert set(collatz.iter_sorted_keys(conn)) == keys
+    assert collatz.get_tested_count(conn) == count
+    by_shard = {}
+    for n in numbers:
+        by_shard.setdefault(collatz.shard_index(collatz.number_key(n, conn.key_format), 4),
+                            []).append(n)
+    assert sorted(by_shard) == [0, 1, 2, 3]
+    for index, shard_numbers in by_shard.items():
+        assert all(collatz.has_been_tested(conn, n) for n in shard_numbers), index
+        rows = conn.shards[index].execute('SELECT COUNT(*) FROM tested').fetchone()[0]
+        assert rows == len(set(shard_numbers))
+    assert not any(collatz.has_been_tested(conn, n) for n in absent)
+    conn.close()
+    
+    assert collatz.reshard_database(path, 1) == count
+    assert not [name for name in os.listdir(os.path.dirname(path)) if '.shard' in name]
+    conn = collatz.init_db(path)
+    assert conn.shards is None
+    assert set(collatz.iter_sorted_keys(conn)) == keys
+    assert collatz.get_tested_count(conn) == count
+    assert all(collatz.has_been_tested(conn, n) for n in numbers)
+    assert not any(collatz.has_been_tested(conn, n) for n in absent)
+    conn.close()
@@ -0,0 +1,88 @@
+"""Sessions that skip the per-number duplicate lookup and back out collisions on insert."""
+
+import random
+
+import pytest
+
+
+def stats_of(collatz, numbers):
+    stats = collatz.SessionStats()
+    for n in numbers:
+        stats.add(n, *collatz.collatz_steps(n))
+    return stats
+
+
+@pytest.mark.parametrize('shards', [None, 3])
+@pytest.mark.parametrize('kernel', ['reference', 'shift', 'jump'])
+def test_collisions_are_backed_out_everywhere(collatz, db, shards, kernel):
+    if shards:
+        db.close()
+        collatz.reshard_database(db.db_path, shards)
+        db = collatz.init_db(db.db_path)
+    store = collatz.open_results_store(db)
+    
+    # A small range, so most draws of the second session are already tested
+    random.seed(3)
+    collatz.test_random_large_numbers(num_tests=400, min_value=1, max_value=1000, conn=db,
+                                      results_store=store, kernel=kernel)
+    result = collatz.test_random_large_numbers(num_tests=300, min_value=1, max_value=1000,
+                                               conn=db, skip_dedup=True, results_store=store,
+                                               kernel=kernel, checkpoint_interval=0.0001)
+    assert result['session_tested'] == 300
+    assert result['duplicates_skipped'] > 0
+    
+    numbers = [int.from_bytes(key, 'big') for key in collatz.iter_sorted_keys(db)]
+    assert len(numbers) == collatz.get_tested_count(db) == 700
+    
+    truth = stats_of(collatz, numbers)
+    all_time = collatz.load_all_time_stats(db)
+    distribution = collatz.load_distribution_stats(db)
+    assert all_time['total_numbers'] == distribution.count == 700
+    assert all_time['total_steps'] == distribution.total_steps == truth.total_steps
+    assert distribution.steps_histogram == truth.steps_histogram
+    assert distribution.ratio_histogram == truth.ratio_histogram
+    assert distribution.steps_sketch.buckets == truth.steps_sketch.buckets
+    
+    # One results row per tested number, with that number's steps and peak
+    stored = store.query_steps(-1)
+    assert len(store) == 700
+    assert sorted(start for start, _, _ in stored) == numbers
+    assert all((steps, peak) == collatz.collatz_steps(start) for start, steps, peak in stored)
+    store.close()
+    db.close()
+
+
+def test_mark_tested_batch_reports_collisions(collatz, db):
+    assert collatz.mark_tested_batch(db, [10, 20, 30]) == 3
+    collisions = set()
+    assert collatz.mark_tested_batch(db, [20, 40, 30, 50], collisions) == 2
+    db.commit()
+    assert collisions == {20, 30}
+    assert collatz.get_tested_count(db) == collatz.count_tested_rows(db) == 5
+
+
+def test_session_stats_remove_undoes_add(collatz):
+    numbers = list(range(2, 400))
+    stats = stats_of(collatz, numbers)
+    for n in numbers[::2]:
+        stats.remove(n, *collatz.collatz_steps(n))
+    expected = stats_of(collatz, numbers[1::2])
+    assert stats.count == expected.count
+    assert stats.total_steps == expected.total_steps
+    assert stats.steps_histogram == expected.steps_histogram
+    assert stats.ratio_histogram == expected.ratio_histogram
+    assert stats.steps_sketch.buckets == expected.steps_sketch.buckets
+
+
+def test_quantile_sketch_remove(collatz):
+    sketch = collatz.QuantileSketch(max_buckets=2)
+    for value in (1.5, 10, 100, 1000):
+        sketch.add(value)
+    sketch.remove(1.5)  # Its bucket was collapsed into the lowest one
+    assert sketch.count == 3 and sum(sketch.buckets.values()) == 3
+    
+    empty = collatz.QuantileSketch()
+    empty.add(5)
+    empty.remove(5)
+    empty.remove(5)  # Nothing left to take it from
+    assert empty.count == 0 and empty.buckets == {} and empty.quantile(0.5) is None
@@ -0,0 +1,70 @@
+"""Membership checks against a key snapshot exported from the database."""
+
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+
+def fill(collatz, db, wide=True):
+    """Mark a spread of numbers tested; with `wide`, some need 32-byte SHA-256 keys."""
+    rng = random.Random(11)
+    numbers = [rng.randrange(2, 1 << 100) for _ in range(2000)]
+    if wide:
+        numbers += [rng.randrange(1 << 128, 1 << 200) for _ in range(200)]
+    collatz.mark_tested_batch(db, numbers)
+    db.commit()
+    return numbers
+
+
+def check_membership(collatz, snapshot, numbers):
+    keys = sorted(collatz.number_key(n, snapshot.key_format).rjust(snapshot.width, b'\0')
+                  for n in numbers)
+    assert snapshot.rows == len(keys)
+    assert keys[0] in snapshot and keys[-1] in snapshot
+    assert snapshot.fences == keys[::snapshot.stride]
+    assert all(key in snapshot for key in keys)  # Fences and the keys between them
+    assert all(collatz.has_been_tested(snapshot, n) for n in numbers)
+    
+    tested = set(numbers)
+    absent = [n + 1 for n in numbers if n + 1 not in tested] + [1, (1 << 100) + 5]
+    assert not any(collatz.has_been_tested(snapshot, n) for n in absent)
+    assert b'\0' * snapshot.width not in snapshot  # Before the first key
+    assert b'\xff' * snapshot.width not in snapshot  # After the last key
+    assert b'\0' * (snapshot.width + 1) not in snapshot  # Wider than any key
+    
+    # Keys marked tested afterwards are answered from the delta
+    collatz.mark_tested_batch(snapshot, absent[:10])
+    assert all(collatz.has_been_tested(snapshot, n) for n in absent[:10])
+
+
+@pytest.mark.parametrize('stride', [1, 7, 256])
+@pytest.mark.parametrize('wide', [False, True])
+def test_snapshot_membership(collatz, db, stride, wide):
+    numbers = fill(collatz, db, wide)
+    assert collatz.export_key_snapshot(db, stride=stride) == len(set(numbers))
+    snapshot = collatz.open_key_snapshot(db)
+    assert snapshot.width == (32 if wide else collatz.KEY_WIDTH)
+    check_membership(collatz, snapshot, numbers)
+    snapshot.close()
+
+
+def test_exported_from_the_command_line(collatz, db, workdir):
+    numbers = fill(collatz, db)
+    db.close()
+    subprocess.run([sys.executable, os.path.join(ROOT, '3x1.py'), '--db', 'test.db',
+                    '--export-snapshot'], check=True, stdout=subprocess.DEVNULL)
+    conn = collatz.init_db('test.db')
+    snapshot = collatz.open_key_snapshot(conn)
+    check_membership(collatz, snapshot, numbers)
+    snapshot.close()
+    
+    # A snapshot that no longer matches the table is not used
+    collatz.mark_tested_batch(conn, [3])
+    conn.commit()
+    assert collatz.open_key_snapshot(conn) is None
+    conn.close()
@@ -0,0 +1,91 @@
+"""init_db's startup check, database fingerprint and the row count kept in `stats`."""
+
+import sqlite3
+
+import pytest
+
+
+@pytest.fixture
+def statements(collatz, monkeypatch):
+    """SQL run by every connection opened through sqlite3.connect."""
+    executed = []
+    connect = sqlite3.connect
+    
+    def traced_connect(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        conn.set_trace_callback(executed.append)
+        return conn
+    
+    monkeypatch.setattr(collatz.sqlite3, 'connect', traced_connect)
+    return executed
+
+
+@pytest.mark.parametrize('shards', [None, 3])
+def test_tested_count_matches_the_rows(collatz, db, shards):
+    if shards:
+        db.close()
+        collatz.reshard_database(db.db_path, shards)
+        db = collatz.init_db(db.db_path)
+    assert collatz.mark_tested_batch(db, range(1, 101)) == 100
+    db.commit()
+    
+    collisions = set()
+    batch = list(range(50, 151)) + [150, 1 << 130, 1 << 130]  # Repeats within the batch too
+    assert collatz.mark_tested_batch(db, batch, collisions) == 51
+    db.commit()
+    assert collisions == set(range(50, 101))
+    assert collatz.load_tested_count(db) == collatz.count_tested_rows(db) == 151
+    db.close()
+    
+    conn = collatz.init_db(db.db_path)
+    assert collatz.load_tested_count(conn) == collatz.count_tested_rows(conn) == 151
+    conn.close()
+
+
+def test_check_runs_only_when_the_fingerprint_changed(collatz, db, statements):
+    collatz.mark_tested_batch(db, range(1, 50))
+    db.commit()
+    db.close()
+    assert collatz.fingerprint_unchanged(db.db_path)
+    
+    statements.clear()
+    collatz.init_db(db.db_path).close()
+    assert 'PRAGMA quick_check;' not in statements
+    statements.clear()
+    collatz.init_db(db.db_path, check='quick').close()
+    assert 'PRAGMA quick_check;' in statements
+    
+    # Written to without a clean close through init_db
+    conn = sqlite3.connect(db.db_path)
+    conn.execute("INSERT INTO stats (key, value) VALUES ('other', '1')")
+    conn.commit()
+    conn.close()
+    assert not collatz.fingerprint_unchanged(db.db_path)
+    statements.clear()
+    collatz.init_db(db.db_path).close()
+    assert 'PRAGMA quick_check;' in statements
+    assert collatz.fingerprint_unchanged(db.db_path)
+    
+    statements.clear()
+    collatz.init_db(db.db_path).close()
+    assert 'PRAGMA quick_check;' not in statements
+
+
+def test_sharded_count_is_redone_after_an_unclean_close(collatz, db):
+    db.close()
+    collatz.reshard_database(db.db_path, 2)
+    conn = collatz.init_db(db.db_path)
+    collatz.mark_tested_batch(conn, range(1, 101))
+    conn.commit()
+    conn.close()
+    
+    # A crash after the shard commit but before the main one leaves a key
+    # the stored count does not include
+    shard = sqlite3.connect(collatz.shard_path(db.db_path, 0, 2))
+    shard.execute('INSERT INTO tested (hash) VALUES (?)', (collatz.number_key(1000),))
+    shard.commit()
+    shard.close()
+    
+    conn = collatz.init_db(db.db_path)
+    assert collatz.load_tested_count(conn) == collatz.count_tested_rows(conn) == 101
+    conn.close()
@@ -0,0 +1,69 @@
+"""Contiguous range verification: the descent sieve and verified_ranges round trips."""
+
+
+def shortcut_step(v):
+    """One step of the shortcut map T used by the sieve."""
+    return (3 * v + 1) >> 1 if v & 1 else v >> 1
+
+
+def test_sieve_skips_only_classes_that_descend(collatz):
+    bits = 8
+    sieve = collatz.build_descent_sieve(bits)
+    survivors = dict(zip(sieve['residues'], zip(sieve['mults'], sieve['adds'])))
+    size = 1 << bits
+    m = max(sieve['threshold'] // size + 1, 1000)
+    base = m * size
+    for r in range(size):
+        n = base + r
+        v = n
+        values = []
+        for _ in range(bits):
+            v = shortcut_step(v)
+            values.append(v)
+        if r in survivors:
+            mult, add = survivors[r]
+            assert min(values) >= n
+            assert v == mult * m + add
+        else:
+            assert min(values) < n
+
+
+def test_first_failure_follows_only_survivors(collatz):
+    sieve = collatz.get_descent_sieve()
+    size = 1 << sieve['bits']
+    residues = set(sieve['residues'])
+    low, high = 2 ** 40 + 5, 2 ** 40 + 50_000
+    expected = sum(1 for n in range(low, high + 1) if n % size in residues)
+    assert collatz.first_failure_to_descend(low, high) == (None, expected)
+
+
+def test_verify_range_resumes_and_merges(collatz, db):
+    first = collatz.verify_range(1, 50_000, db)
+    assert first['verified'] == 50_000 and first['failed'] is None
+    
+    # Only the part not covered yet is checked again
+    second = collatz.verify_range(1, 100_000, db)
+    assert second['verified'] == 50_000
+    assert collatz.load_verified_ranges(db) == [(1, 100_000)]
+    assert collatz.verified_prefix(db) == 100_000
+
+
+def test_verify_range_joins_intervals_that_touch(collatz, db):
+    base = 2 ** 40
+    collatz.verify_range(base, base + 999, db)
+    collatz.verify_range(base + 2000, base + 2999, db)
+    assert collatz.load_verified_ranges(db) == [(base, base + 999), (base + 2000, base + 2999)]
+    assert collatz.verified_prefix(db) == 1
+    
+    result = collatz.verify_range(base, base + 2999, db)
+    assert result['verified'] == 1000
+    assert collatz.load_verified_ranges(db) == [(base, base + 2999)]
+
+
+def test_verify_range_stops_at_the_first_failure(collatz, db, monkeypatch):
+    monkeypatch.setattr(collatz, 'MAX_STEPS', 1)
+    result = collatz.verify_range(200_000, 200_100, db)
+    failed = result['failed']
+    assert failed is not None
+    assert collatz.first_failure_to_descend(200_000, failed - 1)[0] is None
+    assert collatz.load_verified_ranges(db) == [(200_000, failed - 1)]